@@ -0,0 +1,117 @@
+"""Binarize DUE dataset splits into fixed-width memmaps (see `benchmarker.data.memmaps`), e.g.:
+
+    python -m benchmarker.cli.l5.create_memmaps --dataset_path_or_name /data/DocVQA --model_path t5-base \
+        --memmap_path memmaps/DocVQA/microsoft_cv --max_encoder_length 1024 --processes 8
+
+Memmaps of each available split are written to `{memmap_path}/{split}`. Requires transformers
+(`pip install benchmarker[transformers]`) to load the tokenizer.
+"""
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import fire
+import numpy as np
+from more_itertools import chunked
+from tqdm import tqdm
+
+from benchmarker.data.memmaps import MemmapWriter, feature_names, instance_to_features, ordered_map
+from benchmarker.data.reader import Corpus, qa_strategies
+from benchmarker.data.reader.common import DataInstance
+from benchmarker.data.tokenization import BatchTokenizer, TransformersBatchTokenizer, tokenize_batch
+
+logger = logging.getLogger(__name__)
+
+# state of worker processes, set by `init_worker`
+_tokenizer: Optional[BatchTokenizer] = None
+_settings: Dict[str, Any] = {}
+
+
+def init_worker(tokenizer: BatchTokenizer, settings: Dict[str, Any]):
+    global _tokenizer, _settings
+    _tokenizer, _settings = tokenizer, settings
+
+
+def featurize(instances: List[DataInstance]) -> List[Dict[str, np.ndarray]]:
+    return [
+        instance_to_features(tokenized, _tokenizer.eos_token_id, **_settings)
+        for tokenized in tokenize_batch(instances, _tokenizer)
+    ]
+
+
+def create_memmaps(
+    dataset_path_or_name: str,
+    model_path: Optional[str] = None,
+    memmap_path: str = 'memmaps',
+    max_encoder_length: int = 1024,
+    max_decoder_length: int = 256,
+    segment_levels: Sequence[str] = ('tokens', 'pages'),
+    processes: int = 0,
+    ocr_engine: str = 'microsoft_cv',
+    train_strategy: str = 'all_items',
+    dev_strategy: str = 'concat',
+    test_strategy: str = 'concat',
+    use_fast_tokenizer: bool = False,
+    append: bool = False,
+    batch_size: int = 64,
+    tokenizer: Optional[BatchTokenizer] = None,
+    **corpus_kwargs,
+):
+    """Binarize train, dev and test splits of a dataset.
+
+    :param dataset_path_or_name: DUE dataset directory (with train, dev and test subdirectories)
+    :param model_path: name or path of the model whose tokenizer is used
+    :param memmap_path: output directory
+    :param max_encoder_length: number of input positions (longer inputs are truncated)
+    :param max_decoder_length: number of output positions
+    :param segment_levels: segment levels of documents, stored along tokens
+    :param processes: number of worker processes, instances are binarized in the main process if 0
+    :param ocr_engine: name of the OCR tool
+    :param train_strategy: name of the function in `qa_strategies` choosing values of train instances
+    :param dev_strategy: name of the function in `qa_strategies` choosing values of dev instances
+    :param test_strategy: name of the function in `qa_strategies` choosing values of test instances
+    :param use_fast_tokenizer: whether to load the fast (Rust) version of the tokenizer
+    :param append: whether to append instances to existing memmaps instead of overwriting them
+    :param batch_size: number of instances tokenized at once
+    :param tokenizer: tokenizer to use instead of loading it from model_path (e.g., `StubBatchTokenizer`)
+    :param corpus_kwargs: other Corpus parameters (e.g., use_prefix, lowercase_input)
+    """
+    segment_levels = tuple(segment_levels)
+    if tokenizer is None:
+        assert model_path is not None, 'Either model_path or tokenizer is required'
+        tokenizer = TransformersBatchTokenizer.from_pretrained(model_path, use_fast_tokenizer)
+    corpus = Corpus(
+        train_strategy=getattr(qa_strategies, train_strategy),
+        dev_strategy=getattr(qa_strategies, dev_strategy),
+        test_strategy=getattr(qa_strategies, test_strategy),
+        **corpus_kwargs,
+    )
+    corpus.read_benchmark_challenge(Path(dataset_path_or_name), ocr=ocr_engine, segment_levels=segment_levels)
+    settings = {
+        'max_encoder_length': max_encoder_length,
+        'max_decoder_length': max_decoder_length,
+        'segment_levels': segment_levels,
+    }
+    widths = {name: max_encoder_length for name in feature_names(segment_levels)}
+    widths['lm_label_ids'] = max_decoder_length
+
+    for split in ('train', 'dev', 'test'):
+        if not getattr(corpus, f'_{split}').docs_jsonl_path.exists():
+            logger.info(f'No {split} split in {dataset_path_or_name}, skipping it')
+            continue
+        output = Path(memmap_path) / split
+        instances = getattr(corpus, split)
+        with MemmapWriter(output, feature_names(segment_levels), widths, append=append) as writer:
+            batches = ordered_map(
+                featurize, chunked(instances, batch_size), processes, initializer=init_worker,
+                initargs=(tokenizer, settings),
+            )
+            for rows in tqdm(batches, desc=f'{split} batches'):
+                for features in rows:
+                    writer.append(features)
+        logger.info(f'{len(writer)} {split} instances written to {output}')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    fire.Fire(create_memmaps)
@@ -1,14 +1,165 @@
-from typing import Any, Dict, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, overload
 
 import numpy as np
 
 from benchmarker.utils.cmp_helpers import nested_dict_with_arrays_cmp
 
+# str methods which map ASCII letters to ASCII letters, applied to token stores byte-wise
+_ASCII_CASE_SHIFTS = {str.lower: (ord('A'), ord('Z'), 32), str.upper: (ord('a'), ord('z'), -32)}
+# lowercase of the capital sigma depends on the characters following it, so it cannot be applied to joined tokens
+_CONTEXT_DEPENDENT_CHARS = '\u03a3'
+
+
+def _char_index(buffer: np.ndarray) -> np.ndarray:
+    """Get the index of the character each byte of UTF-8 buffer belongs to (and the number of characters at the end)."""
+    index = np.zeros(len(buffer) + 1, dtype=np.int64)
+    np.cumsum((buffer & 0xC0) != 0x80, out=index[1:])
+    return index
+
+
+class TokenStore(Sequence[str]):
+    """Compact immutable sequence of tokens: one concatenated UTF-8 buffer and byte offsets of tokens.
+
+    Unlike a list of str, it does not hold a Python object per token, can be compared, sliced and pickled
+    as a whole, and can share the buffer with other arrays (e.g., Arrow string columns).
+
+    :param buffer: uint8 array with UTF-8 encoded tokens
+    :param offsets: int32 array with byte offsets of tokens in the buffer, of length number of tokens + 1
+        (starting with 0 and ending with the length of the buffer)
+    """
+
+    __slots__ = ('buffer', 'offsets')
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        assert len(offsets) > 0, 'Offsets need to include the end of the last token'
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[str]) -> 'TokenStore':
+        """Encode tokens into a new store."""
+        tokens = tokens if isinstance(tokens, (list, tuple)) else list(tokens)
+        char_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(token) for token in tokens], out=char_offsets[1:])
+        return cls._from_text(''.join(tokens), char_offsets)
+
+    @classmethod
+    def _from_text(cls, text: str, char_offsets: np.ndarray) -> 'TokenStore':
+        buffer = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+        if len(buffer) == len(text):
+            return cls(buffer, char_offsets.astype(np.int32))
+        # byte offsets of characters, and the end of the buffer
+        char_starts = np.append(np.flatnonzero((buffer & 0xC0) != 0x80), len(buffer))
+        return cls(buffer, char_starts[char_offsets].astype(np.int32))
+
+    def _text(self) -> Tuple[str, np.ndarray]:
+        """Decode the buffer at once, along with character offsets of tokens."""
+        text = self.buffer.tobytes().decode('utf-8')
+        if len(text) == len(self.buffer):
+            return text, self.offsets
+        return text, _char_index(self.buffer)[self.offsets]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @overload
+    def __getitem__(self, item: int) -> str:
+        ...
+
+    @overload
+    def __getitem__(self, item: slice) -> 'TokenStore':
+        ...
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[str, 'TokenStore']:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return TokenStore.from_tokens(self[i] for i in range(start, stop, step))
+            stop = max(start, stop)
+            begin = self.offsets[start]
+            return TokenStore(self.buffer[begin:self.offsets[stop]], self.offsets[start:stop + 1] - begin)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('TokenStore index out of range')
+        return self.buffer[self.offsets[item]:self.offsets[item + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        text, offsets = self._text()
+        offsets = offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield text[start:end]
+
+    def tolist(self) -> List[str]:
+        return list(self)
+
+    @property
+    def is_ascii(self) -> bool:
+        return not len(self.buffer) or int(self.buffer.max()) < 128
+
+    def map(self, func: Callable[[str], str]) -> 'TokenStore':
+        """Apply a function to each token.
+
+        Lowercasing and uppercasing (`str.lower` and `str.upper`) are applied to the whole buffer of ASCII tokens,
+        and to the whole decoded text if they map each of its characters to a single one.
+
+        :param func: function transforming a token
+        :return: new store with transformed tokens
+        """
+        if func in _ASCII_CASE_SHIFTS:
+            if self.is_ascii:
+                low, high, shift = _ASCII_CASE_SHIFTS[func]
+                buffer = self.buffer.copy()
+                buffer[(buffer >= low) & (buffer <= high)] += np.uint8(shift % 256)
+                return TokenStore(buffer, self.offsets)
+            text, char_offsets = self._text()
+            mapped = func(text)
+            if len(mapped) == len(text) and not any(char in text for char in _CONTEXT_DEPENDENT_CHARS):
+                return TokenStore._from_text(mapped, char_offsets)
+        return TokenStore.from_tokens([func(token) for token in self])
+
+    def lower(self) -> 'TokenStore':
+        return self.map(str.lower)
+
+    def upper(self) -> 'TokenStore':
+        return self.map(str.upper)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TokenStore):
+            return tokens_equal(self, other)
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f'TokenStore({list(self)!r})'
+
+
+def tokens_equal(tokens: Sequence[str], other: Sequence[str]) -> bool:
+    """Compare tokens regardless of the type of their sequences (token stores are compared as arrays)."""
+    if isinstance(tokens, TokenStore) and isinstance(other, TokenStore):
+        return np.array_equal(tokens.offsets, other.offsets) and np.array_equal(tokens.buffer, other.buffer)
+    return len(tokens) == len(other) and all(a == b for a, b in zip(tokens, other))
+
+
+def map_tokens(tokens: Sequence[str], func: Callable[[str], str]) -> Sequence[str]:
+    """Apply a function to each token, token stores are transformed as a whole (see `TokenStore.map`).
+
+    :param tokens: tokens of a document
+    :param func: function transforming a token
+    :return: transformed tokens, a token store if tokens were stored in one, a list otherwise
+    """
+    if isinstance(tokens, TokenStore):
+        return tokens.map(func)
+    return [func(token) for token in tokens]
+
 
 class Doc2d:
     """
     :param docid: Document id
-    :param tokens: List of tokens in document
+    :param tokens: List of tokens in document (or their compact `TokenStore`)
     :param token_ocr_ranges: if this is required,
         document can store also character spans of tokens in document
     :param seg_data: Dictionary of visual objects used by 2D models
@@ -32,11 +183,24 @@ class Doc2d:
     def __len__(self) -> int:
         return len(self.tokens)
 
+    def with_tokens(self, tokens: Sequence[str]) -> 'Doc2d':
+        """Create a view of the document with different tokens.
+
+        Arrays of seg_data are shared with the original document, only the dictionaries holding them are copied,
+        so the view can be modified without affecting the original one.
+
+        :param tokens: new tokens, they need to be aligned with the original ones
+        :return: new Doc2d
+        """
+        assert len(tokens) == len(self.tokens), 'New tokens need to be aligned with the original ones'
+        seg_data = {k: dict(v) if isinstance(v, dict) else v for k, v in self.seg_data.items()}
+        return Doc2d(tokens, seg_data, self.token_ocr_ranges, self.token_label_ids, self.docid)
+
     def __eq__(self, other) -> bool:
         return (
             isinstance(other, Doc2d)
             and self.docid == other.docid
-            and self.tokens == other.tokens
+            and tokens_equal(self.tokens, other.tokens)
             and np.all(self.token_ocr_ranges == other.token_ocr_ranges)
             and self.token_label_ids == other.token_label_ids
             and nested_dict_with_arrays_cmp(self.seg_data, other.seg_data)
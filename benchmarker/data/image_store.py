@@ -0,0 +1,202 @@
+"""Page images of a dataset decoded and resized once, packed into a single uint8 memmap.
+
+A store directory holds `images.mmap` with pixels of all pages (flattened one after another), `pages.npy` with
+(offset, width, height) of each page and `meta.json` mapping names of documents (subdirectories of `png/`) to their
+first page and number of pages. Build it with:
+
+    python -m benchmarker.data.image_store build examples/DeepForm /tmp/DeepForm-images
+"""
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import fire
+import numpy as np
+
+from benchmarker.data.document import Doc2d
+from benchmarker.data.images import decode_page, page_image_paths
+from benchmarker.data.memmaps import ordered_map
+from benchmarker.data.utils import FEAT_META, IMG_SIZE, IMG_SIZE_DIVISIBILITY
+
+logger = logging.getLogger(__name__)
+
+META = 'meta.json'
+PAGES = 'pages.npy'
+IMAGES = 'images.mmap'
+IMAGE_STORE_VERSION = 1
+CHANNELS = {'L': 1, 'RGB': 3}
+
+
+def _decode_document(args: Tuple[Path, Tuple[int, int], int, str]) -> List[np.ndarray]:
+    directory, max_size, divisibility, mode = args
+    return [decode_page(path, max_size, divisibility, mode) for path in page_image_paths(directory)]
+
+
+def _write_store(
+    path: Path, doc_dirs: List[Path], max_size: Tuple[int, int], divisibility: int, mode: str, processes: int
+) -> Tuple[int, int]:
+    """Write files of a store of page images of given documents to path, return numbers of documents and pages."""
+    documents: Dict[str, List[int]] = {}
+    pages: List[Tuple[int, int, int]] = []
+    offset = 0
+    with open(path / IMAGES, 'wb') as out:
+        tasks = ((doc_dir, tuple(max_size), divisibility, mode) for doc_dir in doc_dirs)
+        for doc_dir, images in zip(doc_dirs, ordered_map(_decode_document, tasks, processes)):
+            documents[doc_dir.name] = [len(pages), len(images)]
+            for image in images:
+                image = np.ascontiguousarray(image, dtype=FEAT_META['img_lst']['dtype'])
+                out.write(image.tobytes())
+                pages.append((offset, image.shape[1], image.shape[0]))
+                offset += image.nbytes
+    np.save(path / PAGES, np.array(pages, dtype=np.int64).reshape(-1, 3))
+    meta = {
+        'version': IMAGE_STORE_VERSION,
+        'mode': mode,
+        'max_size': list(max_size),
+        'divisibility': divisibility,
+        'documents': documents,
+    }
+    with open(path / META, 'w') as out:
+        json.dump(meta, out)
+    return len(documents), len(pages)
+
+
+def build_image_store(
+    directory: Union[str, Path],
+    output: Union[str, Path],
+    max_size: Tuple[int, int] = IMG_SIZE,
+    divisibility: int = IMG_SIZE_DIVISIBILITY,
+    mode: str = 'L',
+    processes: int = 0,
+) -> Path:
+    """Decode and resize page images of all documents of a dataset (see `decode_page`) and pack them into a store.
+
+    The store is written to a temporary directory first and moved into place once complete, so a failed build
+    leaves neither a partial store nor the temporary directory.
+
+    :param directory: dataset directory (with page images in `png/<document name>/`)
+    :param output: store directory
+    :param max_size: maximal (width, height) of stored pages
+    :param divisibility: sides of stored pages are its multiples
+    :param mode: PIL mode of stored pages ('L' or 'RGB')
+    :param processes: number of worker processes decoding documents, documents are decoded in the main process if 0
+    :return: path of the store
+    """
+    assert mode in CHANNELS, f'Unsupported mode {mode}, use one of {list(CHANNELS)}'
+    png_dir = Path(directory) / 'png'
+    doc_dirs = sorted(p for p in png_dir.iterdir() if p.is_dir()) if png_dir.is_dir() else []
+    if not doc_dirs:
+        logger.warning(f'No page images found in {png_dir}')
+
+    output = Path(output)
+    tmp_output = output.with_name(f'{output.name}.{os.getpid()}.tmp')
+    tmp_output.mkdir(parents=True)
+    try:
+        documents, num_pages = _write_store(tmp_output, doc_dirs, max_size, divisibility, mode, processes)
+        if output.exists():
+            shutil.rmtree(output)
+        os.replace(tmp_output, output)
+    finally:
+        shutil.rmtree(tmp_output, ignore_errors=True)
+    logger.info(f'Stored {num_pages} pages of {documents} documents in {output}')
+    return output
+
+
+class PageImageStore:
+    """Reader of a store written by `build_image_store`, page images are views of the memory-mapped file.
+
+    :param path: store directory
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / META) as inp:
+            self.meta = json.load(inp)
+        assert self.meta['version'] == IMAGE_STORE_VERSION, f'Unsupported image store version in {self.path}'
+        self.documents: Dict[str, List[int]] = self.meta['documents']
+        self.pages = np.load(self.path / PAGES)
+        self.channels = CHANNELS[self.meta['mode']]
+        size = os.path.getsize(self.path / IMAGES)
+        if size:
+            self.data = np.memmap(self.path / IMAGES, dtype=FEAT_META['img_lst']['dtype'], mode='r')
+        else:
+            self.data = np.empty(0, dtype=FEAT_META['img_lst']['dtype'])
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.documents
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.documents)
+
+    def num_pages(self, name: str) -> int:
+        return self.documents[name][1]
+
+    def page(self, name: str, ordinal: int) -> np.ndarray:
+        """Get image of a page of a document.
+
+        :param name: name of the document (name of its directory with page images)
+        :param ordinal: index of the page in the document
+        :return: read-only uint8 array of shape (height, width) or (height, width, channels)
+        """
+        first, count = self.documents[name]
+        if not 0 <= ordinal < count:
+            raise IndexError(f'Document {name} has {count} pages, page {ordinal} requested')
+        offset, width, height = self.pages[first + ordinal].tolist()
+        shape = (height, width) if self.channels == 1 else (height, width, self.channels)
+        return self.data[offset:offset + width * height * self.channels].reshape(shape)
+
+    def images(self, name: str, ordinals: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+        """Get `seg_data['images']` of a document: images of pages and their (width, height).
+
+        :param name: name of the document
+        :param ordinals: indices of pages, all pages of the document by default
+        :return: dict with `img_data` (a view per page) and `img_size` (array of shape (pages, 2))
+        """
+        first, count = self.documents[name]
+        if ordinals is None:
+            ordinals = range(count)
+        img_data = [self.page(name, ordinal) for ordinal in ordinals]
+        img_size = self.pages[first + np.asarray(ordinals, dtype=np.int64), 1:].astype(np.int32).reshape(-1, 2)
+        return {'img_data': img_data, 'img_size': img_size}
+
+    def fill(self, doc2d: Doc2d) -> bool:
+        """Set `seg_data['images']` of a document with lazy images (see `BenchmarkDataset`), so that `get_data_part`
+        selects the image of the page of each part. Page ordinals are set if the document has none.
+
+        :param doc2d: document, modified in place
+        :return: whether images of the document were found in the store
+        """
+        name = Path(doc2d.seg_data['lazyimages']['path']).name
+        if name not in self.documents:
+            return False
+        pages = doc2d.seg_data.get('pages')
+        if pages is not None and 'ordinals' not in pages:
+            pages['ordinals'] = np.arange(len(pages['ranges']), dtype=FEAT_META['ordinals']['dtype'])
+        num_pages = self.num_pages(name)
+        if pages is not None and len(pages['ordinals']) and int(np.max(pages['ordinals'])) >= num_pages:
+            logger.warning(f'Document {name} has {len(pages["ordinals"])} pages, but {num_pages} page images')
+        doc2d.seg_data['images'] = self.images(name)
+        return True
+
+
+def build(
+    directory: str,
+    output: str,
+    max_size: Tuple[int, int] = IMG_SIZE,
+    divisibility: int = IMG_SIZE_DIVISIBILITY,
+    mode: str = 'L',
+    processes: int = 0,
+):
+    """Build a page image store of a dataset, see `build_image_store`."""
+    logging.basicConfig(level=logging.INFO)
+    build_image_store(directory, output, tuple(max_size), divisibility, mode, processes)  # type: ignore
+
+
+if __name__ == '__main__':
+    fire.Fire({'build': build})
@@ -0,0 +1,308 @@
+"""Loading of page images referenced by `seg_data['lazyimages']`.
+
+Readers only store the directory with page images of a document (`png/<document name>` in the dataset directory),
+`PageImageLoader` resolves page ordinals to files of this directory, decodes and resizes them, keeps decoded pages
+in a cache bounded by their size in bytes and decodes upcoming pages in background threads:
+
+    with PageImageLoader(prefetch=2) as loader:
+        for doc2d in loader.prefetch_documents(doc2ds):
+            first_page = loader.page(doc2d.seg_data['lazyimages']['path'], 0)
+"""
+import logging
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from benchmarker.data.document import Doc2d
+from benchmarker.data.utils import IMG_SIZE, IMG_SIZE_DIVISIBILITY
+from benchmarker.utils import instrumentation
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = ('.png',)
+_NUMBERS = re.compile(r'(\d+)')
+
+
+def _natural_key(path: Path) -> Tuple:
+    return tuple(int(part) if part.isdigit() else part for part in _NUMBERS.split(path.stem))
+
+
+def page_image_paths(directory: Union[str, Path]) -> List[Path]:
+    """List page images of a document, in order of pages.
+
+    Files are ordered by numbers in their names (e.g., `doc-2.png` before `doc-10.png`), so the page of ordinal i
+    is the i-th file.
+
+    :param directory: directory with page images of the document
+    :return: paths of page images
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return sorted((p for p in directory.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES), key=_natural_key)
+
+
+def fit_size(
+    width: int, height: int, max_size: Tuple[int, int] = IMG_SIZE, divisibility: int = IMG_SIZE_DIVISIBILITY
+) -> Tuple[int, int]:
+    """Get size of an image scaled (preserving aspect ratio) to fit into max_size, with sides divisible by divisibility.
+
+    :param width: width of the image
+    :param height: height of the image
+    :param max_size: maximal (width, height)
+    :param divisibility: sides of the result are its multiples (at least one multiple)
+    :return: (width, height) of the scaled image
+    """
+    scale = min(max_size[0] / max(width, 1), max_size[1] / max(height, 1))
+    return tuple(  # type: ignore
+        max(divisibility, int(side * scale) // divisibility * divisibility) for side in (width, height)
+    )
+
+
+def decode_page(
+    path: Union[str, Path],
+    max_size: Tuple[int, int] = IMG_SIZE,
+    divisibility: int = IMG_SIZE_DIVISIBILITY,
+    mode: str = 'L',
+) -> np.ndarray:
+    """Decode page image and resize it (see `fit_size`).
+
+    :param path: path of the image
+    :param max_size: maximal (width, height) of the result
+    :param divisibility: sides of the result are its multiples
+    :param mode: PIL mode of the result (e.g., 'L' for grayscale, 'RGB')
+    :return: uint8 array of shape (height, width) or (height, width, channels)
+    """
+    with instrumentation.timer('images.decode'), Image.open(path) as image:
+        image.draft(mode, max_size)
+        image = image.convert(mode)
+        size = fit_size(image.width, image.height, max_size, divisibility)
+        if image.size != size:
+            image = image.resize(size, Image.BILINEAR)
+        return np.asarray(image, dtype=np.uint8)
+
+
+class LRUByteCache:
+    """Thread-safe LRU cache of arrays, bounded by the total size of cached arrays in bytes.
+
+    :param max_bytes: maximal total size of cached arrays (an array larger than it is not cached)
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items: 'OrderedDict[Hashable, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: np.ndarray):
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key).nbytes
+            if value.nbytes > self.max_bytes:
+                return
+            self._items[key] = value
+            self.bytes += value.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                instrumentation.count('images.evicted')
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+
+class PageImageLoader:
+    """Loader of page images with a byte-bounded LRU cache of decoded pages and background prefetching.
+
+    Returned arrays are shared with the cache, so they should not be modified in place.
+
+    :param max_cache_bytes: maximal total size of cached decoded pages
+    :param num_workers: number of threads decoding prefetched pages (prefetching is disabled if 0)
+    :param prefetch: number of pages following the requested one decoded in background
+    :param max_size: maximal (width, height) of decoded pages
+    :param divisibility: sides of decoded pages are its multiples
+    :param mode: PIL mode of decoded pages (e.g., 'L' for grayscale, 'RGB')
+    """
+
+    def __init__(
+        self,
+        max_cache_bytes: int = 256 * 2 ** 20,
+        num_workers: int = 2,
+        prefetch: int = 1,
+        max_size: Tuple[int, int] = IMG_SIZE,
+        divisibility: int = IMG_SIZE_DIVISIBILITY,
+        mode: str = 'L',
+    ):
+        self.cache = LRUByteCache(max_cache_bytes)
+        self.prefetch = prefetch if num_workers > 0 else 0
+        self.max_size = max_size
+        self.divisibility = divisibility
+        self.mode = mode
+        self._executor = ThreadPoolExecutor(num_workers, thread_name_prefix='page-images') if num_workers else None
+        self._pending: Dict[Tuple[str, int], Future] = {}
+        self._paths: 'OrderedDict[str, List[Path]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def paths(self, directory: Union[str, Path]) -> List[Path]:
+        """Get (cached) paths of page images of a document, see `page_image_paths`."""
+        key = str(directory)
+        with self._lock:
+            paths = self._paths.get(key)
+        if paths is None:
+            paths = page_image_paths(directory)
+            with self._lock:
+                self._paths[key] = paths
+                if len(self._paths) > 1024:
+                    self._paths.popitem(last=False)
+        return paths
+
+    def num_pages(self, directory: Union[str, Path]) -> int:
+        return len(self.paths(directory))
+
+    def _decode(self, key: Tuple[str, int], path: Path) -> np.ndarray:
+        try:
+            image = decode_page(path, self.max_size, self.divisibility, self.mode)
+            self.cache.put(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _path(self, directory: Union[str, Path], ordinal: int) -> Path:
+        paths = self.paths(directory)
+        if not 0 <= ordinal < len(paths):
+            raise FileNotFoundError(f'No image of page {ordinal} in {directory} ({len(paths)} pages found)')
+        return paths[ordinal]
+
+    def _request(self, directory: Union[str, Path], ordinal: int, background: bool) -> Union[np.ndarray, Future]:
+        """Get cached page image, or the future of its decoding (started if needed and background is set)."""
+        key = (str(directory), ordinal)
+        image = self.cache.get(key)
+        if image is not None:
+            instrumentation.count('images.cache_hits')
+            return image
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            instrumentation.count('images.prefetch_waits')
+            return future
+        instrumentation.count('images.cache_misses')
+        path = self._path(directory, ordinal)
+        if background and self._executor is not None:
+            with self._lock:
+                # another thread may have started decoding the page meanwhile
+                if key not in self._pending:
+                    self._pending[key] = self._executor.submit(self._decode, key, path)
+                future = self._pending[key]
+            return future
+        return self._decode(key, path)
+
+    def page(self, directory: Union[str, Path], ordinal: int) -> np.ndarray:
+        """Get decoded page image, pages following it are prefetched.
+
+        :param directory: directory with page images of the document (`seg_data['lazyimages']['path']`)
+        :param ordinal: index of the page in the document
+        :return: uint8 array of shape (height, width) or (height, width, channels)
+        """
+        image = self._request(directory, ordinal, background=False)
+        if self.prefetch:
+            self.prefetch_pages(directory, range(ordinal + 1, ordinal + 1 + self.prefetch))
+        return image.result() if isinstance(image, Future) else image
+
+    def pages(self, directory: Union[str, Path], ordinals: Optional[Sequence[int]] = None) -> List[np.ndarray]:
+        """Get decoded images of pages (all pages of the document by default), decoding them in parallel."""
+        if ordinals is None:
+            ordinals = range(self.num_pages(directory))
+        requests = [self._request(directory, ordinal, background=True) for ordinal in ordinals]
+        return [image.result() if isinstance(image, Future) else image for image in requests]
+
+    def prefetch_pages(self, directory: Union[str, Path], ordinals: Iterable[int]):
+        """Start decoding of pages in background, pages already cached or being decoded are skipped.
+
+        :param directory: directory with page images of the document
+        :param ordinals: indices of pages
+        """
+        if self._executor is None:
+            return
+        paths = self.paths(directory)
+        for ordinal in ordinals:
+            key = (str(directory), ordinal)
+            if not 0 <= ordinal < len(paths) or key in self.cache:
+                continue
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._decode, key, paths[ordinal])
+            instrumentation.count('images.prefetched')
+
+    def prefetch_documents(self, doc2ds: Iterable[Doc2d], lookahead: int = 4) -> Iterator[Doc2d]:
+        """Iterate over documents, decoding their pages `lookahead` documents ahead of the consumer.
+
+        :param doc2ds: documents with `seg_data['lazyimages']`
+        :param lookahead: number of upcoming documents whose pages are prefetched
+        :return: iterator over the same documents
+        """
+        window: Deque[Doc2d] = deque()
+        for doc2d in doc2ds:
+            window.append(doc2d)
+            self._prefetch_document(doc2d)
+            if len(window) > lookahead:
+                yield window.popleft()
+        yield from window
+
+    def _prefetch_document(self, doc2d: Doc2d):
+        lazyimages = doc2d.seg_data.get('lazyimages')
+        if lazyimages is None:
+            return
+        pages = doc2d.seg_data.get('pages', {})
+        ordinals = pages.get('ordinals')
+        if ordinals is None:
+            ordinals = range(self.num_pages(lazyimages['path']))
+        self.prefetch_pages(lazyimages['path'], np.asarray(ordinals).tolist())
+
+    def images(self, seg_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Get `seg_data['images']` of a document with lazy images: decoded pages and their (width, height).
+
+        :param seg_data: seg_data with `lazyimages` (and optionally `ordinals` of pages)
+        :return: dict with `img_data` (an array per page) and `img_size` (array of shape (pages, 2))
+        """
+        directory = seg_data['lazyimages']['path']
+        ordinals = seg_data.get('pages', {}).get('ordinals')
+        img_data = self.pages(directory, None if ordinals is None else np.asarray(ordinals).tolist())
+        img_size = np.array([(image.shape[1], image.shape[0]) for image in img_data], dtype=np.int32).reshape(-1, 2)
+        return {'img_data': img_data, 'img_size': img_size}
+
+    def close(self):
+        if self._executor is not None:
+            with self._lock:
+                pending = list(self._pending.values())
+            for future in pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'PageImageLoader':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -0,0 +1,267 @@
+"""Fixed-width numpy memmaps of binarized data instances, laid out per `FEAT_META`.
+
+A memmap directory holds one `{feature}.mmap` file per feature, with a row per instance, and `meta.json`
+describing their dtypes and shapes. Wide features (see `FEAT_META`) have a value per input position,
+other ones have a single value per instance. Features of segment levels are named `seg_data.{level}.{element}`,
+e.g., `seg_data.pages.ranges`, and laid out per their element (`ranges`, `bboxes`, `cardinality`).
+"""
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
+
+import numpy as np
+
+from benchmarker.data.tokenization import TokenizedInstance
+from benchmarker.data.utils import FEAT_META
+
+logger = logging.getLogger(__name__)
+
+META = 'meta.json'
+MEMMAP_VERSION = 1
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def feature_meta(name: str) -> Dict[str, Any]:
+    """Get `FEAT_META` entry of a feature, `seg_data.{level}.{element}` features use the entry of the element."""
+    return FEAT_META[name.rsplit('.', 1)[-1]]
+
+
+def feature_names(segment_levels: Sequence[str]) -> List[str]:
+    """Get names of features produced by `instance_to_features`."""
+    names = ['input_ids', 'input_masks', 'lm_label_ids', 'token_map', 'doc_id', 'label_name', 'seg_data.tokens.bboxes']
+    for level in segment_levels:
+        if level != 'tokens':
+            names += [f'seg_data.{level}.ranges', f'seg_data.{level}.bboxes', f'seg_data.{level}.cardinality']
+    return names
+
+
+class MemmapWriter:
+    """Streaming writer of fixed-width memmaps, rows are appended to the files of features in place.
+
+    :param path: memmap directory
+    :param features: names of features (required unless appending to existing memmaps)
+    :param widths: number of positions of wide features (e.g., {'input_ids': 1024, 'lm_label_ids': 256})
+    :param append: whether to continue existing memmaps instead of overwriting them
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        features: Optional[Sequence[str]] = None,
+        widths: Optional[Dict[str, int]] = None,
+        append: bool = False,
+    ):
+        self.path = Path(path)
+        if append and (self.path / META).exists():
+            with open(self.path / META) as inp:
+                self.meta = json.load(inp)
+            assert self.meta['version'] == MEMMAP_VERSION, f'Unsupported memmap version in {self.path}'
+            mode = 'ab'
+        else:
+            assert features is not None, 'Features are required to create memmaps'
+            self.meta = {'version': MEMMAP_VERSION, 'length': 0, 'features': {}}
+            for name in features:
+                meta = feature_meta(name)
+                width = [widths[name]] if meta.get('wide', False) else []
+                self.meta['features'][name] = {'dtype': np.dtype(meta['dtype']).str, 'shape': width + meta['dim']}
+            mode = 'wb'
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._files = {name: open(self.path / f'{name}.mmap', mode) for name in self.meta['features']}
+
+    def __len__(self) -> int:
+        return self.meta['length']
+
+    def append(self, features: Dict[str, np.ndarray]):
+        """Append a row (single instance) to the memmaps.
+
+        :param features: values of all features, shaped as the row of the feature
+        """
+        for name, meta in self.meta['features'].items():
+            row = np.asarray(features[name], dtype=meta['dtype'])
+            assert list(row.shape) == meta['shape'], f'Shape of {name} is {row.shape}, expected {meta["shape"]}'
+            self._files[name].write(row.tobytes())
+        self.meta['length'] += 1
+
+    def flush(self):
+        """Make appended rows visible to readers."""
+        for out in self._files.values():
+            out.flush()
+        tmp_path = self.path / f'{META}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as out:
+            json.dump(self.meta, out)
+        os.replace(tmp_path, self.path / META)
+
+    def close(self):
+        self.flush()
+        for out in self._files.values():
+            out.close()
+
+    def __enter__(self) -> 'MemmapWriter':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class MemmapReader:
+    """Lazy reader of memmaps written by `MemmapWriter`, files are mapped on the first access to a feature.
+
+    :param path: memmap directory
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / META) as inp:
+            self.meta = json.load(inp)
+        self._memmaps: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.meta['length']
+
+    @property
+    def features(self) -> List[str]:
+        return list(self.meta['features'])
+
+    def feature(self, name: str) -> np.ndarray:
+        """Get memory-mapped array of a feature (rows of all instances)."""
+        if name not in self._memmaps:
+            meta = self.meta['features'][name]
+            shape = (len(self),) + tuple(meta['shape'])
+            if len(self) == 0:
+                self._memmaps[name] = np.empty(shape, dtype=meta['dtype'])
+            else:
+                self._memmaps[name] = np.memmap(self.path / f'{name}.mmap', dtype=meta['dtype'], mode='r', shape=shape)
+        return self._memmaps[name]
+
+    def __getitem__(self, item: Union[int, slice, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Get features of an instance or a batch of instances (by slice or array of indices)."""
+        return {name: self.feature(name)[item] for name in self.meta['features']}
+
+    def batches(self, batch_size: int, features: Optional[Sequence[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Iterate over consecutive batches of instances.
+
+        :param batch_size: number of instances per batch
+        :param features: features to read, all by default
+        """
+        for start in range(0, len(self), batch_size):
+            yield {name: self.feature(name)[start:start + batch_size] for name in features or self.features}
+
+
+def page_scales(pages: Dict[str, np.ndarray], token_positions: np.ndarray) -> np.ndarray:
+    """Get (width, height, width, height) of pages holding given tokens, used to normalize their bboxes.
+
+    :param pages: seg_data of pages
+    :param token_positions: indices of tokens (or subwords, if page ranges refer to subwords)
+    :return: array of shape (len(token_positions), 4)
+    """
+    sizes = pages['org_bboxes'][:, 2:].astype(np.float32)
+    if len(sizes) == 0:
+        return np.ones((len(token_positions), 4), dtype=np.float32)
+    page_positions = np.searchsorted(pages['ranges'][:, 1], token_positions, side='right')
+    return np.maximum(np.tile(sizes[np.minimum(page_positions, len(sizes) - 1)], 2), 1)
+
+
+def padded(values: Any, width: int, default: Any, dtype: Any) -> np.ndarray:
+    values = np.asarray(values, dtype=dtype)[:width]
+    result = np.full((width,) + values.shape[1:], default, dtype=dtype)
+    result[:len(values)] = values
+    return result
+
+
+def instance_to_features(
+    tokenized: TokenizedInstance,
+    eos_token_id: Optional[int],
+    max_encoder_length: int,
+    max_decoder_length: int,
+    segment_levels: Sequence[str] = ('tokens', 'pages'),
+) -> Dict[str, np.ndarray]:
+    """Lay out a tokenized data instance as a row of memmaps.
+
+    The encoder input consists of the tokenized input_prefix followed by subwords of document tokens,
+    truncated (at token boundaries) to fit max_encoder_length with the final EOS token. Bboxes of subwords
+    are normalized by the size of their page, segment ranges refer to the positions of subwords within the input.
+
+    :param tokenized: tokenized data instance (see `tokenize_instances`)
+    :param eos_token_id: id of the EOS token appended to inputs and outputs (none if None)
+    :param max_encoder_length: width of wide encoder features
+    :param max_decoder_length: width of lm_label_ids
+    :param segment_levels: segment levels stored along tokens
+    :return: row of each feature (see `feature_names`)
+    """
+    instance, example = tokenized.instance, tokenized.example
+    eos = [eos_token_id] if eos_token_id is not None else []
+    offset = min(len(tokenized.prefix_ids), max_encoder_length - len(eos))
+    room = max_encoder_length - len(eos) - offset
+    token_ends = example.tokens_bpe_map[:, 1]
+    num_tokens = int(np.searchsorted(token_ends, room, side='right'))
+    num_bpe = int(token_ends[num_tokens - 1]) if num_tokens else 0
+    input_ids = tokenized.prefix_ids[:offset] + tokenized.token_ids[:num_bpe].tolist() + eos
+
+    token_map = np.full(len(input_ids), -1, dtype=np.int64)
+    token_map[offset:offset + num_bpe] = example.original_token_indices[:num_bpe]
+    pages = example.seg_data['pages']
+    bboxes = np.zeros((len(input_ids), 4), dtype=np.float32)
+    bboxes[offset:offset + num_bpe] = example.seg_data['tokens']['bboxes'][:num_bpe] / page_scales(
+        pages, np.arange(num_bpe)
+    )
+
+    features = {
+        'input_ids': padded(input_ids, max_encoder_length, FEAT_META['input_ids']['default'], np.int32),
+        'input_masks': padded(np.ones(len(input_ids)), max_encoder_length, 0, bool),
+        'lm_label_ids': padded((tokenized.output_ids + eos)[:max_decoder_length], max_decoder_length, -1, np.int32),
+        'token_map': padded(token_map, max_encoder_length, -1, np.int16),
+        'doc_id': np.array(instance.identifier, dtype=FEAT_META['doc_id']['dtype']),
+        'label_name': np.array(instance.output_prefix, dtype=FEAT_META['label_name']['dtype']),
+        'seg_data.tokens.bboxes': padded(bboxes, max_encoder_length, 0, np.float16),
+    }
+    for level in segment_levels:
+        if level == 'tokens':
+            continue
+        seg = example.seg_data[level]
+        kept = seg['ranges'][:, 0] < num_bpe
+        ranges = np.minimum(seg['ranges'][kept], num_bpe) + offset
+        level_bboxes = seg['org_bboxes'][kept] / page_scales(pages, seg['ranges'][kept, 0])
+        features[f'seg_data.{level}.ranges'] = padded(ranges, max_encoder_length, 0, np.int32)
+        features[f'seg_data.{level}.bboxes'] = padded(level_bboxes, max_encoder_length, 0, np.float16)
+        features[f'seg_data.{level}.cardinality'] = np.array(min(int(kept.sum()), max_encoder_length), np.int32)
+    return features
+
+
+def ordered_map(
+    func: Callable[[T], R], items: Iterable[T], processes: int = 0, max_in_flight: Optional[int] = None,
+    initializer: Optional[Callable] = None, initargs: Tuple = (),
+) -> Iterator[R]:
+    """Apply function to items in worker processes, yielding results in order of items.
+
+    :param func: picklable function
+    :param items: items to process, consumed lazily
+    :param processes: number of worker processes, items are processed in the main process if 0
+    :param max_in_flight: maximal number of items submitted at once (4 * processes by default)
+    :param initializer: function called at the start of each worker (and of the main process if processes is 0)
+    :param initargs: arguments of the initializer
+    :return: iterator over results
+    """
+    if processes <= 0:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, items)
+        return
+
+    pending: Deque[Future] = deque()
+    with ProcessPoolExecutor(processes, initializer=initializer, initargs=initargs) as executor:
+        try:
+            for item in items:
+                if len(pending) >= (max_in_flight or 4 * processes):
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
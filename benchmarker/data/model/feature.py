@@ -2,8 +2,10 @@ from typing import Any, Dict, Optional
 
 import numpy as np
 
+from benchmarker.data.model.read_only import ReadOnlySlots
 
-class Feature(object):
+
+class Feature(ReadOnlySlots):
     """
         Feature representation.
 
@@ -15,53 +17,30 @@ class Feature(object):
         :param gold_words: store SINGLE gold word; name suggests multiple words but it was kept for backward compatibility
         :param masked_word_ids: store SINGLE masked word id; name suggest multiple masked words but it was kept for backward compatibility
         """
+    __slots__ = ('input_ids', 'input_masks', 'lm_label_ids', 'seg_data', 'token_label_ids', 'gold_words',
+                 'masked_word_ids')
+    _mutable = ('gold_words', 'masked_word_ids')
+
+    input_ids: np.ndarray
+    input_masks: np.ndarray
+    lm_label_ids: np.ndarray
+    seg_data: Dict[str, Any]
+    token_label_ids: np.ndarray
+    gold_words: Optional[str]
+    masked_word_ids: Optional[int]
 
     def __init__(self, input_ids: np.ndarray, input_masks: np.ndarray, lm_label_ids: np.ndarray,
                  seg_data: Dict[str, Any], token_label_ids: np.ndarray,
                  gold_words: Optional[str] = None, masked_word_ids: Optional[int] = None):
-        self.__input_ids = input_ids
-        self.__input_masks = input_masks
-        self.__lm_label_ids = lm_label_ids
-        self.__seg_data = seg_data
-        self.__token_label_ids = token_label_ids
-        self.__gold_words = gold_words
-        self.__masked_word_ids = masked_word_ids
-
-    @property
-    def input_ids(self) -> np.ndarray:
-        return self.__input_ids
-
-    @property
-    def input_masks(self) -> np.ndarray:
-        return self.__input_masks
-
-    @property
-    def lm_label_ids(self) -> np.ndarray:
-        return self.__lm_label_ids
-
-    @property
-    def seg_data(self) -> Dict[str, Any]:
-        return self.__seg_data
-
-    @property
-    def token_label_ids(self) -> np.ndarray:
-        return self.__token_label_ids
-
-    @property
-    def gold_words(self) -> Optional[str]:
-        return self.__gold_words
-
-    @property
-    def masked_word_ids(self) -> Optional[int]:
-        return self.__masked_word_ids
-
-    @gold_words.setter  # type: ignore
-    def gold_words(self, value: Optional[str]):
-        self.__gold_words = value
-
-    @masked_word_ids.setter  # type: ignore
-    def masked_word_ids(self, value: Optional[int]):
-        self.__masked_word_ids = value
+        self._set_fields(
+            input_ids=input_ids,
+            input_masks=input_masks,
+            lm_label_ids=lm_label_ids,
+            seg_data=seg_data,
+            token_label_ids=token_label_ids,
+            gold_words=gold_words,
+            masked_word_ids=masked_word_ids,
+        )
 
     def __repr__(self) -> str:
         return f'Feature[input_ids={self.input_ids}, input_masks={self.input_masks},' \
@@ -0,0 +1,30 @@
+from typing import Any, Dict, Tuple
+
+
+class ReadOnlySlots(object):
+    """Base of data model classes keeping their fields in __slots__, fields are set once by `_set_fields`.
+
+    Assigning a field afterwards raises AttributeError, like assigning a property without setter, unless the field
+    is listed in `_mutable`. Fields are read directly from slots, so reads are as fast as plain attributes.
+    """
+    __slots__ = ()
+
+    _mutable: Tuple[str, ...] = ()
+
+    def _set_fields(self, **fields: Any):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any):
+        if name not in self._mutable:
+            raise AttributeError(f"can't set attribute '{name}' of {type(self).__name__}")
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"can't delete attribute '{name}' of {type(self).__name__}")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self._set_fields(**state)
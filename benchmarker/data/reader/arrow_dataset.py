@@ -0,0 +1,419 @@
+"""Columnar (Arrow IPC or Parquet) storage of DUE benchmark splits.
+
+Each split is stored as a single table with a row per document. Besides the name and annotations of the document,
+there is a group of columns per OCR tool (prefixed with the tool name), holding flattened token bboxes
+and segment (pages and lines) ranges and bboxes, so readers load only the columns they need. Export a dataset with:
+
+    python -m benchmarker.data.reader.arrow_dataset export examples/DeepForm /tmp/DeepForm-arrow
+
+Requires pyarrow (`pip install benchmarker[arrow]`).
+"""
+import json
+import logging
+import os
+from copy import copy
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import fire
+import numpy as np
+
+from benchmarker.data.document import Doc2d, TokenStore
+from benchmarker.data.reader.benchmark_dataset import (
+    SKIP_NO_COMMON_FORMAT,
+    SKIP_NO_TOKENS,
+    BenchmarkDocumentsMixin,
+    warn_skipped,
+)
+from benchmarker.data.reader.common import Document, RandomAccessDataset
+from benchmarker.data.reader.content_index import JsonlIndex
+from benchmarker.input_loader.common_format import CommonFormatLoader
+from benchmarker.utils import instrumentation
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+LEVELS = ('pages', 'lines')
+# flattened list column: (suffix of the column name, dtype, number of values per element)
+TOKEN_BBOXES = ('token_bboxes', np.int64, 4)
+RANGES = ('ranges', np.int32, 2)
+BBOXES = ('bboxes', np.uint16, 4)
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError('Columnar datasets require pyarrow, install it with `pip install benchmarker[arrow]`')
+
+
+def column_name(tool: str, *parts: str) -> str:
+    return '.'.join((tool,) + parts)
+
+
+def split_schema(tools: Sequence[str], levels: Sequence[str]) -> 'pa.Schema':
+    """Get schema of the table holding a split with given OCR tools and segment levels."""
+    fields = [pa.field('name', pa.string()), pa.field('annotations', pa.string())]
+    for tool in tools:
+        fields += [
+            pa.field(column_name(tool, 'docid'), pa.string()),
+            pa.field(column_name(tool, 'skip_reason'), pa.string()),
+            pa.field(column_name(tool, 'tokens'), pa.list_(pa.string())),
+            pa.field(column_name(tool, TOKEN_BBOXES[0]), pa.list_(pa.from_numpy_dtype(TOKEN_BBOXES[1]))),
+        ]
+        for level in levels:
+            for suffix, dtype, _ in (RANGES, BBOXES):
+                fields.append(pa.field(column_name(tool, level, suffix), pa.list_(pa.from_numpy_dtype(dtype))))
+    return pa.schema(fields)
+
+
+def _document_row(
+    doc_line: bytes, doc_content: bytes, tools: Sequence[str], loader: CommonFormatLoader
+) -> Dict[str, Any]:
+    doc_dict = json.loads(doc_line)
+    tool2cf = {c['tool_name']: c.get('common_format') for c in json.loads(doc_content)['contents']}
+    row: Dict[str, Any] = {'name': doc_dict['name'], 'annotations': json.dumps(doc_dict['annotations'])}
+    for tool in tools:
+        common_format = tool2cf.get(tool)
+        doc2d = None
+        if common_format is None:
+            skip_reason: Optional[str] = SKIP_NO_COMMON_FORMAT
+        elif not common_format['tokens']:
+            skip_reason = SKIP_NO_TOKENS
+        else:
+            skip_reason = None
+            doc2d = loader.to_doc2d(common_format)
+        row[column_name(tool, 'docid')] = doc2d.docid if doc2d is not None else ''
+        row[column_name(tool, 'skip_reason')] = skip_reason
+        row[column_name(tool, 'tokens')] = list(doc2d.tokens) if doc2d is not None else []
+        token_bboxes = doc2d.seg_data['tokens']['org_bboxes'] if doc2d is not None else []
+        row[column_name(tool, TOKEN_BBOXES[0])] = np.asarray(token_bboxes, dtype=TOKEN_BBOXES[1]).ravel()
+        for level in loader.segment_levels:
+            if level == 'tokens':
+                continue
+            for suffix, dtype, _ in (RANGES, BBOXES):
+                key = 'org_bboxes' if suffix == BBOXES[0] else suffix
+                values = doc2d.seg_data[level][key] if doc2d is not None else []
+                row[column_name(tool, level, suffix)] = np.asarray(values, dtype=dtype).ravel()
+    return row
+
+
+def export_split(
+    directory: Union[str, Path],
+    split: str,
+    output: Union[str, Path],
+    tools: Optional[Sequence[str]] = None,
+    levels: Sequence[str] = LEVELS,
+    rows_per_batch: int = 256,
+) -> Path:
+    """Convert a split of DUE dataset (document.jsonl with documents_content.jsonl) to a columnar file.
+
+    :param directory: dataset directory
+    :param split: name of the split
+    :param output: path of the output file, its suffix (.arrow or .parquet) selects the format
+    :param tools: OCR tools to export, all tools present in the split by default
+    :param levels: segment levels to export (besides tokens)
+    :param rows_per_batch: number of documents per record batch (Arrow) or row group (Parquet)
+    :return: path of the output file
+    """
+    require_pyarrow()
+    directory, output = Path(directory), Path(output)
+    assert output.suffix in FORMATS.values(), f'Unsupported format of {output}, use one of {list(FORMATS.values())}'
+    docs_path = directory / split / 'document.jsonl'
+    content_path = directory / split / 'documents_content.jsonl'
+    if tools is None:
+        content_index = JsonlIndex.open(content_path, with_tools=True)
+        tools = sorted({tool for entry in content_index.entries for tool in entry.tools})
+    levels = [level for level in LEVELS if level in levels]
+    loader = CommonFormatLoader([], segment_levels=['tokens'] + levels)
+    schema = split_schema(tools, levels).with_metadata({
+        'directory': str(directory.resolve()),
+        'split': split,
+        'tools': json.dumps(list(tools)),
+        'levels': json.dumps(levels),
+    })
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_name(f'{output.name}.{os.getpid()}.tmp')
+    if output.suffix == FORMATS['parquet']:
+        writer = pq.ParquetWriter(tmp_output, schema)
+    else:
+        writer = pa.ipc.new_file(tmp_output, schema)
+    try:
+        rows: List[Dict[str, Any]] = []
+        with open(docs_path, 'rb') as docs_file, open(content_path, 'rb') as content_file:
+            for doc_line, doc_content in zip(docs_file, content_file):
+                rows.append(_document_row(doc_line, doc_content, tools, loader))
+                if len(rows) == rows_per_batch:
+                    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                    rows = []
+        if rows or isinstance(writer, pq.ParquetWriter):
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        writer.close()
+    except BaseException:
+        writer.close()
+        tmp_output.unlink()
+        raise
+    os.replace(tmp_output, output)
+    return output
+
+
+def export(
+    directory: str,
+    output_dir: str,
+    splits: Sequence[str] = ('train', 'dev', 'test'),
+    output_format: str = 'arrow',
+    tools: Optional[Sequence[str]] = None,
+    levels: Sequence[str] = LEVELS,
+):
+    """Convert available splits of DUE dataset to columnar files ({output_dir}/{split}.arrow or .parquet).
+
+    :param directory: dataset directory
+    :param output_dir: output directory
+    :param splits: names of splits to convert (missing ones are skipped)
+    :param output_format: 'arrow' (uncompressed, memory-mapped by readers) or 'parquet' (compressed)
+    :param tools: OCR tools to export, all tools present in the split by default
+    :param levels: segment levels to export (besides tokens)
+    """
+    for split in splits:
+        if not (Path(directory) / split / 'document.jsonl').exists():
+            continue
+        output = export_split(directory, split, Path(output_dir) / f'{split}{FORMATS[output_format]}', tools, levels)
+        logger.info(f'Split {split} exported to {output}')
+
+
+class _ListColumn:
+    """Zero-copy numpy views of rows of a flattened list column (possibly split into chunks)."""
+
+    def __init__(self, column: 'pa.ChunkedArray', dim: int = 0):
+        self.dim = dim
+        self.chunks = column.chunks
+        self.chunk_ends = np.cumsum([len(chunk) for chunk in self.chunks])
+        self.offsets = [chunk.offsets.to_numpy() for chunk in self.chunks]
+        self.values = [chunk.values.to_numpy(zero_copy_only=True) if dim else None for chunk in self.chunks]
+
+    def _locate(self, position: int) -> Tuple[int, int, int]:
+        chunk = int(np.searchsorted(self.chunk_ends, position, side='right'))
+        row = position - (self.chunk_ends[chunk - 1] if chunk else 0)
+        return chunk, int(self.offsets[chunk][row]), int(self.offsets[chunk][row + 1])
+
+    def array(self, position: int) -> np.ndarray:
+        chunk, start, end = self._locate(position)
+        return self.values[chunk][start:end].reshape(-1, self.dim)
+
+    def strings(self, position: int) -> TokenStore:
+        """Get strings of a row as a `TokenStore` sharing the UTF-8 buffer of the column."""
+        chunk, start, end = self._locate(position)
+        values = self.chunks[chunk].values
+        _, offsets, data = values.buffers()
+        string_offsets = np.frombuffer(offsets, dtype=np.int32)[values.offset + start:values.offset + end + 1]
+        if data is None or end == start:
+            return TokenStore(np.empty(0, dtype=np.uint8), np.zeros(1, dtype=np.int32))
+        buffer = np.frombuffer(data, dtype=np.uint8)[string_offsets[0]:string_offsets[-1]]
+        return TokenStore(buffer, string_offsets - string_offsets[0])
+
+
+class ArrowDataset(BenchmarkDocumentsMixin, RandomAccessDataset):
+    """Dataset reading a split exported with `export_split`, only the columns of requested OCR tool
+    and segment levels are read. Arrays of Doc2d are numpy views of Arrow buffers (of the memory-mapped file
+    in case of Arrow IPC format).
+
+    :param path: path of the .arrow or .parquet file
+    :param ocr: name of the OCR tool whose data are used
+    :param segment_levels: segment levels of Doc2d (tokens, pages and lines are supported)
+    :param group_annotations: whether to yield a single Document with all annotations of a document
+        instead of a Document per annotation
+    :param directory: dataset directory (used to locate page images), the directory of exported dataset by default
+    :param num_shards: number of shards the split is divided into (e.g., one per machine or process)
+    :param shard_id: index of the shard read by this dataset, from 0 to num_shards - 1
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ocr: str,
+        segment_levels: tuple = ("tokens", "pages"),
+        group_annotations: bool = False,
+        directory: Optional[Union[str, Path]] = None,
+        num_shards: int = 1,
+        shard_id: int = 0,
+    ):
+        require_pyarrow()
+        super(ArrowDataset, self).__init__()
+        self.path = Path(path)
+        self.ocr = ocr
+        self.segment_levels = segment_levels
+        self.group_annotations = group_annotations
+        self._directory = Path(directory) if directory is not None else None
+        assert 0 <= shard_id < num_shards, f'Shard {shard_id} out of range for {num_shards} shards'
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+        self._table: Optional['pa.Table'] = None
+        self._columns: Dict[str, Any] = {}
+        self._positions: Optional[Dict[str, int]] = None
+
+    @property
+    def levels(self) -> List[str]:
+        loader = CommonFormatLoader([], segment_levels=self.segment_levels)
+        return [level for level in LEVELS if level in loader.segment_levels]
+
+    def column_names(self, tools: Sequence[str]) -> List[str]:
+        """Get names of the columns read by this dataset.
+
+        :param tools: OCR tools present in the file, if the requested one is missing, all documents are skipped
+        """
+        names = ['name', 'annotations']
+        if self.ocr not in tools:
+            return names
+        names += [column_name(self.ocr, part) for part in ('docid', 'skip_reason', 'tokens', TOKEN_BBOXES[0])]
+        for level in self.levels:
+            names += [column_name(self.ocr, level, RANGES[0]), column_name(self.ocr, level, BBOXES[0])]
+        return names
+
+    def _check_levels(self, exported: List[str]):
+        missing = [level for level in self.levels if level not in exported]
+        if missing:
+            raise ValueError(
+                f'Segment levels {missing} were not exported to {self.path}, available levels are {exported}'
+            )
+
+    def table(self) -> 'pa.Table':
+        """Get (and read if needed) the table with the columns used by this dataset."""
+        if self._table is None:
+            if self.path.suffix == FORMATS['parquet']:
+                metadata = pq.read_schema(self.path).metadata
+                self._check_levels(json.loads(metadata[b'levels']))
+                columns = self.column_names(json.loads(metadata[b'tools']))
+                table = pq.read_table(self.path, columns=columns, memory_map=True)
+            else:
+                table = pa.ipc.open_file(pa.memory_map(str(self.path))).read_all()
+                self._check_levels(json.loads(table.schema.metadata[b'levels']))
+                table = table.select(self.column_names(json.loads(table.schema.metadata[b'tools'])))
+            self._table = table
+            self._columns = {
+                'name': table.column('name').to_pylist(),
+                'annotations': table.column('annotations'),
+            }
+            if column_name(self.ocr, 'docid') not in table.column_names:
+                self._columns['skip_reason'] = [SKIP_NO_COMMON_FORMAT] * table.num_rows
+                return table
+            self._columns.update({
+                'docid': table.column(column_name(self.ocr, 'docid')),
+                'skip_reason': table.column(column_name(self.ocr, 'skip_reason')).to_pylist(),
+                'tokens': _ListColumn(table.column(column_name(self.ocr, 'tokens'))),
+                'token_bboxes': _ListColumn(table.column(column_name(self.ocr, TOKEN_BBOXES[0])), TOKEN_BBOXES[2]),
+            })
+            for level in self.levels:
+                for suffix, _, dim in (RANGES, BBOXES):
+                    key = column_name(level, suffix)
+                    self._columns[key] = _ListColumn(table.column(column_name(self.ocr, level, suffix)), dim)
+        return self._table
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        return {key.decode('utf-8'): value.decode('utf-8') for key, value in self.table().schema.metadata.items()}
+
+    @property
+    def directory(self) -> Path:
+        return self._directory if self._directory is not None else Path(self.metadata['directory'])
+
+    def shard(self, num_shards: int, shard_id: int) -> 'ArrowDataset':
+        """Get a copy of the dataset reading only a contiguous part of the split.
+
+        :param num_shards: number of shards
+        :param shard_id: index of the shard (from 0 to num_shards - 1)
+        :return: sharded dataset
+        """
+        assert 0 <= shard_id < num_shards, f'Shard {shard_id} out of range for {num_shards} shards'
+        sharded = copy(self)
+        sharded.num_shards = num_shards
+        sharded.shard_id = shard_id
+        return sharded
+
+    def shard_positions(self) -> range:
+        """Get positions of documents assigned to the shard of this dataset (equal document counts).
+
+        :return: range of document positions
+        """
+        return range(*[len(self) * i // self.num_shards for i in (self.shard_id, self.shard_id + 1)])
+
+    def __iter__(self) -> Iterator[Document]:
+        yield from self._read_positions(self.shard_positions())
+
+    def iter_documents(
+        self, names: Optional[Iterable[str]] = None, start: Union[int, str] = 0
+    ) -> Iterator[Document]:
+        """Iterate over a subset of documents.
+
+        :param names: names of documents to read (in given order), all documents if not provided
+        :param start: position or name of the document to start from (e.g., to resume an epoch)
+        :return: iterator over Documents
+        """
+        positions = list(range(len(self))) if names is None else [self._position(name) for name in names]
+        if isinstance(start, str):
+            start = positions.index(self._position(start))
+        yield from self._read_positions(positions[start:])
+
+    def get_documents(self, name: str) -> List[Document]:
+        return list(self.iter_documents([name]))
+
+    def __len__(self) -> int:
+        return self.table().num_rows
+
+    def _position(self, item: Union[int, str]) -> int:
+        if isinstance(item, str):
+            if self._positions is None:
+                self.table()
+                self._positions = {name: i for i, name in enumerate(self._columns['name'])}
+            if item not in self._positions:
+                raise KeyError(f'No document named {item} in {self.path}')
+            return self._positions[item]
+        if not -len(self) <= item < len(self):
+            raise IndexError(f'Document position {item} out of range')
+        return item % len(self)
+
+    def __getitem__(self, item: Union[int, str]) -> List[Document]:
+        return list(self._read_positions([self._position(item)]))
+
+    def num_instances(self, item: Union[int, str]) -> int:
+        position = self._position(item)
+        if self._columns['skip_reason'][position] is not None:
+            return 0
+        annotations = json.loads(self._columns['annotations'][position].as_py())
+        return sum(len(self._annotation_dict(annotation)) for annotation in annotations)
+
+    def doc2d(self, position: int) -> Doc2d:
+        """Build Doc2d of a document from views of the columns."""
+        self.table()
+        columns = self._columns
+        seg_data: Dict[str, Any] = {'tokens': {'org_bboxes': columns['token_bboxes'].array(position)}}
+        for level in self.levels:
+            seg_data[level] = {
+                'ranges': columns[column_name(level, RANGES[0])].array(position),
+                'org_bboxes': columns[column_name(level, BBOXES[0])].array(position),
+            }
+        tokens = columns['tokens'].strings(position)
+        return Doc2d(tokens=tokens, seg_data=seg_data, docid=columns['docid'][position].as_py())
+
+    def _read_positions(self, positions: Iterable[int]) -> Iterator[Document]:
+        self.table()
+        for position in positions:
+            instrumentation.count('reader.arrow_rows')
+            doc_dict = {
+                'name': self._columns['name'][position],
+                'annotations': json.loads(self._columns['annotations'][position].as_py()),
+            }
+            skip_reason = self._columns['skip_reason'][position]
+            if skip_reason is not None:
+                warn_skipped(doc_dict, skip_reason)
+                continue
+            yield from self.to_documents(doc_dict, self.doc2d(position))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    fire.Fire({'export': export})
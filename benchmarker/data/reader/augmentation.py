@@ -0,0 +1,130 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Union
+
+import numpy as np
+
+from benchmarker.data.document import TokenStore
+
+
+def read_synonyms(lines: Iterable[str]) -> Dict[str, Set[str]]:
+    """Read synonyms dictionary, each line holds space-separated synonyms (with _ in place of spaces).
+
+    :param lines: lines of the synonyms file
+    :return: mapping of lowercased token to the set of its candidates
+    """
+    synonyms: Dict[str, Set[str]] = defaultdict(set)
+    for line in lines:
+        tokens = [t.lower() for t in line.rstrip().split()]
+        for tok in tokens:
+            synonyms[tok].update([t.replace('_', ' ') for t in tokens])
+    return synonyms
+
+
+class SynonymTable:
+    """Precompiled synonyms dictionary used to augment tokens of whole documents at once.
+
+    Each distinct set of candidates is stored once (as a group) in a single array of candidates,
+    tokens are mapped to group ids, so candidates for all tokens of a document are drawn in one call.
+
+    :param synonyms: mapping of lowercased token to the set of its candidates
+    :param seed: seed of the random generator, used for reproducible augmentation
+    """
+
+    def __init__(self, synonyms: Dict[str, Set[str]], seed: Optional[Union[int, np.random.SeedSequence]] = None):
+        group_ids: Dict[tuple, int] = {}
+        candidates: List[str] = []
+        starts: List[int] = []
+        self.token_groups: Dict[str, int] = {}
+        for token, token_candidates in synonyms.items():
+            group = tuple(sorted(token_candidates))
+            if group not in group_ids:
+                group_ids[group] = len(starts)
+                starts.append(len(candidates))
+                candidates.extend(group)
+            self.token_groups[token] = group_ids[group]
+        self.candidates = np.array(candidates, dtype=object)
+        self.candidate_bytes = [np.frombuffer(c.encode('utf-8'), dtype=np.uint8) for c in candidates]
+        self.candidate_lengths = np.array([len(c) for c in self.candidate_bytes], dtype=np.int64)
+        # sorted fixed-width keys, used to look up tokens of token stores with binary search
+        keys = np.array([t.encode('utf-8') for t in self.token_groups], dtype=bytes).reshape(-1)
+        self.max_token_bytes = keys.dtype.itemsize if len(keys) else 0
+        order = np.argsort(keys)
+        self.sorted_keys = keys[order]
+        self.sorted_key_groups = np.fromiter(self.token_groups.values(), dtype=np.int64, count=len(keys))[order]
+        self.group_starts = np.array(starts, dtype=np.int64)
+        self.group_sizes = np.diff(np.append(self.group_starts, len(candidates)))
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_file(cls, path: str, seed: Optional[int] = None) -> 'SynonymTable':
+        with open(path) as ins:
+            return cls(read_synonyms(ins), seed=seed)
+
+    def __len__(self) -> int:
+        return len(self.token_groups)
+
+    def __contains__(self, token: str) -> bool:
+        return token.lower() in self.token_groups
+
+    def sample(self, tokens: Sequence[str]) -> Sequence[str]:
+        """Replace each token having synonyms with a candidate drawn uniformly from its group.
+
+        Token stores are looked up and augmented as a whole (see `_store_groups`), without decoding each token.
+
+        :param tokens: tokens of a document
+        :return: augmented tokens, a token store if tokens were stored in one, a list otherwise
+        """
+        if isinstance(tokens, TokenStore):
+            groups = self._store_groups(tokens)
+        else:
+            groups = np.fromiter(
+                (self.token_groups.get(t.lower(), -1) for t in tokens), dtype=np.int64, count=len(tokens)
+            )
+        positions = np.flatnonzero(groups >= 0)
+        if positions.size == 0:
+            return tokens if isinstance(tokens, TokenStore) else list(tokens)
+        groups = groups[positions]
+        chosen = self.group_starts[groups] + self.rng.integers(0, self.group_sizes[groups])
+        if isinstance(tokens, TokenStore):
+            return self._replace(tokens, positions, chosen)
+        augmented = list(tokens)
+        for position, candidate in zip(positions.tolist(), self.candidates[chosen].tolist()):
+            augmented[position] = candidate
+        return augmented
+
+    def _store_groups(self, tokens: TokenStore) -> np.ndarray:
+        """Get group of each token of a store (-1 if it has no synonyms).
+
+        Lowercased tokens not longer than the longest synonym are laid out as rows of a fixed-width byte array
+        and looked up in sorted keys with binary search, no token is decoded.
+        """
+        groups = np.full(len(tokens), -1, dtype=np.int64)
+        lowered = tokens.lower()
+        lengths = np.diff(lowered.offsets)
+        rows = np.flatnonzero((lengths > 0) & (lengths <= self.max_token_bytes))
+        if rows.size == 0:
+            return groups
+        columns = np.arange(self.max_token_bytes)
+        inside = columns < lengths[rows, None]
+        index = np.where(inside, lowered.offsets[rows, None].astype(np.int64) + columns, 0)
+        matrix = np.where(inside, lowered.buffer[index], 0).astype(np.uint8)
+        keys = matrix.view(self.sorted_keys.dtype).ravel()
+        found = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+        matched = self.sorted_keys[found] == keys
+        groups[rows[matched]] = self.sorted_key_groups[found[matched]]
+        return groups
+
+    def _replace(self, tokens: TokenStore, positions: np.ndarray, chosen: np.ndarray) -> TokenStore:
+        """Build a store with tokens at positions replaced by chosen candidates."""
+        offsets = tokens.offsets.astype(np.int64)
+        pieces = []
+        end = 0
+        for position, candidate in zip(positions.tolist(), chosen.tolist()):
+            pieces += [tokens.buffer[end:offsets[position]], self.candidate_bytes[candidate]]
+            end = offsets[position + 1]
+        pieces.append(tokens.buffer[end:])
+        lengths = np.diff(offsets)
+        lengths[positions] = self.candidate_lengths[chosen]
+        new_offsets = np.zeros(len(offsets), dtype=np.int32)
+        np.cumsum(lengths, out=new_offsets[1:])
+        return TokenStore(np.concatenate(pieces), new_offsets)
@@ -1,18 +1,28 @@
 import json
 import logging
 import os
-from collections import defaultdict
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from copy import copy
+from functools import partial
 from pathlib import Path
-from typing import Dict, Iterator, List, Set, Tuple, Union
+from typing import BinaryIO, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 import pandas as pd
 
 from benchmarker.data.document import Doc2d
-from benchmarker.data.reader.common import Dataset, Document
+from benchmarker.data.reader.common import Document, RandomAccessDataset
+from benchmarker.data.reader.content_index import JsonlIndex, load_common_format
+from benchmarker.data.reader.doc2d_cache import Doc2dCache, Doc2dCacheWriter, cache_location
 from benchmarker.input_loader.common_format import CommonFormatLoader
+from benchmarker.utils import instrumentation
 
 logger = logging.getLogger(__name__)
 
+SKIP_NO_COMMON_FORMAT = 'no_common_format'
+SKIP_NO_TOKENS = 'no_tokens'
+
 
 def get_value(annotation_value: Dict) -> List:
     if 'value_variants' in annotation_value:
@@ -29,59 +39,120 @@ def get_child_values(annotation_values: List[Dict]) -> List:
     return values
 
 
-class BenchmarkDataset(Dataset):
-    """docstring for BenchmarkDataset"""
+def decode_common_format(
+    doc_content: bytes, ocr: str, selective_parsing: bool = True, spans: Optional[Dict[str, Tuple[int, int]]] = None
+) -> Optional[Dict]:
+    """Decode common format of an OCR tool from a documents_content.jsonl line (see `decode_document`).
 
-    def __init__(self, directory: Path, split: str, ocr: str, segment_levels: tuple = ("tokens", "pages")):
-        super(BenchmarkDataset, self).__init__()
-        self.directory = directory
-        self.split = split
-        self.ocr = ocr
-        self.segment_levels = segment_levels
+    :return: common format or None if the line has no content of the tool
+    """
+    if selective_parsing:
+        return load_common_format(doc_content, ocr, spans)
+    tool2cf = {c['tool_name']: c for c in json.loads(doc_content)['contents']}
+    return tool2cf.get(ocr, {}).get('common_format')
 
-    def __iter__(self) -> Iterator[Document]:
-        docs_jsonl_path = self.directory / self.split / 'document.jsonl'
-        docs_content_jsonl_path = self.directory / self.split / 'documents_content.jsonl'
-        with open(docs_jsonl_path) as docs_file, open(docs_content_jsonl_path) as docs_content_file:
-            for doc_line, doc_content in zip(docs_file, docs_content_file):
-                doc_dict = json.loads(doc_line)
-                identifier = f'{doc_dict["name"]}'
-                doc_content_dict = json.loads(doc_content)
-                tool2cf = {c['tool_name']: c for c in doc_content_dict['contents']}
-                if self.ocr not in tool2cf:
-                    logging.warning(f'No common format for {doc_dict["name"]}. Skipping it')
-                    continue
-                if not tool2cf[self.ocr]['common_format']['tokens']:
-                    logging.warning(f'No tokens in common format for {doc_dict["name"]}. Skipping it')
-                    continue
-                common_format = tool2cf[self.ocr]['common_format']
-                loader = CommonFormatLoader([], segment_levels=self.segment_levels)
-                doc2d = loader.to_doc2d(common_format)
-                img_dir = self.directory / 'png' / identifier.split('.pdf')[0]
-                if not img_dir.exists():
-                    logger.warning(f"Cannot locate directory {img_dir}")
-                doc2d.seg_data['lazyimages'] = {'path': img_dir}
-
-                for annotation in doc_dict['annotations']:
-                    annotations = defaultdict(list)
-                    question = annotation['key']
-
-                    values = []
-                    for i, value in enumerate(annotation['values']):
-                        if 'children' in value:
-                            # XXX: this part could be specific to PWC dataset and might need some changes
-                            # for different datasets with 'children' keys
-                            for child in value['children']:
-                                child_question = f"What are the {question} values for the {child['key']} column?"
-                                annotations[child_question] += get_child_values(child['values'])
-                        else:
-                            values += get_value(value)
-
-                    if values:
-                        annotations[question] = values
-
-                    document = Document(identifier, doc2d, annotations)
-                    yield document
+
+def common_format_skip_reason(common_format: Optional[Dict]) -> Optional[str]:
+    """Get the reason documents with given common format are skipped by readers (None if they are not skipped)."""
+    if common_format is None:
+        return SKIP_NO_COMMON_FORMAT
+    if not common_format['tokens']:
+        return SKIP_NO_TOKENS
+    return None
+
+
+def decode_document(
+    doc_line: bytes,
+    doc_content: bytes,
+    ocr: str,
+    segment_levels: Sequence[str],
+    selective_parsing: bool = True,
+    spans: Optional[Dict[str, Tuple[int, int]]] = None,
+) -> Tuple[Dict, Optional[Doc2d], Optional[str]]:
+    """Parse a pair of document.jsonl and documents_content.jsonl lines and convert common format to Doc2d.
+
+    :param doc_line: document.jsonl line
+    :param doc_content: documents_content.jsonl line (or its part, if spans are provided)
+    :param ocr: name of the OCR tool
+    :param segment_levels: segment levels passed to `CommonFormatLoader`
+    :param selective_parsing: whether to decode only the common format of the requested OCR tool
+    :param spans: spans of tool objects within doc_content (see `load_common_format`)
+    :return: document.jsonl record, Doc2d (None if skipped) and skip reason (None if not skipped)
+    """
+    doc_dict = json.loads(doc_line)
+    common_format = decode_common_format(doc_content, ocr, selective_parsing, spans)
+    skip_reason = common_format_skip_reason(common_format)
+    if skip_reason is not None:
+        return doc_dict, None, skip_reason
+    loader = CommonFormatLoader([], segment_levels=segment_levels)
+    return doc_dict, loader.to_doc2d(common_format), None
+
+
+def group_annotations(annotation_dicts: List[Dict[str, List[str]]]) -> List[Dict[str, List[str]]]:
+    """Merge annotations of a document, so all of them are served by a single Document.
+
+    A new group is started whenever a key repeats, thus no annotation values are merged
+    and the same instances (in the same order) are produced as for separate annotations.
+
+    :param annotation_dicts: annotations (key to values mapping) of consecutive annotation entries
+    :return: merged annotations
+    """
+    groups: List[Dict[str, List[str]]] = []
+    for annotations in annotation_dicts:
+        if not groups or any(key in groups[-1] for key in annotations):
+            groups.append(defaultdict(list))
+        groups[-1].update(annotations)
+    return groups
+
+
+def warn_skipped(doc_dict: Dict, skip_reason: str):
+    instrumentation.count(f'reader.skipped.{skip_reason}')
+    if skip_reason == SKIP_NO_COMMON_FORMAT:
+        logging.warning(f'No common format for {doc_dict["name"]}. Skipping it')
+    else:
+        logging.warning(f'No tokens in common format for {doc_dict["name"]}. Skipping it')
+
+
+class BenchmarkDocumentsMixin:
+    """Conversion of document.jsonl records to Documents, shared by readers of DUE benchmark splits.
+
+    Classes using it need `directory` (dataset directory) and `group_annotations` attributes.
+    """
+
+    def to_documents(self, doc_dict: Dict, doc2d: Doc2d) -> Iterator[Document]:
+        """Yield Documents of a document.jsonl record (one per annotation, unless annotations are grouped)."""
+        identifier = f'{doc_dict["name"]}'
+        img_dir = self.directory / 'png' / identifier.split('.pdf')[0]
+        if not img_dir.exists():
+            logger.warning(f"Cannot locate directory {img_dir}")
+        doc2d.seg_data['lazyimages'] = {'path': img_dir}
+
+        annotation_dicts = [self._annotation_dict(annotation) for annotation in doc_dict['annotations']]
+        if self.group_annotations:
+            annotation_dicts = group_annotations(annotation_dicts)
+        for annotations in annotation_dicts:
+            document = Document(identifier, doc2d, annotations)
+            yield document
+
+    @staticmethod
+    def _annotation_dict(annotation: Dict) -> Dict[str, List[str]]:
+        annotations = defaultdict(list)
+        question = annotation['key']
+
+        values = []
+        for i, value in enumerate(annotation['values']):
+            if 'children' in value:
+                # XXX: this part could be specific to PWC dataset and might need some changes
+                # for different datasets with 'children' keys
+                for child in value['children']:
+                    child_question = f"What are the {question} values for the {child['key']} column?"
+                    annotations[child_question] += get_child_values(child['values'])
+            else:
+                values += get_value(value)
+
+        if values:
+            annotations[question] = values
+        return annotations
 
     def output_prefix(self, value: str) -> str:
         """Format key as output_prefix (e.g, append "=").
@@ -98,9 +169,332 @@ class BenchmarkDataset(Dataset):
         return value
 
 
+class BenchmarkDataset(BenchmarkDocumentsMixin, RandomAccessDataset):
+    """Dataset reading DUE benchmark split (document.jsonl with documents_content.jsonl).
+
+    Random access (by document name or position, see `RandomAccessDataset`) is served by byte-offset indices
+    of both files, which are built on first use and persisted next to them (see `JsonlIndex`).
+
+    :param directory: dataset directory
+    :param split: name of the split (subdirectory)
+    :param ocr: name of the OCR tool whose common format is used
+    :param segment_levels: segment levels passed to `CommonFormatLoader`
+    :param selective_parsing: whether to decode only the common format of the requested OCR tool
+        instead of the whole documents_content.jsonl line
+    :param cache_dir: if provided, converted Doc2d are cached in this directory during the first iteration
+        and read from memory-mapped cache afterwards (see `Doc2dCache`)
+    :param num_workers: number of processes decoding documents, decoding is done in the main process if 0
+    :param max_in_flight: maximal number of documents submitted to workers at once (4 * num_workers by default)
+    :param group_annotations: whether to yield a single Document with all annotations of a document
+        instead of a Document per annotation
+    :param num_shards: number of shards the split is divided into (e.g., one per machine or process)
+    :param shard_id: index of the shard read by this dataset, from 0 to num_shards - 1
+    :param shard_by: how to balance shards, 'documents' (equal document counts)
+        or 'bytes' (equal size of documents_content.jsonl parts)
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        split: str,
+        ocr: str,
+        segment_levels: tuple = ("tokens", "pages"),
+        selective_parsing: bool = True,
+        cache_dir: Optional[Union[str, Path]] = None,
+        num_workers: int = 0,
+        max_in_flight: Optional[int] = None,
+        group_annotations: bool = False,
+        num_shards: int = 1,
+        shard_id: int = 0,
+        shard_by: str = 'documents',
+    ):
+        super(BenchmarkDataset, self).__init__()
+        self.directory = Path(directory)
+        self.split = split
+        self.ocr = ocr
+        self.segment_levels = segment_levels
+        self.selective_parsing = selective_parsing
+        self.cache_dir = cache_dir
+        self.num_workers = num_workers
+        self.max_in_flight = max_in_flight
+        self.group_annotations = group_annotations
+        assert 0 <= shard_id < num_shards, f'Shard {shard_id} out of range for {num_shards} shards'
+        assert shard_by in ('documents', 'bytes'), f'Unsupported shard_by value: {shard_by}'
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+        self.shard_by = shard_by
+        self._docs_index: Optional[JsonlIndex] = None
+        self._content_index: Optional[JsonlIndex] = None
+
+    @property
+    def docs_jsonl_path(self) -> Path:
+        return self.directory / self.split / 'document.jsonl'
+
+    @property
+    def docs_content_jsonl_path(self) -> Path:
+        return self.directory / self.split / 'documents_content.jsonl'
+
+    def index(self) -> Tuple[JsonlIndex, JsonlIndex]:
+        """Get (and build if needed) indices of document.jsonl and documents_content.jsonl.
+
+        :return: tuple of document.jsonl index and documents_content.jsonl index
+        """
+        if self._docs_index is None or not self._docs_index.is_valid():
+            self._docs_index = JsonlIndex.open(self.docs_jsonl_path)
+        if self._content_index is None or not self._content_index.is_valid():
+            self._content_index = JsonlIndex.open(self.docs_content_jsonl_path, with_tools=True)
+        assert len(self._docs_index) == len(self._content_index), (
+            f'Number of lines in {self.docs_jsonl_path} and {self.docs_content_jsonl_path} differ'
+        )
+        return self._docs_index, self._content_index
+
+    def cache(self) -> Optional[Doc2dCache]:
+        """Get up-to-date Doc2d cache of the split if caching is enabled and the cache was built.
+
+        :return: cache or None
+        """
+        if self.cache_dir is None:
+            return None
+        return Doc2dCache.open(self._cache_path(), [self.docs_jsonl_path, self.docs_content_jsonl_path])
+
+    def _cache_path(self) -> Path:
+        return cache_location(self.cache_dir, self.directory, self.split, self.ocr, self.segment_levels)
+
+    def shard(self, num_shards: int, shard_id: int) -> 'BenchmarkDataset':
+        """Get a copy of the dataset reading only a contiguous part of the split.
+
+        Only the lines of the shard are read (using byte-offset index), see `shard_positions`.
+
+        :param num_shards: number of shards
+        :param shard_id: index of the shard (from 0 to num_shards - 1)
+        :return: sharded dataset
+        """
+        assert 0 <= shard_id < num_shards, f'Shard {shard_id} out of range for {num_shards} shards'
+        sharded = copy(self)
+        sharded.num_shards = num_shards
+        sharded.shard_id = shard_id
+        return sharded
+
+    def shard_positions(self) -> range:
+        """Get positions of documents assigned to the shard of this dataset.
+
+        :return: range of document positions
+        """
+        docs_index, content_index = self.index()
+        if self.shard_by == 'documents':
+            bounds = [len(docs_index) * i // self.num_shards for i in (self.shard_id, self.shard_id + 1)]
+        else:
+            offsets = [entry.offset for entry in content_index.entries]
+            total = content_index.entries[-1].offset + content_index.entries[-1].length if offsets else 0
+            bounds = [bisect_left(offsets, total * i / self.num_shards) for i in (self.shard_id, self.shard_id + 1)]
+        return range(*bounds)
+
+    def __iter__(self) -> Iterator[Document]:
+        if self.num_shards > 1:
+            yield from self._read_positions(list(self.shard_positions()))
+            return
+
+        cache = self.cache()
+        if cache is not None:
+            yield from self._read_cache(cache, range(len(cache)))
+            return
+
+        writer = self._cache_writer()
+        try:
+            yield from self._read_files(writer)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        if writer is not None:
+            writer.commit()
+
+    def _cache_writer(self) -> Optional[Doc2dCacheWriter]:
+        if self.cache_dir is None:
+            return None
+        loader = CommonFormatLoader([], segment_levels=self.segment_levels)
+        levels = [level for level in loader.segment_levels if level in ('lines', 'pages')]
+        sources = [self.docs_jsonl_path, self.docs_content_jsonl_path]
+        return Doc2dCacheWriter(self._cache_path(), sources, levels)
+
+    def _read_files(self, writer: Optional[Doc2dCacheWriter] = None) -> Iterator[Document]:
+        """Read all documents sequentially, appending them to the cache writer if given."""
+        with open(self.docs_jsonl_path, 'rb') as docs_file, open(self.docs_content_jsonl_path, 'rb') as content_file:
+            lines = ((doc_line, doc_content, None) for doc_line, doc_content in zip(docs_file, content_file))
+            for doc_dict, doc2d, skip_reason in self._decode(lines):
+                if writer is not None:
+                    writer.append(doc_dict, doc2d, skip_reason)
+                if skip_reason is not None:
+                    warn_skipped(doc_dict, skip_reason)
+                    continue
+                yield from self.to_documents(doc_dict, doc2d)
+
+    def iter_documents(
+        self, names: Optional[Iterable[str]] = None, start: Union[int, str] = 0
+    ) -> Iterator[Document]:
+        """Iterate over a subset of documents without reading the rest of the files.
+
+        :param names: names of documents to read (in given order), all documents if not provided
+        :param start: position or name of the document to start from (e.g., to resume an epoch)
+        :return: iterator over Documents
+        """
+        docs_index, _ = self.index()
+        if names is None:
+            positions = list(range(len(docs_index)))
+        else:
+            positions = [docs_index.position(name) for name in names]
+        if isinstance(start, str):
+            start = positions.index(docs_index.position(start))
+        yield from self._read_positions(positions[start:])
+
+    def get_documents(self, name: str) -> List[Document]:
+        """Get Documents (one per annotation) of the document with given name.
+
+        :param name: document name
+        :return: list of Documents, empty if document is skipped (e.g., no requested OCR)
+        """
+        return list(self.iter_documents([name]))
+
+    def __len__(self) -> int:
+        docs_index, _ = self.index()
+        return len(docs_index)
+
+    def _position(self, item: Union[int, str]) -> int:
+        docs_index, _ = self.index()
+        if isinstance(item, str):
+            return docs_index.position(item)
+        if not -len(docs_index) <= item < len(docs_index):
+            raise IndexError(f'Document position {item} out of range')
+        return item % len(docs_index)
+
+    def __getitem__(self, item: Union[int, str]) -> List[Document]:
+        return list(self._read_positions([self._position(item)]))
+
+    def num_instances(self, item: Union[int, str]) -> int:
+        position = self._position(item)
+        cache = self.cache()
+        if cache is not None:
+            doc_dict = cache.document(position)
+            if doc_dict['skip_reason'] is not None:
+                return 0
+        else:
+            _, content_index = self.index()
+            if content_index[position].tools and self.ocr not in content_index[position].tools:
+                return 0
+            with open(self.docs_jsonl_path, 'rb') as docs, open(self.docs_content_jsonl_path, 'rb') as content:
+                doc_line, doc_content, spans = next(self._read_lines(docs, content, [position]))
+            # documents are skipped the same way as by iteration
+            common_format = decode_common_format(doc_content, self.ocr, self.selective_parsing, spans)
+            if common_format_skip_reason(common_format) is not None:
+                return 0
+            doc_dict = json.loads(doc_line)
+        return sum(len(self._annotation_dict(annotation)) for annotation in doc_dict['annotations'])
+
+    def _read_positions(self, positions: List[int]) -> Iterator[Document]:
+        cache = self.cache()
+        if cache is not None:
+            yield from self._read_cache(cache, positions)
+            return
+
+        docs_index, content_index = self.index()
+        with open(self.docs_jsonl_path, 'rb') as docs_file, open(self.docs_content_jsonl_path, 'rb') as content_file:
+            for doc_dict, doc2d, skip_reason in self._decode(
+                self._read_lines(docs_file, content_file, positions)
+            ):
+                if skip_reason is not None:
+                    warn_skipped(doc_dict, skip_reason)
+                    continue
+                yield from self.to_documents(doc_dict, doc2d)
+
+    def _read_lines(
+        self, docs_file: BinaryIO, content_file: BinaryIO, positions: List[int]
+    ) -> Iterator[Tuple[bytes, bytes, Optional[Dict[str, Tuple[int, int]]]]]:
+        docs_index, content_index = self.index()
+        for doc_line, position in zip(docs_index.read_lines(docs_file, positions), positions):
+            entry = content_index[position]
+            if self.selective_parsing and entry.tools:
+                # only the object of the requested tool is read from disk
+                tool_content = content_index.read_tool(content_file, entry, self.ocr) or b''
+                yield doc_line, tool_content, {self.ocr: (0, len(tool_content))} if tool_content else {}
+            else:
+                yield doc_line, content_index.read(content_file, entry), None
+
+    def _decode(
+        self, lines: Iterator[Tuple[bytes, bytes, Optional[Dict[str, Tuple[int, int]]]]]
+    ) -> Iterator[Tuple[Dict, Optional[Doc2d], Optional[str]]]:
+        decode = partial(
+            decode_document, ocr=self.ocr, segment_levels=self.segment_levels, selective_parsing=self.selective_parsing
+        )
+        lines = self._count_lines(lines)
+        if self.num_workers <= 0:
+            for doc_line, doc_content, spans in lines:
+                with instrumentation.timer('reader.decode'):
+                    decoded = decode(doc_line, doc_content, spans=spans)
+                yield decoded
+            return
+        yield from self._decode_parallel(decode, lines)
+
+    def _decode_parallel(
+        self, decode: Callable, lines: Iterator[Tuple[bytes, bytes, Optional[Dict[str, Tuple[int, int]]]]]
+    ) -> Iterator[Tuple[Dict, Optional[Doc2d], Optional[str]]]:
+        """Decode lines in a process pool, results are yielded in order of lines."""
+        max_in_flight = self.max_in_flight or 4 * self.num_workers
+        pending: Deque[Future] = deque()
+        with ProcessPoolExecutor(self.num_workers) as executor:
+            try:
+                for doc_line, doc_content, spans in lines:
+                    # bound the number of submitted documents, results are yielded in submission order
+                    if len(pending) >= max_in_flight:
+                        yield pending.popleft().result()
+                    pending.append(executor.submit(decode, doc_line, doc_content, spans=spans))
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _count_lines(
+        lines: Iterator[Tuple[bytes, bytes, Optional[Dict[str, Tuple[int, int]]]]]
+    ) -> Iterator[Tuple[bytes, bytes, Optional[Dict[str, Tuple[int, int]]]]]:
+        for line in lines:
+            if instrumentation.enabled():
+                instrumentation.count('reader.lines')
+                instrumentation.count('reader.bytes', len(line[0]) + len(line[1]))
+            yield line
+
+    def _read_cache(self, cache: Doc2dCache, positions: Iterable[int]) -> Iterator[Document]:
+        for position in positions:
+            instrumentation.count('reader.cached_lines')
+            doc_dict = cache.document(position)
+            if doc_dict['skip_reason'] is not None:
+                warn_skipped(doc_dict, doc_dict['skip_reason'])
+                continue
+            yield from self.to_documents(doc_dict, cache.doc2d(position))
+
+
 class BenchmarkCorpusMixin:
     def read_benchmark_challenge(self, directory: Union[str, Path], **kwargs):
+        """Set train, dev and test datasets to splits of DUE benchmark dataset.
+
+        :param directory: dataset directory
+        :param kwargs: other BenchmarkDataset parameters (e.g., ocr, segment_levels, num_workers)
+        """
         for split in ['train', 'dev', 'test']:
             inner_attribute = '_' + split
             setattr(self, inner_attribute, BenchmarkDataset(directory, split, **kwargs))
 
+    def read_arrow_challenge(self, directory: Union[str, Path], **kwargs):
+        """Set train, dev and test datasets to splits of DUE benchmark dataset exported to columnar files
+        ({directory}/{split}.arrow or .parquet, see `arrow_dataset.export`).
+
+        :param directory: directory of exported splits
+        :param kwargs: other ArrowDataset parameters (e.g., ocr, segment_levels)
+        """
+        from benchmarker.data.reader.arrow_dataset import FORMATS, ArrowDataset
+
+        for split in ['train', 'dev', 'test']:
+            paths = [Path(directory) / f'{split}{suffix}' for suffix in FORMATS.values()]
+            existing = [path for path in paths if path.exists()]
+            if existing:
+                setattr(self, '_' + split, ArrowDataset(existing[0], **kwargs))
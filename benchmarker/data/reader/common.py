@@ -1,12 +1,15 @@
+import zlib
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Dict, Iterator, List, Set
+from typing import Dict, Iterator, List, Set, Union
 
 from benchmarker.data.document import Doc2d
 
 
 @dataclass
 class Document:
+    __slots__ = ('identifier', 'document_2d', 'annotations')
+
     identifier: str
     document_2d: Doc2d
     annotations: Dict[str, List[str]]
@@ -14,6 +17,8 @@ class Document:
 
 @dataclass
 class DataInstance:
+    __slots__ = ('identifier', 'input_prefix', 'document_2d', 'output_prefix', 'output')
+
     identifier: str
     input_prefix: str
     document_2d: Doc2d
@@ -67,3 +72,82 @@ class Dataset(ABC):
         :return: set of labels
         """
         raise ValueError('Dataset has to provide labels property to return None answers')
+
+    def shard(self, num_shards: int, shard_id: int) -> 'Dataset':
+        """Get a view of the dataset with the documents assigned to given shard only.
+
+        Shards are disjoint and cover the whole dataset. This generic implementation assigns documents
+        by a hash of their identifiers, so each shard still reads the whole dataset; datasets
+        with random access should override it.
+
+        :param num_shards: number of shards
+        :param shard_id: index of the shard (from 0 to num_shards - 1)
+        :return: sharded dataset
+        """
+        return ShardedDataset(self, num_shards, shard_id)
+
+
+class ShardedDataset(Dataset):
+    """Documents of the wrapped dataset whose identifiers hash to given shard.
+
+    :param dataset: wrapped dataset
+    :param num_shards: number of shards
+    :param shard_id: index of the shard
+    """
+
+    def __init__(self, dataset: Dataset, num_shards: int, shard_id: int):
+        assert 0 <= shard_id < num_shards, f'Shard {shard_id} out of range for {num_shards} shards'
+        self.dataset = dataset
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+
+    def __iter__(self) -> Iterator[Document]:
+        for document in self.dataset:
+            if zlib.crc32(document.identifier.encode('utf-8')) % self.num_shards == self.shard_id:
+                yield document
+
+    def escape(self, value: str) -> str:
+        return self.dataset.escape(value)
+
+    def unescape(self, value: str) -> str:
+        return self.dataset.unescape(value)
+
+    def output_prefix(self, value: str) -> str:
+        return self.dataset.output_prefix(value)
+
+    @property
+    def labels(self) -> Set[str]:
+        return self.dataset.labels
+
+
+class RandomAccessDataset(Dataset):
+    """Dataset giving access to documents by position or name, e.g., for shuffled or sharded reading.
+
+    Positions refer to source documents, each of them can produce several Documents (e.g., one per annotation).
+    """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Get the number of source documents."""
+
+    @abstractmethod
+    def __getitem__(self, item: Union[int, str]) -> List[Document]:
+        """Get Documents of the source document with given position or name.
+
+        :param item: position or name of the document
+        :return: list of Documents, empty if the document is skipped
+        """
+
+    @abstractmethod
+    def num_instances(self, item: Union[int, str]) -> int:
+        """Get the number of annotation keys of the document without reading its content.
+
+        It is the number of DataInstances produced for the document by single-value strategies.
+
+        :param item: position or name of the document
+        :return: number of annotation keys
+        """
+
+    def instance_counts(self) -> List[int]:
+        """Get the number of annotation keys of every document (e.g., to weight sampling)."""
+        return [self.num_instances(i) for i in range(len(self))]
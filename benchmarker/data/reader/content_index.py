@@ -0,0 +1,256 @@
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# A bare (unescaped) quote can not occur inside a JSON string, so these patterns
+# only ever match real keys of the top-level document object and of the OCR tool objects
+NAME_PATTERN = re.compile(rb'^\s*\{\s*"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+TOOL_PATTERN = re.compile(rb'\{\s*"tool_name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+COMMON_FORMAT_PATTERN = re.compile(rb'"common_format"\s*:\s*')
+_DECODER = json.JSONDecoder()
+
+
+def file_signature(path: Union[str, Path]) -> Dict[str, int]:
+    """Get size and modification time used to check if a file changed.
+
+    :param path: path to the file
+    :return: dictionary with size and mtime_ns of the file
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _unescape(raw: bytes) -> str:
+    return json.loads(b'"' + raw + b'"')
+
+
+def line_name(line: bytes) -> str:
+    """Get the name of a document stored in a jsonl line.
+
+    :param line: document.jsonl or documents_content.jsonl line
+    :return: value of the "name" field
+    """
+    match = NAME_PATTERN.match(line)
+    if match:
+        return _unescape(match.group(1))
+    return json.loads(line)['name']
+
+
+def tool_spans(line: bytes) -> Dict[str, Tuple[int, int]]:
+    """Locate objects of each OCR tool in documents_content.jsonl line.
+
+    Spans are not exact, each of them reaches the beginning of the next tool object (or the end of the line),
+    so they contain trailing separators which are ignored by `json.JSONDecoder.raw_decode`.
+
+    :param line: documents_content.jsonl line
+    :return: dictionary mapping tool name to (offset, length) of its object within the line, empty if some tool
+        objects could not be located (e.g., "tool_name" is not their first key), so the line needs to be parsed whole
+    """
+    matches = list(TOOL_PATTERN.finditer(line))
+    if len(matches) != line.count(b'"tool_name"'):
+        return {}
+    spans: Dict[str, Tuple[int, int]] = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(line)
+        spans.setdefault(_unescape(match.group(1)), (match.start(), end - match.start()))
+    return spans
+
+
+def load_common_format(
+    content: bytes, tool_name: str, spans: Optional[Dict[str, Tuple[int, int]]] = None
+) -> Optional[Dict]:
+    """Decode common format of a single OCR tool, leaving objects of other tools (and its text) unparsed.
+
+    Falls back to parsing the whole line when its layout is not the expected one.
+
+    :param content: documents_content.jsonl line or its part containing the object of the tool
+    :param tool_name: name of the OCR tool
+    :param spans: spans of tool objects in content, located with `tool_spans` if not provided
+    :return: common format dictionary or None if the tool (or its common format) is missing
+    """
+    if spans is None:
+        spans = tool_spans(content)
+        if not spans:
+            tool2content = {c['tool_name']: c for c in json.loads(content)['contents']}
+            return tool2content.get(tool_name, {}).get('common_format')
+    if tool_name not in spans:
+        return None
+    offset, length = spans[tool_name]
+    match = COMMON_FORMAT_PATTERN.search(content, offset, offset + length)
+    if match is None:
+        return None
+    common_format, _ = _DECODER.raw_decode(content[match.end():offset + length].decode('utf-8'))
+    return common_format
+
+
+@dataclass
+class IndexEntry:
+    name: str
+    offset: int
+    length: int
+    tools: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+
+class JsonlIndex:
+    """Byte-offset index of a jsonl file, persisted in a sidecar file next to it.
+
+    :param path: indexed jsonl file
+    :param entries: one entry per line of the file, in file order
+    :param signature: size and mtime of the file at the moment of indexing
+    :param with_tools: whether entries contain spans of OCR tool objects
+    """
+
+    VERSION = 2
+    SUFFIX = '.idx'
+
+    def __init__(
+        self, path: Union[str, Path], entries: List[IndexEntry], signature: Dict[str, int], with_tools: bool = False
+    ):
+        self.path = Path(path)
+        self.entries = entries
+        self.signature = signature
+        self.with_tools = with_tools
+        self._positions: Dict[str, int] = {}
+        for position, entry in enumerate(entries):
+            self._positions.setdefault(entry.name, position)
+
+    @staticmethod
+    def sidecar_path(path: Union[str, Path]) -> Path:
+        path = Path(path)
+        return path.with_name(path.name + JsonlIndex.SUFFIX)
+
+    @classmethod
+    def build(cls, path: Union[str, Path], with_tools: bool = False) -> 'JsonlIndex':
+        """Scan the file once and index its lines (no JSON parsing of line content is done).
+
+        :param path: jsonl file to index
+        :param with_tools: whether to locate OCR tool objects in each line (documents_content.jsonl)
+        :return: index of the file
+        """
+        signature = file_signature(path)
+        entries = []
+        offset = 0
+        with open(path, 'rb') as inp:
+            for line in inp:
+                if line.strip():
+                    entries.append(
+                        IndexEntry(line_name(line), offset, len(line), tool_spans(line) if with_tools else {})
+                    )
+                offset += len(line)
+        return cls(path, entries, signature, with_tools)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional['JsonlIndex']:
+        """Load persisted index of the file if it exists and is up to date.
+
+        :param path: indexed jsonl file
+        :return: index or None when sidecar is missing or stale
+        """
+        sidecar = cls.sidecar_path(path)
+        if not sidecar.exists():
+            return None
+        try:
+            with open(sidecar) as inp:
+                data = json.load(inp)
+        except (OSError, ValueError):
+            logger.warning(f'Cannot read index {sidecar}. It will be rebuilt')
+            return None
+        if data.get('version') != cls.VERSION or data.get('signature') != file_signature(path):
+            return None
+        entries = [
+            IndexEntry(name, offset, length, {tool: tuple(span) for tool, span in tools.items()})
+            for name, offset, length, tools in zip(data['names'], data['offsets'], data['lengths'], data['tools'])
+        ]
+        return cls(path, entries, data['signature'], data['with_tools'])
+
+    @classmethod
+    def open(cls, path: Union[str, Path], with_tools: bool = False) -> 'JsonlIndex':
+        """Load persisted index or build (and persist) a new one.
+
+        :param path: jsonl file to index
+        :param with_tools: whether to locate OCR tool objects in each line
+        :return: up-to-date index of the file
+        """
+        index = cls.load(path)
+        if index is None or (with_tools and not index.with_tools):
+            index = cls.build(path, with_tools=with_tools)
+            index.save()
+        return index
+
+    def is_valid(self) -> bool:
+        """Check if the indexed file was not modified since indexing."""
+        return self.path.exists() and file_signature(self.path) == self.signature
+
+    def save(self):
+        """Persist the index in a sidecar file. Failures (e.g., read-only dataset directory) are only logged."""
+        sidecar = self.sidecar_path(self.path)
+        data = {
+            'version': self.VERSION,
+            'signature': self.signature,
+            'with_tools': self.with_tools,
+            'names': [e.name for e in self.entries],
+            'offsets': [e.offset for e in self.entries],
+            'lengths': [e.length for e in self.entries],
+            'tools': [e.tools for e in self.entries],
+        }
+        tmp_path = sidecar.with_name(f'{sidecar.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w') as out:
+                json.dump(data, out)
+            # atomic, so concurrent readers never see partially written index
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            logger.warning(f'Cannot save index {sidecar}: {e}. It will be kept in memory only')
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, position: int) -> IndexEntry:
+        return self.entries[position]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._positions
+
+    def position(self, name: str) -> int:
+        """Get position of the first line with given document name.
+
+        :param name: document name
+        :return: line number (not counting empty lines)
+        """
+        if name not in self._positions:
+            raise KeyError(f'Document {name} not found in {self.path}')
+        return self._positions[name]
+
+    @staticmethod
+    def read(inp: BinaryIO, entry: IndexEntry) -> bytes:
+        """Read the line of given entry from a file opened in binary mode."""
+        inp.seek(entry.offset)
+        return inp.read(entry.length)
+
+    @staticmethod
+    def read_tool(inp: BinaryIO, entry: IndexEntry, tool_name: str) -> Optional[bytes]:
+        """Read only the object of given OCR tool from the line of given entry.
+
+        :return: bytes of the tool object (with trailing separators) or None if the tool is missing
+        """
+        if tool_name not in entry.tools:
+            return None
+        offset, length = entry.tools[tool_name]
+        inp.seek(entry.offset + offset)
+        return inp.read(length)
+
+    def read_lines(self, inp: BinaryIO, positions: Iterable[int]) -> Iterator[bytes]:
+        """Read lines at given positions, sequential positions do not require seeking."""
+        current = None
+        for position in positions:
+            entry = self.entries[position]
+            if current != entry.offset:
+                inp.seek(entry.offset)
+            yield inp.read(entry.length)
+            current = entry.offset + entry.length
@@ -1,11 +1,13 @@
-import random
 from collections import defaultdict
-from copy import deepcopy
-from typing import Callable, Iterator, Optional
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
 
+from benchmarker.data.document import Doc2d, TokenStore, map_tokens
 from benchmarker.data.reader.benchmark_dataset import BenchmarkCorpusMixin
+from benchmarker.data.reader.augmentation import SynonymTable
 from benchmarker.data.reader.common import DataInstance, Dataset, Document
 from benchmarker.data.reader.qa_strategies import concat
+from benchmarker.data.utils import iter_page_parts
+from benchmarker.utils import instrumentation
 
 
 class Corpus(BenchmarkCorpusMixin):
@@ -28,6 +30,12 @@ class Corpus(BenchmarkCorpusMixin):
         dev_strategy: Callable = concat,
         test_strategy: Callable = concat,
         augment_tokens_from_file: Optional[str] = None,
+        augment_seed: Optional[int] = None,
+        num_shards: int = 1,
+        shard_id: int = 0,
+        split_pages: bool = False,
+        pages_per_instance: int = 1,
+        page_stride: Optional[int] = None,
     ):
         """Stores references to dev, train and test Datasets and produces
         data instances on the fly, assuming the configuration provided.
@@ -48,6 +56,13 @@ class Corpus(BenchmarkCorpusMixin):
         :param dev_strategy: chooses values from devset
         :param testset_strategy: chooses values from testset
         :param augment_tokens_from_file: path to synonyms dictionary
+        :param augment_seed: seed of synonyms sampling, for reproducible augmentation
+        :param num_shards: number of shards (e.g., workers) train, dev and test sets are divided into
+        :param shard_id: index of the shard whose instances are produced
+        :param split_pages: whether to produce instances of windows of pages instead of whole documents
+            (see `iter_page_parts`), each window gets all annotations of its document
+        :param pages_per_instance: number of pages of each window if split_pages is set
+        :param page_stride: distance between first pages of consecutive windows (pages_per_instance by default)
         """
         self._train: Dataset = train
         self._test: Dataset = test
@@ -67,33 +82,60 @@ class Corpus(BenchmarkCorpusMixin):
         self._train_strategy = train_strategy
         self._dev_strategy = dev_strategy
         self._test_strategy = test_strategy
+        self._num_shards = num_shards
+        self._shard_id = shard_id
+        self._split_pages = split_pages
+        self._pages_per_instance = pages_per_instance
+        self._page_stride = page_stride
 
         self._paraphrases = None
 
         self._validate_config()
-        self._prepare_augmenter(augment_tokens_from_file)
+        self._prepare_augmenter(augment_tokens_from_file, augment_seed)
 
-    def _prepare_augmenter(self, augment_tokens_from_file: Optional[str] = None):
-        self._aug_dict = None
+    def _prepare_augmenter(self, augment_tokens_from_file: Optional[str] = None, seed: Optional[int] = None):
+        self._augmenter: Optional[SynonymTable] = None
         self._aug_counter = 0
         if augment_tokens_from_file:
-            self._aug_dict = defaultdict(set)
-            with open(augment_tokens_from_file) as ins:
-                for line in ins:
-                    tokens = [t.lower() for t in line.rstrip().split()]
-                    for tok in tokens:
-                        self._aug_dict[tok].update([t.replace('_', ' ') for t in tokens])
-
-    def _augment(self, token: str):
-        if not self._aug_dict or token.lower() not in self._aug_dict:
-            return token
-        candidates = list(self._aug_dict[token.lower()])
-        random.shuffle(candidates)
-        return candidates[0]
+            self._augmenter = SynonymTable.from_file(augment_tokens_from_file, seed=seed)
+
+    def _transform_tokens(self, doc2d: Doc2d) -> Doc2d:
+        """Augment and lowercase tokens of the document (once for all its annotations).
+
+        :param doc2d: document to transform, it is not modified
+        :return: the same document if no transformation is configured, otherwise its view with immutable tokens
+        """
+        if not self._augmenter and not self._lowercase_input:
+            return doc2d
+        tokens = doc2d.tokens
+        if self._augmenter:
+            tokens = self._augmenter.sample(tokens)
+        if self._lowercase_input:
+            tokens = map_tokens(tokens, str.lower)
+        return doc2d.with_tokens(tokens if isinstance(tokens, TokenStore) else tuple(tokens))
 
     def _validate_config(self):
         assert not (self._lowercase_input and self._case_augmentation), 'Do not use lowercasing with case augmentation'
         assert self._single_property, 'Multi-property is not supported yet'
+        assert self._pages_per_instance > 0, 'Number of pages per instance needs to be positive'
+        assert self._page_stride is None or self._page_stride > 0, 'Page stride needs to be positive'
+
+    def _split_document(self, identifier: str, doc2d: Doc2d) -> List[Tuple[str, Doc2d]]:
+        """Split the document into windows of pages if configured.
+
+        :param identifier: identifier of the document
+        :param doc2d: document
+        :return: identifier and Doc2d of each window (`{identifier}__{first page}`), the document itself if not split
+        """
+        if not self._split_pages or not len(doc2d.seg_data.get('pages', {}).get('ranges', ())):
+            return [(identifier, doc2d)]
+        with instrumentation.timer('corpus.split_pages'):
+            parts = [
+                (f'{identifier}__{first_page}', part)
+                for first_page, part in iter_page_parts(doc2d, self._pages_per_instance, self._page_stride)
+            ]
+        instrumentation.count('corpus.page_parts', len(parts))
+        return parts
 
     def doc_to_instances(
         self, document: Document, dataset: Dataset, strategy: Callable
@@ -109,6 +151,11 @@ class Corpus(BenchmarkCorpusMixin):
             return None
 
         keys = dataset.labels if self._use_none_answers else document.annotations.keys()
+        instances_counter = f'corpus.instances.{strategy.__name__}'
+        instrumentation.count('corpus.documents')
+        with instrumentation.timer('corpus.transform_tokens'):
+            document_2d = self._transform_tokens(document.document_2d)
+        parts = self._split_document(document.identifier, document_2d)
 
         for key in keys:
             values = document.annotations[key]
@@ -124,10 +171,7 @@ class Corpus(BenchmarkCorpusMixin):
             if self._unescape_values:
                 values = [dataset.unescape(v) for v in values]
 
-            document.document_2d.tokens = [self._augment(t) for t in document.document_2d.tokens]
-
             if self._lowercase_input:
-                document.document_2d.tokens = [t.lower() for t in document.document_2d.tokens]
                 prefix = prefix.lower()
 
             output_prefix = dataset.output_prefix(key)
@@ -137,18 +181,25 @@ class Corpus(BenchmarkCorpusMixin):
                 if self._lowercase_expected:
                     value = value.lower()
 
-                yield DataInstance(document.identifier, prefix, document.document_2d, output_prefix, value)
+                for identifier, part_2d in parts:
+                    instrumentation.count(instances_counter)
+
+                    yield DataInstance(identifier, prefix, part_2d, output_prefix, value)
 
     def get_instances(
-        self, dataset: Dataset, strategy: Callable, case_augmentation=False
+        self, dataset: Dataset, strategy: Callable, case_augmentation=False, num_shards: int = 1, shard_id: int = 0
     ) -> Optional[Iterator[DataInstance]]:
         """Extract data instances from dataset.
 
         :param dataset: Dataset to build DataInstances on
         :param case_augmentation: bool indicating if document should be case augmented
+        :param num_shards: number of shards (e.g., workers) the dataset is divided into
+        :param shard_id: index of the shard to extract instances from, shards are disjoint
         :return: iterator over DataInstances
 
         """
+        if dataset is not None and num_shards > 1:
+            dataset = dataset.shard(num_shards, shard_id)
 
         def generator():
             # Do not touch this unless you know what it is doing
@@ -167,38 +218,58 @@ class Corpus(BenchmarkCorpusMixin):
     @property
     def train(self) -> Optional[Iterator[DataInstance]]:
         """Train set DataInstances."""
-        return self.get_instances(self._train, self._train_strategy, case_augmentation=self._case_augmentation)
+        return self.get_instances(
+            self._train,
+            self._train_strategy,
+            case_augmentation=self._case_augmentation,
+            num_shards=self._num_shards,
+            shard_id=self._shard_id,
+        )
 
     @property
     def dev(self) -> Optional[Iterator[DataInstance]]:
         """Dev set DataInstances."""
-        return self.get_instances(self._dev, self._dev_strategy)
+        return self.get_instances(
+            self._dev, self._dev_strategy, num_shards=self._num_shards, shard_id=self._shard_id
+        )
 
     @property
     def test(self) -> Optional[Iterator[DataInstance]]:
         """Test set DataInstances."""
-        return self.get_instances(self._test, self._test_strategy)
+        return self.get_instances(
+            self._test, self._test_strategy, num_shards=self._num_shards, shard_id=self._shard_id
+        )
+
+
+def document_casing(tokens: Sequence[str], check_limit: int = 100) -> Tuple[bool, bool]:
+    """Check whether the document is already lowercased or uppercased.
+
+    :param tokens: tokens of the document
+    :param check_limit: number of leading tokens to check (for faster checking of document casing)
+    :return: tuple of flags: is lowercased, is uppercased
+    """
+    head = list(tokens[:check_limit])
+    return [tok.lower() for tok in head] == head, [tok.upper() for tok in head] == head
 
 
 def case_augmenter(doc: Document):
     """
     :param doc: Document which will be augmented with different casing
 
+    Augmented documents share seg_data arrays with the original one, only tokens and annotations are new.
     """
     # yield original doc first
     yield doc
-    check_limit = 100  # for faster checking of document casing
+    is_lowercased, is_uppercased = document_casing(doc.document_2d.tokens)
     # iterate over lower and upper func
-    for func in (lambda x: x.lower(), lambda x: x.upper()):
-        tokens = [func(tok) for tok in doc.document_2d.tokens]
+    for func, skip in ((str.lower, is_lowercased), (str.upper, is_uppercased)):
         # skip instance if original document is already uppercased or lowercased
-        if tokens[:check_limit] == doc.document_2d.tokens[:check_limit]:
+        if skip:
             continue
-        new_doc = deepcopy(doc)
         # change annotations as well, skip augmenting for None values
-        new_doc.annotations = defaultdict(
+        annotations = defaultdict(
             list,
             {k: [func(item) if item.lower() != "none" else item for item in v] for k, v in doc.annotations.items()},
         )
-        new_doc.document_2d.tokens = tokens
-        yield new_doc
+        document_2d = doc.document_2d.with_tokens(map_tokens(doc.document_2d.tokens, func))
+        yield Document(doc.identifier, document_2d, annotations)
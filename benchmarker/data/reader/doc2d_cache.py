@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import os
+import pickle  # nosec
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from benchmarker.data.document import Doc2d, TokenStore
+from benchmarker.data.reader.content_index import file_signature
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+MANIFEST = 'manifest.json'
+DOCUMENTS = 'documents.pkl'
+TOKEN_BBOXES_DTYPE = np.int64
+RANGES_DTYPE = np.int32
+BBOXES_DTYPE = np.uint16
+
+
+def cache_location(
+    cache_dir: Union[str, Path], directory: Union[str, Path], split: str, ocr: str, segment_levels: Sequence[str]
+) -> Path:
+    """Get directory of the cache for given dataset configuration.
+
+    :param cache_dir: root directory of caches
+    :param directory: dataset directory
+    :param split: name of the split
+    :param ocr: name of the OCR tool
+    :param segment_levels: segment levels of converted Doc2d
+    :return: path of the cache directory
+    """
+    key = json.dumps([str(Path(directory).resolve()), split, ocr, sorted(set(segment_levels))])
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]  # nosec
+    return Path(cache_dir) / f'{Path(directory).name}-{split}-{ocr}-{digest}'
+
+
+class Doc2dCache:
+    """Columnar cache of Doc2d converted from a benchmark split, read through memory-mapping.
+
+    Tokens of all documents are stored as one UTF-8 buffer with byte ends of each token (relative to the document),
+    read back as a `TokenStore` viewing the buffer,
+    token bboxes and segment arrays are concatenated over documents. Per-document offsets
+    to these columns and the annotations (document.jsonl content) are kept in small side files.
+
+    :param path: cache directory
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / MANIFEST) as inp:
+            self.manifest = json.load(inp)
+        with open(self.path / DOCUMENTS, 'rb') as inp:
+            self.documents: List[Dict[str, Any]] = pickle.load(inp)  # nosec
+        self.levels: List[str] = self.manifest['levels']
+        self.offsets = np.load(self.path / 'offsets.npy')
+        self.columns = {name: self._memmap(name, meta) for name, meta in self.manifest['columns'].items()}
+
+    def _memmap(self, name: str, meta: Dict[str, Any]) -> np.ndarray:
+        shape = tuple(meta['shape'])
+        if shape[0] == 0:
+            return np.empty(shape, dtype=meta['dtype'])
+        return np.memmap(self.path / f'{name}.bin', dtype=meta['dtype'], mode='r', shape=shape)
+
+    @classmethod
+    def open(cls, path: Union[str, Path], sources: Sequence[Path]) -> Optional['Doc2dCache']:
+        """Open the cache if it exists and was built from unchanged source files.
+
+        :param path: cache directory
+        :param sources: source files of the cache
+        :return: cache or None if it is missing or stale
+        """
+        manifest_path = Path(path) / MANIFEST
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path) as inp:
+            manifest = json.load(inp)
+        if manifest.get('version') != CACHE_VERSION or manifest['sources'] != [file_signature(s) for s in sources]:
+            logger.info(f'Cache {path} is stale, it will be rebuilt')
+            return None
+        return cls(path)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def document(self, position: int) -> Dict[str, Any]:
+        """Get document.jsonl record (name and annotations) with the skip reason of the document."""
+        return self.documents[position]
+
+    def doc2d(self, position: int) -> Doc2d:
+        """Build Doc2d of a document from views of memory-mapped columns."""
+        token_start, token_end, text_start, text_end = self.offsets[position, :4]
+        offsets = np.zeros(token_end - token_start + 1, dtype=np.int32)
+        offsets[1:] = self.columns['token_ends'][token_start:token_end]
+        tokens = TokenStore(self.columns['token_text'][text_start:text_end], offsets)
+        seg_data: Dict[str, Any] = {'tokens': {'org_bboxes': self.columns['token_bboxes'][token_start:token_end]}}
+        for i, level in enumerate(self.levels):
+            start, end = self.offsets[position, 4 + 2 * i:6 + 2 * i]
+            seg_data[level] = {
+                'ranges': self.columns[f'{level}_ranges'][start:end],
+                'org_bboxes': self.columns[f'{level}_bboxes'][start:end],
+            }
+        return Doc2d(tokens=tokens, seg_data=seg_data, docid=self.documents[position]['docid'])
+
+
+class Doc2dCacheWriter:
+    """Streaming writer of `Doc2dCache`, the cache becomes visible only after `commit`.
+
+    :param path: cache directory
+    :param sources: source files of the cache, their signatures are used for invalidation
+    :param levels: segment levels (other than tokens) stored in the cache
+    """
+
+    def __init__(self, path: Union[str, Path], sources: Sequence[Path], levels: Sequence[str]):
+        self.path = Path(path)
+        self.sources = [file_signature(s) for s in sources]
+        self.levels = sorted(levels)
+        # unique per writer, so concurrent writers of the same cache do not remove each other's files
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = Path(tempfile.mkdtemp(prefix=f'{self.path.name}.', suffix='.tmp', dir=self.path.parent))
+        self.documents: List[Dict[str, Any]] = []
+        self.offsets: List[List[int]] = []
+        self.columns: Dict[str, Dict[str, Any]] = {}
+        self._files = {}
+        self._add_column('token_text', np.uint8, [])
+        self._add_column('token_ends', np.int32, [])
+        self._add_column('token_bboxes', TOKEN_BBOXES_DTYPE, [4])
+        for level in self.levels:
+            self._add_column(f'{level}_ranges', RANGES_DTYPE, [2])
+            self._add_column(f'{level}_bboxes', BBOXES_DTYPE, [4])
+
+    def _add_column(self, name: str, dtype: Any, dim: List[int]):
+        self.columns[name] = {'dtype': np.dtype(dtype).str, 'shape': [0] + dim}
+        self._files[name] = open(self.tmp_path / f'{name}.bin', 'wb')
+
+    def _write(self, name: str, data: np.ndarray) -> int:
+        column = self.columns[name]
+        data = np.ascontiguousarray(data, dtype=column['dtype']).reshape([-1] + column['shape'][1:])
+        self._files[name].write(data.tobytes())
+        column['shape'][0] += len(data)
+        return column['shape'][0]
+
+    def append(self, doc_dict: Dict[str, Any], doc2d: Optional[Doc2d], skip_reason: Optional[str] = None):
+        """Append next document of the split.
+
+        :param doc_dict: document.jsonl record
+        :param doc2d: converted document or None if it was skipped
+        :param skip_reason: reason of skipping the document
+        """
+        offsets = [self.columns['token_ends']['shape'][0], 0, self.columns['token_text']['shape'][0], 0]
+        for level in self.levels:
+            offsets += [self.columns[f'{level}_ranges']['shape'][0], 0]
+        if doc2d is not None:
+            missing = [level for level in ['tokens'] + self.levels if level not in doc2d.seg_data]
+            if missing:
+                raise ValueError(f'Cannot cache document {doc_dict["name"]} without segment levels {missing}')
+            tokens = doc2d.tokens if isinstance(doc2d.tokens, TokenStore) else TokenStore.from_tokens(doc2d.tokens)
+            offsets[1] = self._write('token_ends', tokens.offsets[1:])
+            offsets[3] = self._write('token_text', tokens.buffer)
+            self._write('token_bboxes', doc2d.seg_data['tokens']['org_bboxes'])
+            for i, level in enumerate(self.levels):
+                offsets[5 + 2 * i] = self._write(f'{level}_ranges', doc2d.seg_data[level]['ranges'])
+                self._write(f'{level}_bboxes', doc2d.seg_data[level]['org_bboxes'])
+        else:
+            offsets[1::2] = offsets[0::2]
+        self.offsets.append(offsets)
+        self.documents.append({
+            'name': doc_dict['name'],
+            'annotations': doc_dict['annotations'],
+            'docid': doc2d.docid if doc2d is not None else '',
+            'skip_reason': skip_reason,
+        })
+
+    def commit(self):
+        """Finalize the cache and atomically replace the previous one (if any)."""
+        for out in self._files.values():
+            out.close()
+        offsets = np.array(self.offsets, dtype=np.int64).reshape(len(self.offsets), 4 + 2 * len(self.levels))
+        np.save(self.tmp_path / 'offsets.npy', offsets)
+        with open(self.tmp_path / DOCUMENTS, 'wb') as out:
+            pickle.dump(self.documents, out, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(self.tmp_path / MANIFEST, 'w') as out:
+            json.dump(
+                {'version': CACHE_VERSION, 'sources': self.sources, 'levels': self.levels, 'columns': self.columns}, out
+            )
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Drop partially written cache."""
+        for out in self._files.values():
+            out.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
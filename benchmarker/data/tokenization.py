@@ -0,0 +1,201 @@
+"""Batched tokenization of data instances into `Example` objects.
+
+Instances are tokenized in batches with a single call of a `BatchTokenizer` per batch, documents shared by
+instances of the batch (e.g., one instance per annotation) are tokenized once. Subword maps and bboxes
+of the whole document are then computed with array operations.
+"""
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from more_itertools import chunked
+
+from benchmarker.data.document import Doc2d
+from benchmarker.data.model import Example
+from benchmarker.data.reader.common import DataInstance
+from benchmarker.data.utils import get_bpe_positions_bulk
+
+
+class BatchTokenizer(ABC):
+    """Tokenizer of batches of texts into subword ids."""
+
+    eos_token_id: Optional[int] = None
+
+    @abstractmethod
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        """Tokenize texts without adding special tokens.
+
+        :param texts: texts to tokenize
+        :return: subword ids of each text
+        """
+
+    @abstractmethod
+    def convert_ids_to_tokens(self, ids: Sequence[int]) -> List[str]:
+        """Get subwords of given ids."""
+
+
+class TransformersBatchTokenizer(BatchTokenizer):
+    """Adapter of a `transformers` tokenizer (fast tokenizers encode batches in parallel).
+
+    :param tokenizer: `transformers` tokenizer
+    """
+
+    def __init__(self, tokenizer: Any):
+        self.tokenizer = tokenizer
+        self.eos_token_id = tokenizer.eos_token_id
+
+    @classmethod
+    def from_pretrained(cls, model_path: str, use_fast: bool = False) -> 'TransformersBatchTokenizer':
+        try:
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise ImportError('Loading tokenizers requires transformers (`pip install benchmarker[transformers]`)')
+        return cls(AutoTokenizer.from_pretrained(model_path, use_fast=use_fast))
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        return self.tokenizer(list(texts), add_special_tokens=False)['input_ids']
+
+    def convert_ids_to_tokens(self, ids: Sequence[int]) -> List[str]:
+        return self.tokenizer.convert_ids_to_tokens(list(ids))
+
+
+class StubBatchTokenizer(BatchTokenizer):
+    """Offline tokenizer splitting words into pieces of up to `piece_size` characters (the first one prefixed
+    with the SentencePiece word-start marker), ids are stable hashes of pieces. Meant for tests and benchmarks.
+
+    :param piece_size: maximal number of characters of a piece
+    :param vocab_size: number of distinct ids of pieces
+    """
+
+    eos_token_id = 1
+
+    def __init__(self, piece_size: int = 3, vocab_size: int = 2 ** 20):
+        self.piece_size = piece_size
+        self.vocab_size = vocab_size
+        self.pieces: Dict[int, str] = {}
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        batch = []
+        for text in texts:
+            pieces = []
+            for word in text.split():
+                word = '▁' + word
+                pieces += [word[i:i + self.piece_size] for i in range(0, len(word), self.piece_size)]
+            ids = [zlib.crc32(piece.encode('utf-8')) % self.vocab_size + 2 for piece in pieces]
+            self.pieces.update(zip(ids, pieces))
+            batch.append(ids)
+        return batch
+
+    def convert_ids_to_tokens(self, ids: Sequence[int]) -> List[str]:
+        return [self.pieces[i] for i in ids]
+
+
+def piece_length(piece: str) -> int:
+    """Get number of characters of the original text covered by a subword (without word-start markers)."""
+    if piece.startswith('##'):
+        piece = piece[2:]
+    return len(piece.lstrip('▁Ġ'))
+
+
+@dataclass
+class TokenizedInstance:
+    instance: DataInstance
+    example: Example
+    token_ids: np.ndarray
+    prefix_ids: List[int]
+    output_ids: List[int]
+
+
+def build_example(example_id: str, doc2d: Doc2d, token_ids: List[List[int]], tokenizer: BatchTokenizer) -> Example:
+    """Build Example of a document from subword ids of its tokens.
+
+    Segment ranges of the example refer to subwords, tokens seg_data holds a bbox (split proportionally
+    to subword lengths) and the original token bbox of each subword.
+
+    :param example_id: id of the example
+    :param doc2d: document
+    :param token_ids: subword ids of each token of the document
+    :param tokenizer: tokenizer used to get subwords of ids
+    :return: Example
+    """
+    counts = np.fromiter((len(ids) for ids in token_ids), dtype=np.int64, count=len(token_ids))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    flat_ids = [i for ids in token_ids for i in ids]
+    pieces = tokenizer.convert_ids_to_tokens(flat_ids) if flat_ids else []
+    lengths = np.fromiter((piece_length(piece) for piece in pieces), dtype=np.int64, count=len(pieces))
+    original_token_indices = np.repeat(np.arange(len(token_ids)), counts)
+
+    seg_data: Dict[str, Any] = {}
+    for level, seg in doc2d.seg_data.items():
+        seg_data[level] = dict(seg) if isinstance(seg, dict) else seg
+        if level in ('pages', 'lines'):
+            seg_data[level]['ranges'] = offsets[seg['ranges']].astype(seg['ranges'].dtype).reshape(-1, 2)
+    org_bboxes = doc2d.seg_data['tokens']['org_bboxes']
+    seg_data['tokens'] = {
+        'bboxes': get_bpe_positions_bulk(org_bboxes, lengths, offsets),
+        'org_bboxes': org_bboxes[original_token_indices],
+    }
+    if doc2d.token_label_ids is not None:
+        token_label_indices = np.asarray(doc2d.token_label_ids)[original_token_indices]
+    else:
+        token_label_indices = np.full(len(pieces), -1, dtype=np.int64)
+    return Example(
+        example_id=example_id,
+        tokens=pieces,
+        token_ocr_ranges=doc2d.token_ocr_ranges,
+        original_token_indices=original_token_indices,
+        tokens_bpe_map=np.stack([offsets[:-1], offsets[1:]], axis=1),
+        seg_data=seg_data,
+        token_label_indices=token_label_indices,
+    )
+
+
+def tokenize_batch(instances: Sequence[DataInstance], tokenizer: BatchTokenizer) -> List[TokenizedInstance]:
+    """Tokenize instances with a single tokenizer call, each distinct document is tokenized once.
+
+    :param instances: data instances
+    :param tokenizer: batch tokenizer
+    :return: tokenized instances
+    """
+    documents: Dict[int, Doc2d] = {}
+    for instance in instances:
+        documents.setdefault(id(instance.document_2d), instance.document_2d)
+    texts = [text for instance in instances for text in (instance.input_prefix, instance.output)]
+    for doc2d in documents.values():
+        texts.extend(doc2d.tokens)
+    encoded = tokenizer.encode_batch(texts)
+
+    position = 2 * len(instances)
+    examples: Dict[int, Example] = {}
+    document_ids: Dict[int, np.ndarray] = {}
+    for key, doc2d in documents.items():
+        token_ids = encoded[position:position + len(doc2d.tokens)]
+        position += len(doc2d.tokens)
+        examples[key] = build_example(doc2d.docid, doc2d, token_ids, tokenizer)
+        document_ids[key] = np.fromiter((i for ids in token_ids for i in ids), dtype=np.int64)
+    return [
+        TokenizedInstance(
+            instance=instance,
+            example=examples[id(instance.document_2d)],
+            token_ids=document_ids[id(instance.document_2d)],
+            prefix_ids=encoded[2 * i],
+            output_ids=encoded[2 * i + 1],
+        )
+        for i, instance in enumerate(instances)
+    ]
+
+
+def tokenize_instances(
+    instances: Iterable[DataInstance], tokenizer: BatchTokenizer, batch_size: int = 64
+) -> Iterator[TokenizedInstance]:
+    """Tokenize a stream of instances in batches.
+
+    :param instances: data instances (e.g., `Corpus.train`)
+    :param tokenizer: batch tokenizer
+    :param batch_size: number of instances per tokenizer call
+    :return: iterator over tokenized instances, in order of instances
+    """
+    for batch in chunked(instances, batch_size):
+        yield from tokenize_batch(batch, tokenizer)
@@ -1,9 +1,9 @@
-from copy import deepcopy
-from typing import Any, Callable, Dict, List, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 
 from benchmarker.data.document import Doc2d
+from benchmarker.utils import instrumentation
 
 IMG_SIZE = (384, 512)
 IMG_SIZE_DIVISIBILITY = 64
@@ -43,6 +43,99 @@ def get_bpe_positions(token_pos: Tuple[int, int, int, int], bpe_lens: Sequence[i
     return pos_lst
 
 
+def get_bpe_positions_bulk(
+    token_bboxes: np.ndarray, bpe_lens: np.ndarray, bpe_offsets: np.ndarray, dtype: Any = np.float32
+) -> np.ndarray:
+    """Compute `get_bpe_positions` for all tokens of a document in one pass.
+
+    Values are computed in double precision, as in `get_bpe_positions`, and cast to dtype only at the end,
+    so the results are identical to the ones of the per-token function (cast to dtype).
+
+    :param token_bboxes: array of shape (N, 4) with bboxes of tokens
+    :param bpe_lens: flat array of lengths of subwords of all tokens
+    :param bpe_offsets: array of N + 1 offsets, subwords of i-th token are bpe_lens[bpe_offsets[i]:bpe_offsets[i + 1]]
+    :param dtype: dtype of the result (e.g., np.float16 or np.float32)
+    :return: array of shape (len(bpe_lens), 4) with bboxes of subwords
+    """
+    token_bboxes = np.asarray(token_bboxes).reshape(-1, 4)
+    bpe_lens = np.asarray(bpe_lens, dtype=np.int64)
+    bpe_offsets = np.asarray(bpe_offsets, dtype=np.int64)
+    assert len(bpe_offsets) == len(token_bboxes) + 1, 'Offsets are required for each token and the end'
+    xwidth = token_bboxes[:, 2] - token_bboxes[:, 0]
+    assert (xwidth >= 0).all(), f'not correct token postions: {token_bboxes[np.argmin(xwidth)].tolist()}'
+
+    token_idx = np.repeat(np.arange(len(token_bboxes)), np.diff(bpe_offsets))
+    len_ends = np.concatenate([[0], np.cumsum(bpe_lens)])
+    tok_len = np.maximum(1, len_ends[bpe_offsets[1:]] - len_ends[bpe_offsets[:-1]])[token_idx]
+    # character offset of each subword within its token
+    offset = len_ends[:-1] - len_ends[bpe_offsets[:-1]][token_idx]
+    x1, y1, _, y2 = token_bboxes[token_idx].T
+    xwidth = xwidth[token_idx]
+    positions = np.empty((len(bpe_lens), 4), dtype=dtype)
+    positions[:, 0] = x1 + (offset / tok_len) * xwidth
+    positions[:, 1] = y1
+    positions[:, 2] = x1 + ((offset + bpe_lens) / tok_len) * xwidth
+    positions[:, 3] = y2
+    return positions
+
+
+class SegmentIntervalIndex:
+    """Index of segment ranges (lines and pages) of a document, used to select segments overlapping windows.
+
+    It is computed once per document. When segments are ordered (their starts and ends are non-decreasing,
+    as in documents converted from common format), the overlapping segments are found by binary search
+    and selected with a slice. Otherwise, a vectorized mask is used.
+
+    :param seg_data: seg_data of the document
+    """
+
+    def __init__(self, seg_data: Dict[str, Any]):
+        self.levels: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, bool, int]] = {}
+        for level in ('lines', 'pages'):
+            if level not in seg_data:
+                continue
+            ranges = np.asarray(seg_data[level]['ranges']).reshape(-1, 2)
+            nonempty = np.flatnonzero(ranges[:, 0] < ranges[:, 1])
+            starts, ends = ranges[nonempty, 0], ranges[nonempty, 1]
+            ordered = bool(np.all(starts[1:] >= starts[:-1]) and np.all(ends[1:] >= ends[:-1]))
+            self.levels[level] = (starts, ends, nonempty, ordered, len(ranges))
+
+    def select(self, level: str, from_range: int, to_range: int) -> Union[slice, np.ndarray]:
+        """Get segments of the level overlapping the window.
+
+        :param level: segment level
+        :param from_range: start of the window
+        :param to_range: end of the window (exclusive)
+        :return: slice or array of indices of the segments
+        """
+        starts, ends, nonempty, ordered, size = self.levels[level]
+        if from_range >= to_range:
+            return slice(0, 0)
+        if not ordered:
+            return nonempty[(starts < to_range) & (ends > from_range)]
+        first = int(np.searchsorted(ends, from_range, side='right'))
+        last = max(first, int(np.searchsorted(starts, to_range, side='left')))
+        return slice(first, last) if len(nonempty) == size else nonempty[first:last]
+
+
+def _segments_part(
+    level: str, seg: Dict[str, Any], index: SegmentIntervalIndex, from_range: int, to_range: int, max_bpe: int
+) -> Dict[str, Any]:
+    """Get segments of the level overlapping the window, with their ranges relative to the window."""
+    part_seg_idx = index.select(level, from_range, to_range)
+    part_seg: Dict[str, Any] = {}
+    for el_key, el_data in seg.items():
+        if el_key == 'ranges':
+            part_seg[el_key] = np.clip(el_data[part_seg_idx, :] - from_range, 0, max_bpe + 1)
+        elif el_key in ('bboxes', 'org_bboxes', 'ordinals', 'ocr_ranges'):
+            part_seg[el_key] = el_data[part_seg_idx]
+        elif el_key == 'cardinality':
+            part_seg[el_key] = el_data
+        else:
+            raise ValueError(f"Key {el_key} in seg_data dictionary is not supported by get_data_part function")
+    return part_seg
+
+
 def get_data_part(
     from_range: int,
     to_range: int,
@@ -51,8 +144,25 @@ def get_data_part(
     org_tokens_idx: List[int],
     token_label_idx: List[int],
     seg_data: Dict[str, Any],
+    index: Optional[SegmentIntervalIndex] = None,
 ) -> Tuple[List[str], List[int], List[int], Dict[str, Any]]:
+    """Get the part of the document within a window of subword positions.
+
+    Arrays of the part can be views of the document arrays, so they should not be modified in place.
+
+    :param from_range: start of the window
+    :param to_range: end of the window (exclusive)
+    :param max_bpe: maximal length of the window, segment ranges are clipped to it
+    :param bpe_tokens: subwords of the document
+    :param org_tokens_idx: index of the original token of each subword
+    :param token_label_idx: label of each subword
+    :param seg_data: seg_data of the document
+    :param index: index of segments of the document (pass it when getting many parts of the same document)
+    :return: subwords, indices of original tokens, labels and seg_data of the part
+    """
     assert to_range <= len(bpe_tokens)
+    if index is None:
+        index = SegmentIntervalIndex(seg_data)
     part_bpe_tokens = bpe_tokens[from_range:to_range]
     part_org_tokens_idx = org_tokens_idx[from_range:to_range]
     part_token_label_idx = token_label_idx[from_range:to_range]
@@ -64,18 +174,7 @@ def get_data_part(
             part_seg_data[segkey]['bboxes'] = seg['bboxes'][from_range:to_range]
             part_seg_data[segkey]['org_bboxes'] = seg['org_bboxes'][from_range:to_range]
         elif segkey in ("lines", "pages"):
-            part_seg_idx = [max(from_range, rng[0]) < min(to_range, rng[1]) for rng in seg['ranges']]
-            for el_key, el_data in seg.items():
-                if el_key == 'ranges':
-                    part_seg_data[segkey][el_key] = np.clip(el_data[part_seg_idx, :] - from_range, 0, max_bpe + 1)
-                elif el_key in ('bboxes', 'org_bboxes', 'ordinals', 'ocr_ranges'):
-                    part_seg_data[segkey][el_key] = el_data[part_seg_idx]
-                elif el_key == 'cardinality':
-                    part_seg_data[segkey][el_key] = el_data
-                else:
-                    raise ValueError(
-                        f"Key {el_key} in seg_data dictionary is not supported " "by get_data_part function"
-                    )
+            part_seg_data[segkey] = _segments_part(segkey, seg, index, from_range, to_range, max_bpe)
     if "images" in seg_data:
         page_idx = part_seg_data["pages"]["ordinals"]
         if page_idx.size == 0:
@@ -89,6 +188,125 @@ def get_data_part(
     return part_bpe_tokens, part_org_tokens_idx, part_token_label_idx, part_seg_data
 
 
+def iter_data_parts(
+    max_bpe: int,
+    stride: int,
+    bpe_tokens: List[str],
+    org_tokens_idx: List[int],
+    token_label_idx: List[int],
+    seg_data: Dict[str, Any],
+) -> Iterator[Tuple[int, int, Tuple[List[str], List[int], List[int], Dict[str, Any]]]]:
+    """Get parts of the document within sliding windows (see `get_data_part`), sharing one segment index.
+
+    Windows of max_bpe subwords start every stride subwords, until the last one reaches the end of the document.
+
+    :param max_bpe: length of windows
+    :param stride: distance between starts of consecutive windows
+    :param bpe_tokens: subwords of the document
+    :param org_tokens_idx: index of the original token of each subword
+    :param token_label_idx: label of each subword
+    :param seg_data: seg_data of the document
+    :return: iterator over start and end of each window with its part
+    """
+    assert stride > 0, 'Stride needs to be positive'
+    index = SegmentIntervalIndex(seg_data)
+    from_range = 0
+    while True:
+        to_range = min(from_range + max_bpe, len(bpe_tokens))
+        yield from_range, to_range, get_data_part(
+            from_range, to_range, max_bpe, bpe_tokens, org_tokens_idx, token_label_idx, seg_data, index
+        )
+        if to_range >= len(bpe_tokens):
+            break
+        from_range += stride
+
+
+def get_page_part(
+    doc2d: Doc2d, first_page: int, last_page: int, index: Optional[SegmentIntervalIndex] = None
+) -> Doc2d:
+    """Get the part of the document holding a range of its pages.
+
+    Tokens, their bboxes, OCR ranges and labels of the part are slices of the document ones, lines and pages are
+    selected with `SegmentIntervalIndex`, so apart from (small) rebased segment ranges, arrays of the part are views
+    of the document arrays and should not be modified in place. Ordinals of pages of the part are their indices
+    in the document, so that `get_data_part` selects images of the right page. Other seg_data (e.g., images)
+    are shared with the document.
+
+    :param doc2d: document
+    :param first_page: index of the first page of the part
+    :param last_page: index of the page following the last page of the part
+    :param index: index of segments of the document (pass it when getting many parts of the same document)
+    :return: Doc2d of the part, its docid is the document one followed by `__{first_page}`
+    """
+    if index is None:
+        index = SegmentIntervalIndex(doc2d.seg_data)
+    pages = doc2d.seg_data['pages']
+    page_ranges = np.asarray(pages['ranges']).reshape(-1, 2)[first_page:last_page]
+    assert len(page_ranges), f'No pages in range [{first_page}, {last_page})'
+    from_range, to_range = int(page_ranges[:, 0].min()), int(page_ranges[:, 1].max())
+    to_range = max(from_range, to_range)
+
+    part_seg_data: Dict[str, Any] = {}
+    for segkey, seg in doc2d.seg_data.items():
+        if segkey == 'tokens':
+            part_seg_data[segkey] = {el_key: el_data[from_range:to_range] for el_key, el_data in seg.items()}
+        elif segkey in ('lines', 'pages'):
+            part_seg_idx = slice(first_page, last_page) if segkey == 'pages' else index.select(
+                segkey, from_range, to_range
+            )
+            part_seg_data[segkey] = {}
+            for el_key, el_data in seg.items():
+                if el_key == 'ranges':
+                    ranges = np.clip(el_data[part_seg_idx] - from_range, 0, to_range - from_range)
+                    part_seg_data[segkey][el_key] = ranges.astype(el_data.dtype, copy=False)
+                elif el_key == 'cardinality':
+                    part_seg_data[segkey][el_key] = el_data
+                else:
+                    part_seg_data[segkey][el_key] = el_data[part_seg_idx]
+            if segkey == 'pages' and 'ordinals' not in seg:
+                part_seg_data[segkey]['ordinals'] = np.arange(
+                    first_page, first_page + len(page_ranges), dtype=FEAT_META['ordinals']['dtype']
+                )
+        else:
+            part_seg_data[segkey] = seg
+
+    return Doc2d(
+        doc2d.tokens[from_range:to_range],
+        part_seg_data,
+        doc2d.token_ocr_ranges[from_range:to_range] if doc2d.token_ocr_ranges is not None else None,
+        doc2d.token_label_ids[from_range:to_range] if doc2d.token_label_ids is not None else None,
+        f'{doc2d.docid}__{first_page}',
+    )
+
+
+def iter_page_parts(doc2d: Doc2d, pages_per_part: int = 1, stride: Optional[int] = None) -> Iterator[Tuple[int, Doc2d]]:
+    """Split the document into parts of consecutive pages (see `get_page_part`), sharing one segment index.
+
+    Windows of pages_per_part pages start every stride pages, until the last one reaches the last page.
+    Parts without tokens (e.g., blank pages) are skipped.
+
+    :param doc2d: document
+    :param pages_per_part: number of pages of each part
+    :param stride: distance between first pages of consecutive parts (pages_per_part by default)
+    :return: iterator over index of the first page of each part with the part
+    """
+    stride = stride or pages_per_part
+    assert pages_per_part > 0 and stride > 0, 'Number of pages and stride need to be positive'
+    num_pages = len(doc2d.seg_data['pages']['ranges'])
+    index = SegmentIntervalIndex(doc2d.seg_data)
+    first_page = 0
+    while first_page < num_pages:
+        last_page = min(first_page + pages_per_part, num_pages)
+        part = get_page_part(doc2d, first_page, last_page, index)
+        if len(part):
+            yield first_page, part
+        else:
+            instrumentation.count('corpus.empty_page_parts')
+        if last_page >= num_pages:
+            break
+        first_page += stride
+
+
 def convert_to_np(data: Sequence[Any], el_name: str) -> np.ndarray:
     ft = FEAT_META[el_name]
     dtype = ft["dtype"]
@@ -111,25 +329,34 @@ def apply_on_nested_dict(fn: Callable, ndict: Dict[str, Any]) -> Dict[str, Any]:
     return new_dict
 
 
-def add_missing_tokens(orig_lines: np.ndarray, added_elements: np.ndarray, reorder_idx: np.ndarray = None):
-    """
-    :param orig_lines: numpy array with original lines element to be modified with new values
+def merge_missing_tokens(
+    orig_lines: np.ndarray, added_elements: np.ndarray, orig_positions: np.ndarray, added_positions: np.ndarray
+) -> np.ndarray:
+    """Merge elements of lines with elements added for missing tokens, at precomputed positions.
+
+    :param orig_lines: numpy array with original lines element
     :param added_elements: numpy array with additional elements to be added to lines
-    :param reorder_idx: numpy 1D array,
-        define how to reorder items created by adding additional elements
-    :return: numpy array with additional elements,
-        numpy 1D array which was used for sorting final array
+    :param orig_positions: positions of original elements in the merged array
+    :param added_positions: positions of additional elements in the merged array
+    :return: merged numpy array (of the dtype numpy.vstack would give)
     """
-    # add ranges with missing tokens
-    all_ranges = np.vstack((orig_lines, added_elements))
-    if reorder_idx is None:
-        reorder_idx = np.argsort(all_ranges[:, 0])
-    sorted_ranges = all_ranges[reorder_idx]
-    return sorted_ranges, reorder_idx
+    merged = np.empty(
+        (len(orig_positions) + len(added_positions),) + orig_lines.shape[1:],
+        dtype=np.result_type(orig_lines, added_elements),
+    )
+    merged[orig_positions] = orig_lines
+    merged[added_positions] = added_elements
+    return merged
 
 
+@instrumentation.timed('utils.fix_missing_tokens_in_lines')
 def fix_missing_tokens_in_lines(doc: Doc2d):
     """
+    Add a single-token line for each token not covered by any line.
+
+    Missing tokens are found from gaps between consecutive line ranges and merged with lines without sorting.
+    Only the lines sub-dict is copied, other seg_data levels and tokens are shared with the original document.
+
     :param doc: Doc2d instance to be fixed
     :return: fixed Doc2d instance with additional elements in seg_data['lines']
     """
@@ -137,50 +364,57 @@ def fix_missing_tokens_in_lines(doc: Doc2d):
     if 'lines' not in doc.seg_data:
         return doc
 
-    # get missing token indexes
-    missing_tokens = []
-    offset = 0
-    for ln_range in doc.seg_data['lines']['ranges']:
-        assert ln_range[0] >= offset, f'Ranges need to be in ascending order: {ln_range[0]} >= {offset}'
-        if ln_range[0] > offset:
-            missing_tokens.extend(list(range(offset, ln_range[0])))
-        offset = ln_range[1]
-    if offset < len(doc.tokens):
-        missing_tokens.extend(list(range(offset, len(doc.tokens))))
-
-    if not missing_tokens:
+    # get missing token indexes, from gaps before each line and after the last one
+    lines = doc.seg_data['lines']
+    ranges = np.asarray(lines['ranges']).reshape(-1, 2)
+    gap_starts = np.concatenate([[0], ranges[:, 1]]).astype(np.int64)
+    gap_ends = np.concatenate([ranges[:, 0], [max(len(doc.tokens), gap_starts[-1])]]).astype(np.int64)
+    descending = np.flatnonzero(gap_ends[:-1] < gap_starts[:-1])
+    assert not len(descending), (
+        f'Ranges need to be in ascending order: {gap_ends[descending[0]]} >= {gap_starts[descending[0]]}'
+    )
+    gap_lengths = gap_ends - gap_starts
+    num_missing = int(gap_lengths.sum())
+
+    instrumentation.count('utils.missing_line_tokens', num_missing)
+    if not num_missing:
         return doc
 
-    doc_fixed = deepcopy(doc)
+    missing_tokens = (
+        np.arange(num_missing)
+        - np.repeat(np.cumsum(gap_lengths) - gap_lengths, gap_lengths)
+        + np.repeat(gap_starts, gap_lengths)
+    )
+    # missing tokens of i-th gap precede i-th line
+    line_positions = np.arange(len(ranges)) + np.cumsum(gap_lengths[:-1])
+    missing_positions = np.arange(num_missing) + np.repeat(np.arange(len(gap_lengths)), gap_lengths)
 
-    # generate ranges for missing tokens
-    add_ranges = np.hstack((np.array(missing_tokens)[:, None], np.array(missing_tokens)[:, None] + 1))
-    doc_fixed.seg_data['lines']['ranges'], reorder_idx = add_missing_tokens(doc.seg_data['lines']['ranges'], add_ranges)
+    fixed_lines = dict(lines)
+    add_ranges = np.stack((missing_tokens, missing_tokens + 1), axis=1)
+    fixed_lines['ranges'] = merge_missing_tokens(lines['ranges'], add_ranges, line_positions, missing_positions)
 
     # add bboxes
     add_boxes = doc.seg_data['tokens']['org_bboxes'][missing_tokens]
-    doc_fixed.seg_data['lines']['org_bboxes'], _ = add_missing_tokens(
-        doc.seg_data['lines']['org_bboxes'], add_boxes, reorder_idx
-    )
+    fixed_lines['org_bboxes'] = merge_missing_tokens(lines['org_bboxes'], add_boxes, line_positions, missing_positions)
 
     # add ocr_ranges
-    if 'ocr_ranges' in doc.seg_data['lines']:
+    if 'ocr_ranges' in lines:
         assert doc.token_ocr_ranges is not None, "Token ocr ranges are required " "to compute missing lines"
         add_ocr_ranges = doc.token_ocr_ranges[missing_tokens]
-        doc_fixed.seg_data['lines']['ocr_ranges'], _ = add_missing_tokens(
-            doc.seg_data['lines']['ocr_ranges'], add_ocr_ranges, reorder_idx
+        fixed_lines['ocr_ranges'] = merge_missing_tokens(
+            lines['ocr_ranges'], add_ocr_ranges, line_positions, missing_positions
         )
 
-    return doc_fixed
+    seg_data = dict(doc.seg_data)
+    seg_data['lines'] = fixed_lines
+    return Doc2d(doc.tokens, seg_data, doc.token_ocr_ranges, doc.token_label_ids, doc.docid)
 
 
-def single_line_spans(spans_ranges, seg_data):
+def _single_line_spans_scan(spans_ranges, lines_ranges):
     """
-    Function is truncating spans to be exactly inside one line, this is required
-    becouse even noise span sentinels are required to have bbox and such bbox
-    is easier to get if all tokens in the span are in the same line
+    Scan spans and lines one by one, used for lines which ends are not in ascending order
     :param spans_ranges: proposition of noise-span ranges
-    :param seg_data: dict of seg_data
+    :param lines_ranges: ranges of lines
     :return: adjusted span ranges
     """
 
@@ -194,12 +428,8 @@ def single_line_spans(spans_ranges, seg_data):
         overlap = (max(span[0], line_span[0]), min(span[1], line_span[1]))
         return max(0, overlap[1] - overlap[0]), overlap, line_span[1] >= span[1]
 
-    if "lines" not in seg_data:
-        return spans_ranges
-
     new_spans = []
     last_ln_idx = 0
-    lines_ranges = seg_data["lines"]["ranges"]
     for span in spans_ranges:
         max_overlap = 0
         best_overlap = None
@@ -212,7 +442,60 @@ def single_line_spans(spans_ranges, seg_data):
                 best_overlap = overlap
                 max_overlap = overlap_length
             if ended:
-                new_spans.append(best_overlap)
+                if best_overlap is not None:
+                    new_spans.append(best_overlap)
                 last_ln_idx = ln_idx
                 break
-    return np.array(new_spans)
+    return np.array(new_spans, dtype=np.int64).reshape(-1, 2)
+
+
+def single_line_spans(spans_ranges, seg_data):
+    """
+    Function is truncating spans to be exactly inside one line, this is required
+    becouse even noise span sentinels are required to have bbox and such bbox
+    is easier to get if all tokens in the span are in the same line.
+
+    Each span is truncated to the line of maximum overlap (the first one on ties, the last line of the document
+    whenever it overlaps the span). Lines are searched from the line in which the previous span ended, spans
+    ending after the last line are skipped, as well as spans not overlapping any line.
+    :param spans_ranges: proposition of noise-span ranges
+    :param seg_data: dict of seg_data
+    :return: adjusted span ranges
+    """
+    if "lines" not in seg_data:
+        return spans_ranges
+
+    lines_ranges = np.asarray(seg_data["lines"]["ranges"], dtype=np.int64).reshape(-1, 2)
+    spans = np.asarray(spans_ranges, dtype=np.int64).reshape(-1, 2)
+    line_ends = lines_ranges[:, 1]
+    if np.any(line_ends[1:] < line_ends[:-1]):
+        return _single_line_spans_scan(spans, lines_ranges)
+
+    num_lines = len(lines_ranges)
+    # line in which each span ends, searching from the line in which the previous (ended) span did
+    end_lines = np.searchsorted(line_ends, spans[:, 1], side='left')
+    ended = end_lines < num_lines
+    search_starts = np.maximum.accumulate(np.concatenate([[0], np.where(ended, end_lines, 0)]))[:-1]
+    end_lines = np.maximum(end_lines, search_starts)
+    # lines before the first one ending after the span start do not overlap it
+    first_lines = np.maximum(np.searchsorted(line_ends, spans[:, 0], side='right'), search_starts)
+    spans, first_lines, end_lines = spans[ended], first_lines[ended], end_lines[ended]
+
+    # overlaps of all candidate lines of spans, flattened
+    counts = np.maximum(end_lines - first_lines + 1, 0)
+    offsets = np.cumsum(counts) - counts
+    span_idx = np.repeat(np.arange(len(spans)), counts)
+    line_idx = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(first_lines, counts)
+    overlap_starts = np.maximum(spans[span_idx, 0], lines_ranges[line_idx, 0])
+    overlap_ends = np.minimum(spans[span_idx, 1], lines_ranges[line_idx, 1])
+    overlap_lengths = np.maximum(overlap_ends - overlap_starts, 0)
+
+    # ensure that the last noise span is in the last line
+    score = overlap_lengths.copy()
+    score[(line_idx == num_lines - 1) & (overlap_lengths > 0)] = np.iinfo(np.int64).max
+    best = np.zeros(len(spans), dtype=np.int64)
+    np.maximum.at(best, span_idx, score)
+    chosen = np.flatnonzero((score == best[span_idx]) & (score > 0))
+    _, first_chosen = np.unique(span_idx[chosen], return_index=True)
+    chosen = chosen[first_chosen]
+    return np.stack([overlap_starts[chosen], overlap_ends[chosen]], axis=1)
@@ -1,21 +1,38 @@
 import json
 import logging
 from pathlib import Path
-from typing import Any, Dict, Union
+from typing import Any, Dict, Iterable, Optional, Sequence, Union
 
 import numpy as np
 
-from benchmarker.data.document import Doc2d
+from benchmarker.data.document import Doc2d, TokenStore
 from benchmarker.data.utils import convert_to_np
 from benchmarker.input_loader.data_loader import DataLoader
+from benchmarker.utils import instrumentation
 
 
 class CommonFormatLoader(DataLoader[Union[str, Path]]):
+    """
+    :param docs: paths of common format files
+    :param segment_levels: segment levels of Doc2d
+    :param compact_tokens: whether to keep tokens of Doc2d in a `TokenStore` instead of a list of str
+    """
+
+    def __init__(
+        self,
+        docs: Iterable[Union[str, Path]],
+        segment_levels: Optional[Sequence[str]] = None,
+        compact_tokens: bool = True,
+    ) -> None:
+        super().__init__(docs, segment_levels)
+        self.compact_tokens = compact_tokens
+
     def process(self, doc: Union[str, Path], **kwargs) -> Doc2d:
         with open(doc, 'r') as inp:
             js = json.load(inp)
             return self.to_doc2d(js)
 
+    @instrumentation.timed('loader.to_doc2d')
     def to_doc2d(self, cf: Dict):
         docid = cf['doc_id']
         if list(set(cf['tokens'])) == [' ']:
@@ -46,4 +63,6 @@ class CommonFormatLoader(DataLoader[Union[str, Path]]):
             seg_data[level]['org_bboxes'] = convert_to_np(bb, 'org_bboxes')
             assert len(bb) == len(rng), "Number of positions does not match " "number of token ranges"
 
+        if self.compact_tokens:
+            tokens = TokenStore.from_tokens(tokens)
         return Doc2d(tokens=tokens, seg_data=seg_data, docid=docid)
@@ -0,0 +1,197 @@
+"""Opt-in timers and counters of the data preparation pipeline.
+
+Instrumentation is disabled by default, then hooks only check a module-level flag. Usage:
+
+    from benchmarker.utils import instrumentation
+
+    with instrumentation.session(instrumentation.LoggingExporter(), instrumentation.JsonExporter('stats.json')):
+        for instance in corpus.train:
+            ...
+
+Metrics of code executed in worker processes (e.g., BenchmarkDataset with num_workers > 0) are not collected.
+"""
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+_enabled = False
+_lock = threading.Lock()
+_timers: Dict[str, List[float]] = {}
+_counters: Dict[str, int] = {}
+_exporters: List['Exporter'] = []
+
+
+class Exporter(ABC):
+    """Destination of collected metrics."""
+
+    @abstractmethod
+    def export(self, summary: Dict[str, Any]):
+        """Export summary of metrics.
+
+        :param summary: dictionary with 'timers' (name to total seconds and calls) and 'counters' (name to value)
+        """
+
+
+class LoggingExporter(Exporter):
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+
+    def export(self, summary: Dict[str, Any]):
+        for name, timer in sorted(summary['timers'].items()):
+            logger.log(self.level, f'{name}: {timer["seconds"]:.3f}s in {timer["calls"]} calls')
+        for name, value in sorted(summary['counters'].items()):
+            logger.log(self.level, f'{name}: {value}')
+
+
+class JsonExporter(Exporter):
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, summary: Dict[str, Any]):
+        with open(self.path, 'w') as out:
+            json.dump(summary, out, indent=2, sort_keys=True)
+
+
+class CallbackExporter(Exporter):
+    """Pass the summary to a callback, e.g., to push it to a metrics system."""
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None]):
+        self.callback = callback
+
+    def export(self, summary: Dict[str, Any]):
+        self.callback(summary)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(*exporters: Exporter):
+    """Start collecting metrics.
+
+    :param exporters: exporters used by `export`
+    """
+    global _enabled
+    _exporters[:] = exporters
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Drop collected metrics."""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def add_time(name: str, seconds: float):
+    with _lock:
+        timer = _timers.setdefault(name, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += 1
+
+
+def count(name: str, value: int = 1):
+    """Increase counter (no-op when instrumentation is disabled).
+
+    :param name: name of the counter
+    :param value: increment
+    """
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + value
+
+
+@contextmanager
+def _timer(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str):
+    """Measure time of a block of code (no-op when instrumentation is disabled).
+
+    :param name: name of the timer
+    :return: context manager
+    """
+    return _timer(name) if _enabled else _NULL_TIMER
+
+
+def timed(name: str) -> Callable[[F], F]:
+    """Decorator measuring time of each call of the function (no-op when instrumentation is disabled).
+
+    :param name: name of the timer
+    """
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add_time(name, time.perf_counter() - start)
+        return wrapper  # type: ignore
+    return decorator
+
+
+def summary() -> Dict[str, Any]:
+    """Get collected metrics.
+
+    :return: dictionary with 'timers' (name to total seconds and calls) and 'counters' (name to value)
+    """
+    with _lock:
+        return {
+            'timers': {name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in _timers.items()},
+            'counters': dict(_counters),
+        }
+
+
+def export(exporters: Optional[List[Exporter]] = None):
+    """Pass collected metrics to exporters.
+
+    :param exporters: exporters to use instead of the ones passed to `enable`
+    """
+    current = summary()
+    for exporter in _exporters if exporters is None else exporters:
+        exporter.export(current)
+
+
+@contextmanager
+def session(*exporters: Exporter) -> Iterator[None]:
+    """Collect metrics of the block of code and export them at its end."""
+    reset()
+    enable(*exporters)
+    try:
+        yield
+    finally:
+        disable()
+        export()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Throughput benchmark of the reader pipeline (BenchmarkDataset -> CommonFormatLoader -> Corpus).
+
+Replays the datasets bundled in `examples/` (optionally tiled to a larger synthetic size)
+and reports docs/sec, instances/sec, peak RSS and per-stage times as JSON lines, along with
+memory per object and attribute access time of the data model classes.
+Run it from the repository root (with benchmarker installed or on PYTHONPATH), e.g.:
+
+    python benchmarks/reader_throughput.py run --tile 20 --output before.jsonl
+    python benchmarks/reader_throughput.py run --tile 20 --output after.jsonl
+    python benchmarks/reader_throughput.py compare before.jsonl after.jsonl
+"""
+
+import json
+import logging
+import platform
+import resource
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fire
+import numpy as np
+
+from benchmarker.data.model import Example, Feature, Span
+from benchmarker.data.reader import Corpus, qa_strategies
+from benchmarker.data.reader.common import DataInstance, Document
+from benchmarker.data.reader.benchmark_dataset import BenchmarkDataset
+from benchmarker.data.reader.content_index import load_common_format
+from benchmarker.input_loader.common_format import CommonFormatLoader
+from benchmarker.utils import instrumentation
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / 'examples'
+# name: (directory in examples, OCR engine, train strategy as in create_memmaps.sh)
+DATASETS = {
+    'DocVQA': ('docvqa', 'microsoft_cv', 'all_items'),
+    'PWC': ('AxCell', 'tesseract', 'concat'),
+    'DeepForm': ('DeepForm', 'microsoft_cv', 'all_items'),
+    'TabFact': ('TabFact', 'tesseract', 'all_items'),
+    'WikiTableQuestions': ('WikiTableQuestions', 'microsoft_cv', 'all_items'),
+    'InfographicsVQA': ('infographics_vqa', 'microsoft_cv', 'all_items'),
+    'KleisterCharity': ('kleister-charity', 'microsoft_cv', 'all_items'),
+}
+
+
+def tile_dataset(source: Path, target: Path, tile: int) -> Path:
+    """Write the train split of source dataset repeated `tile` times into target directory."""
+    (target / 'train').mkdir(parents=True)
+    for file_name in ('document.jsonl', 'documents_content.jsonl'):
+        lines = (source / 'train' / file_name).read_bytes().rstrip(b'\n') + b'\n'
+        with open(target / 'train' / file_name, 'wb') as out:
+            for _ in range(tile):
+                out.write(lines)
+    return target
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def staged_pass(dataset: BenchmarkDataset, corpus: Corpus, strategy) -> Dict[str, float]:
+    """Run the pipeline serially, timing each of its stages separately.
+
+    Common format is decoded the way the dataset does it, selectively unless `selective_parsing` is disabled.
+    """
+    stages: Dict[str, float] = defaultdict(float)
+    loader = CommonFormatLoader([], segment_levels=dataset.segment_levels)
+    with open(dataset.docs_jsonl_path, 'rb') as docs_file, \
+            open(dataset.docs_content_jsonl_path, 'rb') as content_file:
+        for doc_line, doc_content in zip(docs_file, content_file):
+            start = time.perf_counter()
+            doc_dict = json.loads(doc_line)
+            if dataset.selective_parsing:
+                common_format = load_common_format(doc_content, dataset.ocr)
+            else:
+                tool2cf = {c['tool_name']: c for c in json.loads(doc_content)['contents']}
+                common_format = tool2cf.get(dataset.ocr, {}).get('common_format')
+            stages['json_parse'] += time.perf_counter() - start
+            if common_format is None or not common_format['tokens']:
+                continue
+
+            start = time.perf_counter()
+            doc2d = loader.to_doc2d(common_format)
+            stages['to_doc2d'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            documents = list(dataset.to_documents(doc_dict, doc2d))
+            stages['annotation_expansion'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            for document in documents:
+                for _ in corpus.doc_to_instances(document, dataset, strategy):
+                    pass
+            stages['instance_generation'] += time.perf_counter() - start
+    return dict(stages)
+
+
+def end_to_end_pass(dataset: BenchmarkDataset, corpus: Corpus, strategy) -> Tuple[float, int, int]:
+    """Iterate over documents of the dataset and their instances, as `Corpus.get_instances` does.
+
+    :return: seconds, number of documents yielded by the dataset (skipped ones are not counted) and of instances
+    """
+    documents = instances = 0
+    start = time.perf_counter()
+    for document in dataset:
+        documents += 1
+        for _ in corpus.doc_to_instances(document, dataset, strategy):
+            instances += 1
+    return time.perf_counter() - start, documents, instances
+
+
+def model_footprint(count: int = 100000) -> Dict[str, Dict[str, float]]:
+    """Measure memory per object (without the fields it refers to) and attribute access time of data model classes."""
+    array: np.ndarray = np.zeros(1)
+    tokens: List[str] = []
+    seg_data: Dict[str, Any] = {}
+    factories: Dict[str, Tuple[Callable[[], Any], str]] = {
+        'DataInstance': (lambda: DataInstance('id', 'prefix', None, 'key', 'value'), 'output'),
+        'Document': (lambda: Document('id', None, seg_data), 'annotations'),
+        'Example': (lambda: Example('id', tokens, array, array, array, seg_data, array), 'seg_data'),
+        'Span': (lambda: Span('id', 0, 0, 1, tokens, tokens, tokens, seg_data, tokens, tokens), 'seg_data'),
+        'Feature': (lambda: Feature(array, array, array, seg_data, array), 'input_ids'),
+    }
+    footprint = {}
+    for name, (factory, attribute) in factories.items():
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        objects = [factory() for _ in range(count)]
+        allocated = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        # the list holding objects takes a pointer per object
+        bytes_per_object = allocated / count - 8
+        obj = objects[0]
+        del objects
+        seconds = min(timeit.repeat(f'obj.{attribute}', globals={'obj': obj}, number=count, repeat=5))
+        footprint[name] = {'bytes': bytes_per_object, 'access_ns': seconds / count * 1e9}
+    return footprint
+
+
+def benchmark_dataset(
+    name: str, tile: int, repeats: int, segment_levels: Sequence[str], dataset_kwargs: Dict[str, Any]
+) -> Dict[str, Any]:
+    logging.disable(logging.WARNING)
+    directory, ocr, strategy_name = DATASETS[name]
+    strategy = getattr(qa_strategies, strategy_name)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_dir = tile_dataset(EXAMPLES_DIR / directory, Path(tmp_dir) / directory, tile)
+        dataset = BenchmarkDataset(
+            dataset_dir, 'train', ocr=ocr, segment_levels=tuple(segment_levels), **dataset_kwargs
+        )
+        corpus = Corpus(train=dataset, train_strategy=strategy)
+
+        times = []
+        for _ in range(repeats):
+            seconds, documents, instances = end_to_end_pass(dataset, corpus, strategy)
+            times.append(seconds)
+        stages = staged_pass(dataset, corpus, strategy)
+        metrics: List[Dict[str, Any]] = []
+        with instrumentation.session(instrumentation.CallbackExporter(metrics.append)):
+            end_to_end_pass(dataset, corpus, strategy)
+
+    seconds = min(times)
+    return {
+        'dataset': name,
+        'ocr': ocr,
+        'tile': tile,
+        'repeats': repeats,
+        'segment_levels': list(segment_levels),
+        'dataset_kwargs': dataset_kwargs,
+        'documents': documents,
+        'instances': instances,
+        'seconds': seconds,
+        'docs_per_sec': documents / seconds if seconds else None,
+        'instances_per_sec': instances / seconds if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'instrumentation': metrics[0],
+    }
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(  # nosec
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=EXAMPLES_DIR.parent
+        ).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'timestamp': time.time()}
+
+
+def run(
+    datasets: Optional[Sequence[str]] = None,
+    tile: int = 1,
+    repeats: int = 3,
+    segment_levels: Sequence[str] = ('tokens', 'pages'),
+    isolate: bool = True,
+    output: Optional[str] = None,
+    **dataset_kwargs,
+):
+    """Benchmark the reader pipeline on bundled example datasets.
+
+    :param datasets: names of datasets to benchmark (all by default), see DATASETS
+    :param tile: how many times each example train split is repeated
+    :param repeats: number of end-to-end passes, the fastest one is reported
+    :param segment_levels: segment levels of Doc2d
+    :param isolate: whether to run each dataset in a fresh process, so peak RSS is measured per dataset
+    :param output: path of the JSON lines file to append results to (stdout by default)
+    :param dataset_kwargs: other BenchmarkDataset parameters (e.g., num_workers, cache_dir)
+    """
+    env = environment()
+    # data model classes do not depend on datasets, so they are measured once
+    footprint = model_footprint()
+    results = []
+    for name in datasets or list(DATASETS):
+        args = (name, tile, repeats, tuple(segment_levels), dataset_kwargs)
+        if isolate:
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+                result = executor.submit(benchmark_dataset, *args).result()
+        else:
+            result = benchmark_dataset(*args)
+        result.update(env, model_footprint=footprint)
+        results.append(result)
+
+    lines = [json.dumps(result) for result in results]
+    if output:
+        with open(output, 'a') as out:
+            out.write('\n'.join(lines) + '\n')
+    else:
+        print('\n'.join(lines))  # noqa: T001
+
+
+def read_results(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path) as inp:
+        return {result['dataset']: result for result in map(json.loads, inp)}
+
+
+def compare_rows(baseline: Dict[str, Dict], current: Dict[str, Dict]) -> Iterator[List[str]]:
+    for name in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[name], current[name]
+        row = [name]
+        for key in ('docs_per_sec', 'instances_per_sec', 'peak_rss_mb'):
+            row.append(f'{after[key] / before[key] - 1:+.1%}' if before[key] else 'n/a')
+        for stage, seconds in sorted(after['stages'].items()):
+            reference = before['stages'].get(stage)
+            row.append(f'{stage}={seconds / reference - 1:+.1%}' if reference else f'{stage}=n/a')
+        for class_name, footprint in sorted(after.get('model_footprint', {}).items()):
+            reference = before.get('model_footprint', {}).get(class_name)
+            if reference:
+                row.append(f'{class_name}.bytes={footprint["bytes"] / reference["bytes"] - 1:+.1%}')
+        yield row
+
+
+def compare(baseline: str, current: str):
+    """Print relative changes between two result files (positive throughput change is an improvement).
+
+    :param baseline: results of the reference commit
+    :param current: results of the tested commit
+    """
+    print('dataset docs/sec instances/sec peak_rss stages...')  # noqa: T001
+    for row in compare_rows(read_results(baseline), read_results(current)):
+        print(' '.join(row))  # noqa: T001
+
+
+if __name__ == '__main__':
+    fire.Fire({'run': run, 'compare': compare})
@@ -18,7 +18,7 @@ do
             continue
         fi
         echo "Producing memmaps for ${DATASETS[task_idx]}/$ocr_engine..."
-        TOKENIZERS_PARALLELISM=false ./benchmarker/cli/l5/create_memmaps.py \
+        TOKENIZERS_PARALLELISM=false python -m benchmarker.cli.l5.create_memmaps \
             --dataset_path_or_name $DATASETS_ROOT/${DATASETS[task_idx]}/ \
             --model_path $TOKENIZER \
             --memmap_path memmaps/${DATASETS[task_idx]}/$ocr_engine \
@@ -1,36 +1,152 @@
 #!/usr/bin/env python3
-"""Scripts that convert T5-model outputs to format that can be directly compared with `documents.jsonl`"""
+"""Scripts that convert T5-model outputs to format that can be directly compared with `documents.jsonl`
+
+Predictions are deduplicated per document with a hash index. Once more than `max_in_memory` distinct predictions
+are read, the index is spilled to a temporary SQLite database, so generation files larger than memory can be
+converted. The reference file is then streamed once, looking up predictions of each document.
+Shards of the generation file are merged as if they were concatenated, see `generations.py`.
+"""
 
-from glob import glob
 import json
 import os
-from collections import defaultdict
+import sqlite3
+import sys
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
 import fire
 
+# generations.py is a sibling script, not a module of an installed package
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generations import read_records  # noqa: E402
+
+Prediction = Tuple[str, str]
+
+
+class PredictionIndex:
+    """Distinct predictions (label name, predicted values) of each document, in order of first occurrence.
+
+    :param max_in_memory: number of distinct predictions kept in memory before spilling them to disk
+    :param spill_dir: directory of the spilled index (system temporary directory by default)
+    :param batch_size: number of predictions inserted to the spilled index at once
+    """
+
+    def __init__(self, max_in_memory: int = 500000, spill_dir: Optional[str] = None, batch_size: int = 10000):
+        self.max_in_memory = max_in_memory
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        # dicts with None values are insertion-ordered sets
+        self._docs: Dict[str, Dict[Prediction, None]] = {}
+        self._size = 0
+        self._tmp_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, int, str, str]] = []
+        self._seq = 0
+
+    @property
+    def spilled(self) -> bool:
+        return self._db is not None
+
+    def add(self, doc_id: str, label_name: str, preds: str):
+        if self._db is None:
+            predictions = self._docs.setdefault(doc_id, {})
+            if (label_name, preds) not in predictions:
+                predictions[(label_name, preds)] = None
+                self._size += 1
+                if self._size > self.max_in_memory:
+                    self._spill()
+            return
+        self._pending.append((doc_id, self._seq, label_name, preds))
+        self._seq += 1
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def _spill(self):
+        self._tmp_dir = tempfile.TemporaryDirectory(prefix='converter-', dir=self.spill_dir)
+        self._db = sqlite3.connect(os.path.join(self._tmp_dir.name, 'predictions.sqlite'))
+        self._db.execute('PRAGMA journal_mode = OFF')
+        self._db.execute('PRAGMA synchronous = OFF')
+        self._db.execute(
+            'CREATE TABLE predictions (doc_id TEXT, seq INTEGER, label_name TEXT, preds TEXT, '
+            'UNIQUE (doc_id, label_name, preds))'
+        )
+        docs, self._docs, self._size = self._docs, {}, 0
+        for doc_id, predictions in docs.items():
+            for label_name, preds in predictions:
+                self.add(doc_id, label_name, preds)
+
+    def _flush(self):
+        self._db.executemany('INSERT OR IGNORE INTO predictions VALUES (?, ?, ?, ?)', self._pending)
+        self._pending = []
 
-def main(test_generation, reference_path, outpath):
-    data = defaultdict(list)
+    def finalize(self):
+        """Make all added predictions available to `get`."""
+        if self._db is not None:
+            self._flush()
+            self._db.execute('CREATE INDEX predictions_doc ON predictions (doc_id, seq)')
+            self._db.commit()
 
-    with open(test_generation) as raw_out:
-        for line in raw_out:
-            line = json.loads(line)
-            doc_id = line['doc_id'].split('__')[0]
-            if not (line['label_name'], line['preds']) in data[doc_id]:
-                data[doc_id].append((line['label_name'], line['preds']))
+    def get(self, doc_id: str) -> List[Prediction]:
+        if self._db is None:
+            return list(self._docs.get(doc_id, ()))
+        rows = self._db.execute(
+            'SELECT label_name, preds FROM predictions WHERE doc_id = ? ORDER BY seq', (doc_id,)
+        )
+        return [tuple(row) for row in rows]
 
-    with open(reference_path) as expected, open(outpath, 'w+') as output:
-        for line in expected:
-            line = json.loads(line)
-            ans = []
-            for key, val in data[line['name']]:
-                key = key.rstrip('=')
-                vals = [v.strip() for v in val.split(' | ')]
-                ans.append({'key': key, 'values': [{'value': val} for val in vals]})
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self._tmp_dir.cleanup()
+        self._docs = {}
 
-            ans_doc = {'name': line['name'], 'annotations': ans}
-            output.write(json.dumps(ans_doc) + '\n')
+    def __enter__(self) -> 'PredictionIndex':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def parse_generation(line: str) -> Tuple[str, str, str]:
+    """Parse (document id, label name, predicted values) of a line of a generation file.
+
+    Ids of parts of documents (e.g., `{name}__{page}`) are mapped to ids of the documents.
+    """
+    line = json.loads(line)
+    return line['doc_id'].split('__')[0], line['label_name'], line['preds']
+
+
+def to_annotations(predictions: List[Prediction]) -> List[Dict]:
+    ans = []
+    for key, val in predictions:
+        key = key.rstrip('=')
+        vals = [v.strip() for v in val.split(' | ')]
+        ans.append({'key': key, 'values': [{'value': val} for val in vals]})
+    return ans
+
+
+def main(test_generation, reference_path, outpath, max_in_memory=500000, spill_dir=None, processes=0):
+    """
+    :param test_generation: generation file of the model (jsonl with doc_id, label_name and preds), or its shards
+        given as a glob pattern or a list of paths (see `generations.generation_paths`)
+    :param reference_path: documents.jsonl whose documents are written to the output, in its order
+    :param outpath: path of the converted file
+    :param max_in_memory: number of distinct predictions kept in memory before spilling them to disk
+    :param spill_dir: directory of the spilled predictions (system temporary directory by default)
+    :param processes: number of worker processes parsing the generation file
+    """
+    with PredictionIndex(max_in_memory, spill_dir) as data:
+        for doc_id, label_name, preds in read_records(test_generation, parse_generation, processes):
+            data.add(doc_id, label_name, preds)
+        data.finalize()
+
+        with open(reference_path) as expected, open(outpath, 'w+') as output:
+            for line in expected:
+                line = json.loads(line)
+                ans_doc = {'name': line['name'], 'annotations': to_annotations(data.get(line['name']))}
+                output.write(json.dumps(ans_doc) + '\n')
 
 
 if __name__ == "__main__":
     fire.Fire(main)
-
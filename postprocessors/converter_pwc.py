@@ -4,26 +4,43 @@
 from glob import glob
 import json
 import os
+import sys
 from collections import defaultdict
 import fire
 import re
+from typing import Tuple
 
+# generations.py is a sibling script, not a module of an installed package
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generations import read_records  # noqa: E402
 
-def main(test_generation, reference_path, outpath):
+
+def parse_generation(line: str) -> Tuple[str, str, Tuple[Tuple[str, str], ...]]:
+    """Parse a line of a generation file into the line itself (used to skip repeated lines), document id
+    and (column, value) pairs of predicted values."""
+    line = line.rstrip('\n')
+    record = json.loads(line)
+    column = re.search(r'the (\w+) column\?$', record['label_name']).group(1)
+    values = re.sub(r' \|$', '', record['preds']).split(' | ')
+    return line, record['doc_id'], tuple((column, val) for val in values)
+
+
+def main(test_generation, reference_path, outpath, processes=0):
+    """
+    :param test_generation: generation file of the model, or its shards given as a glob pattern or a list of paths
+        (see `generations.generation_paths`)
+    :param reference_path: documents.jsonl whose documents are written to the output, in its order
+    :param outpath: path of the converted file
+    :param processes: number of worker processes parsing the generation file
+    """
     data = defaultdict(list)
     seen = set()
 
-    with open(test_generation) as raw_out:
-        for line in raw_out:
-            if line in seen:
-                continue
-            seen.add(line)
-            line = json.loads(line)
-            doc_id = line['doc_id']
-            column = re.search(r'the (\w+) column\?$', line['label_name']).group(1)
-            values = re.sub(' \|$', '', line['preds']).split(' | ')
-            col_values = [(column, val) for val in values]
-            data[doc_id].append(col_values)
+    for line, doc_id, col_values in read_records(test_generation, parse_generation, processes):
+        if line in seen:
+            continue
+        seen.add(line)
+        data[doc_id].append(list(col_values))
 
     with open(reference_path) as expected, open(outpath, 'w+') as output:
         for line in expected:
@@ -0,0 +1,107 @@
+"""Reading of (possibly sharded) generation files of the model, shared by converters.
+
+Shards written by many workers (e.g., `test_generations.txt.0`, `test_generations.txt.1`, ...) are given as a glob
+pattern (e.g., `--test_generation 'out/test_generations.txt.*'`) or a list of paths. They are split into chunks
+of whole lines parsed in parallel, and the parsed records are merged in order of shards and lines, so the result
+is the same as reading the concatenation of the shards.
+"""
+
+import glob
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Deque, Hashable, Iterator, List, Sequence, Tuple, Union
+
+_NUMBERS = re.compile(r'(\d+)')
+
+Chunk = Tuple[str, int, int, Callable[[str], Hashable]]
+
+
+def _natural_key(path: str) -> Tuple:
+    return tuple(int(part) if part.isdigit() else part for part in _NUMBERS.split(path))
+
+
+def generation_paths(test_generation: Union[str, Sequence[str]]) -> List[str]:
+    """Expand generation files given as a path, a glob pattern or a list of them (also as a comma-separated string).
+
+    Files matched by a pattern are ordered by numbers in their names (e.g., `gen.2` before `gen.10`).
+    """
+    patterns = test_generation.split(',') if isinstance(test_generation, str) else list(test_generation)
+    paths = []
+    for pattern in patterns:
+        pattern = str(pattern)
+        if glob.has_magic(pattern):
+            matched = sorted(glob.glob(pattern), key=_natural_key)
+            if not matched:
+                raise FileNotFoundError(f'No generation files match {pattern}')
+            paths.extend(matched)
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def chunk_ranges(path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Split a file into ranges of bytes of about chunk_bytes, starting and ending at line boundaries."""
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, 'rb') as inp:
+        for position in range(chunk_bytes, size, chunk_bytes):
+            if position <= starts[-1]:
+                continue
+            inp.seek(position - 1)
+            inp.readline()
+            if inp.tell() < size:
+                starts.append(inp.tell())
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def parse_chunk(chunk: Chunk) -> List[Hashable]:
+    """Parse non-empty lines of a chunk, records equal to earlier ones of the chunk are dropped."""
+    path, start, end, parse = chunk
+    with open(path, 'rb') as inp:
+        inp.seek(start)
+        data = inp.read(end - start)
+    lines = (line.decode('utf-8') for line in data.split(b'\n'))
+    return list(dict.fromkeys(parse(line) for line in lines if line.strip()))
+
+
+def read_records(
+    test_generation: Union[str, Sequence[str]],
+    parse: Callable[[str], Hashable],
+    processes: int = 0,
+    chunk_bytes: int = 2 ** 24,
+) -> Iterator[Hashable]:
+    """Parse lines of generation files, in order of files and lines.
+
+    Records repeated within a chunk are yielded once (at their first occurrence), so callers deduplicating
+    records get the same result as with all records.
+
+    :param test_generation: path, glob pattern or list of them (see `generation_paths`)
+    :param parse: picklable function parsing a line into a hashable record
+    :param processes: number of worker processes parsing chunks, chunks are parsed in the main process if 0
+    :param chunk_bytes: approximate size of chunks of files
+    :return: iterator over records
+    """
+    chunks = (
+        (path, start, end, parse)
+        for path in generation_paths(test_generation)
+        for start, end in chunk_ranges(path, chunk_bytes)
+    )
+    if processes <= 0:
+        for chunk in chunks:
+            yield from parse_chunk(chunk)
+        return
+
+    pending: Deque = deque()
+    with ProcessPoolExecutor(processes) as executor:
+        try:
+            for chunk in chunks:
+                if len(pending) >= 2 * processes:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(parse_chunk, chunk))
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,244 @@
+import itertools
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarker.data.document import TokenStore
+from benchmarker.data.reader import Corpus
+from benchmarker.data.reader.arrow_dataset import ArrowDataset, export, pa
+from benchmarker.data.reader.benchmark_dataset import BenchmarkDataset
+from benchmarker.data.reader.content_index import JsonlIndex
+from benchmarker.data.reader.doc2d_cache import Doc2dCache, Doc2dCacheWriter
+
+
+def merged_dataset(target: Path) -> Path:
+    """Build a 'train' split holding documents of all the example datasets with microsoft_cv OCR."""
+    split_dir = target / 'train'
+    split_dir.mkdir(parents=True)
+    with open(split_dir / 'document.jsonl', 'w') as docs, open(split_dir / 'documents_content.jsonl', 'w') as content:
+        for name in ('docvqa', 'DeepForm', 'WikiTableQuestions', 'kleister-charity', 'infographics_vqa'):
+            docs.write(Path(f'examples/{name}/train/document.jsonl').read_text().rstrip('\n') + '\n')
+            content.write(Path(f'examples/{name}/train/documents_content.jsonl').read_text().rstrip('\n') + '\n')
+    return target
+
+
+class TestBenchmarkDataset(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.directory = merged_dataset(self.tmp_dir / 'dataset')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_index_is_persisted_and_invalidated(self) -> None:
+        path = self.directory / 'train' / 'documents_content.jsonl'
+        index = JsonlIndex.open(path, with_tools=True)
+        self.assertEqual(len(index), 5)
+        self.assertTrue(JsonlIndex.sidecar_path(path).exists())
+        self.assertIn('microsoft_cv', index[1].tools)
+        self.assertIsNotNone(JsonlIndex.load(path))
+
+        with open(path, 'a') as out:
+            out.write('\n')
+        self.assertFalse(index.is_valid())
+        self.assertIsNone(JsonlIndex.load(path))
+
+    def test_random_access_matches_iteration(self) -> None:
+        dataset = BenchmarkDataset(self.directory, 'train', 'microsoft_cv')
+        documents = list(dataset)
+        by_name = dataset.get_documents('csv_204-csv_590')
+        expected = [doc for doc in documents if doc.identifier == 'csv_204-csv_590']
+        self.assertEqual([d.annotations for d in by_name], [d.annotations for d in expected])
+        self.assertEqual(by_name[0].document_2d, expected[0].document_2d)
+
+        resumed = list(dataset.iter_documents(start='csv_204-csv_590'))
+        self.assertEqual([d.identifier for d in resumed], [d.identifier for d in documents[-len(resumed):]])
+
+    def test_random_access_interface(self) -> None:
+        dataset = BenchmarkDataset(self.directory, 'train', 'microsoft_cv')
+        self.assertEqual(len(dataset), 5)
+        self.assertEqual([d.identifier for d in dataset[2]], ['csv_204-csv_590'] * 15)
+        self.assertEqual([d.annotations for d in dataset[2]], [d.annotations for d in dataset['csv_204-csv_590']])
+        with self.assertRaises(IndexError):
+            dataset[5]
+
+        corpus = Corpus()
+        corpus.read_benchmark_challenge(self.directory, ocr='microsoft_cv')
+        instances = list(corpus.train)
+        counts = dataset.instance_counts()
+        self.assertEqual(sum(counts), len(instances))
+        for position, count in enumerate(counts):
+            name = dataset[position][0].identifier
+            self.assertEqual(count, sum(i.identifier == name for i in instances))
+
+    def test_instance_counts_skip_documents_without_tokens(self) -> None:
+        split_dir = self.directory / 'train'
+        doc_dict = json.loads(Path('examples/DeepForm/train/document.jsonl').read_text().split('\n')[0])
+        content = json.loads(Path('examples/DeepForm/train/documents_content.jsonl').read_text().split('\n')[0])
+        doc_dict['name'] = content['name'] = 'no-tokens'
+        for tool in content['contents']:
+            if 'common_format' in tool:
+                tool['common_format']['tokens'] = []
+        with open(split_dir / 'document.jsonl', 'a') as docs, open(split_dir / 'documents_content.jsonl', 'a') as out:
+            docs.write(json.dumps(doc_dict) + '\n')
+            out.write(json.dumps(content) + '\n')
+
+        for kwargs in ({}, {'selective_parsing': False}, {'cache_dir': self.tmp_dir / 'cache'}):
+            dataset = BenchmarkDataset(self.directory, 'train', 'microsoft_cv', **kwargs)
+            instances = list(Corpus(train=dataset).train)
+            counts = dataset.instance_counts()
+            self.assertEqual(len(counts), 6)
+            self.assertEqual(counts[5], 0)
+            self.assertEqual(sum(counts), len(instances))
+
+    def test_shards_are_disjoint_and_complete(self) -> None:
+        dataset = BenchmarkDataset(self.directory, 'train', 'microsoft_cv')
+        expected = [(i.identifier, i.input_prefix) for i in Corpus(train=dataset).train]
+        for shard_by in ('documents', 'bytes'):
+            shards = []
+            for shard_id in range(3):
+                shard = BenchmarkDataset(
+                    self.directory, 'train', 'microsoft_cv', shard_by=shard_by, num_shards=3, shard_id=shard_id
+                )
+                shards.append([(i.identifier, i.input_prefix) for i in Corpus(train=shard).train])
+            self.assertEqual([i for shard in shards for i in shard], expected)
+            identifiers = [{identifier for identifier, _ in shard} for shard in shards]
+            for first, second in itertools.combinations(identifiers, 2):
+                self.assertFalse(first & second)
+
+    def test_selective_parsing_matches_full_parsing(self) -> None:
+        for ocr in ('microsoft_cv', 'tesseract', 'djvu'):
+            selective = list(BenchmarkDataset(self.directory, 'train', ocr))
+            full = list(BenchmarkDataset(self.directory, 'train', ocr, selective_parsing=False))
+            indexed = list(BenchmarkDataset(self.directory, 'train', ocr).iter_documents())
+            self.assertEqual(len(selective), len(full))
+            self.assertEqual(len(indexed), len(full))
+            for expected, *actual in zip(full, selective, indexed):
+                for doc in actual:
+                    self.assertEqual(doc.identifier, expected.identifier)
+                    self.assertEqual(doc.annotations, expected.annotations)
+                    self.assertEqual(doc.document_2d, expected.document_2d)
+
+    def test_tool_name_after_other_keys(self) -> None:
+        expected = list(BenchmarkDataset(self.directory, 'train', 'microsoft_cv', selective_parsing=False))
+        path = self.directory / 'train' / 'documents_content.jsonl'
+        lines = []
+        for line in path.read_text().splitlines():
+            content = json.loads(line)
+            # "tool_name" is not the first key of the requested tool objects, other ones can still be located
+            content['contents'] = [
+                {**{k: v for k, v in c.items() if k != 'tool_name'}, 'tool_name': c['tool_name']}
+                if c['tool_name'] == 'microsoft_cv' else c
+                for c in content['contents']
+            ]
+            lines.append(json.dumps(content))
+        path.write_text('\n'.join(lines) + '\n')
+
+        self.assertEqual([entry.tools for entry in JsonlIndex.build(path, with_tools=True)], [{}] * 5)
+        dataset = BenchmarkDataset(self.directory, 'train', 'microsoft_cv')
+        for documents in (list(dataset), list(dataset.iter_documents())):
+            self.assertEqual([d.identifier for d in documents], [d.identifier for d in expected])
+            for doc, expected_doc in zip(documents, expected):
+                self.assertEqual(doc.document_2d, expected_doc.document_2d)
+
+    def test_parallel_decoding_keeps_order(self) -> None:
+        serial = list(BenchmarkDataset(self.directory, 'train', 'microsoft_cv'))
+        parallel = list(BenchmarkDataset(self.directory, 'train', 'microsoft_cv', num_workers=2, max_in_flight=2))
+        self.assertEqual([d.identifier for d in parallel], [d.identifier for d in serial])
+        for doc, expected in zip(parallel, serial):
+            self.assertEqual(doc.annotations, expected.annotations)
+            self.assertEqual(doc.document_2d, expected.document_2d)
+
+    def test_doc2d_cache(self) -> None:
+        cache_dir = self.tmp_dir / 'cache'
+        levels = ('tokens', 'pages', 'lines')
+        expected = list(BenchmarkDataset(self.directory, 'train', 'microsoft_cv', segment_levels=levels))
+        dataset = BenchmarkDataset(self.directory, 'train', 'microsoft_cv', segment_levels=levels, cache_dir=cache_dir)
+        self.assertIsNone(dataset.cache())
+        for _ in range(2):
+            documents = list(dataset)
+            self.assertIsNotNone(dataset.cache())
+            self.assertEqual(len(documents), len(expected))
+            for doc, expected_doc in zip(documents, expected):
+                self.assertEqual(doc.identifier, expected_doc.identifier)
+                self.assertEqual(doc.annotations, expected_doc.annotations)
+                self.assertEqual(doc.document_2d, expected_doc.document_2d)
+        # cached tokens are views of the memory-mapped UTF-8 buffer
+        self.assertTrue(all(isinstance(doc.document_2d.tokens, TokenStore) for doc in documents))
+
+        with open(self.directory / 'train' / 'document.jsonl', 'a') as out:
+            out.write('\n')
+        self.assertIsNone(dataset.cache())
+
+    def test_doc2d_cache_writers(self) -> None:
+        path = self.tmp_dir / 'cache' / 'train'
+        sources = [self.directory / 'train' / 'document.jsonl']
+        doc_dict = json.loads(sources[0].read_text().split('\n')[0])
+        document = next(iter(BenchmarkDataset(self.directory, 'train', 'microsoft_cv')))
+        # writers of the same cache do not share their temporary directories
+        first, second = Doc2dCacheWriter(path, sources, ['pages']), Doc2dCacheWriter(path, sources, ['pages'])
+        self.assertNotEqual(first.tmp_path, second.tmp_path)
+        second.abort()
+        first.append(doc_dict, document.document_2d)
+        first.commit()
+        self.assertEqual(list(Doc2dCache.open(path, sources).doc2d(0).tokens), list(document.document_2d.tokens))
+
+        writer = Doc2dCacheWriter(path, sources, ['lines'])
+        with self.assertRaises(ValueError):
+            writer.append(doc_dict, document.document_2d)
+        writer.abort()
+        self.assertEqual(sorted(p.name for p in path.parent.iterdir()), ['train'])
+
+
+@unittest.skipIf(pa is None, 'pyarrow is not installed')
+class TestArrowDataset(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.directory = merged_dataset(self.tmp_dir / 'dataset')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_export_matches_jsonl(self) -> None:
+        for output_format in ('arrow', 'parquet'):
+            output_dir = self.tmp_dir / output_format
+            export(str(self.directory), str(output_dir), output_format=output_format)
+            for ocr in ('microsoft_cv', 'tesseract', 'djvu'):
+                for levels in (('tokens', 'pages'), ('tokens', 'pages', 'lines')):
+                    expected = list(BenchmarkDataset(self.directory, 'train', ocr, segment_levels=levels))
+                    dataset = ArrowDataset(output_dir / f'train.{output_format}', ocr, segment_levels=levels)
+                    documents = list(dataset)
+                    self.assertEqual(len(documents), len(expected))
+                    for doc, expected_doc in zip(documents, expected):
+                        self.assertEqual(doc.identifier, expected_doc.identifier)
+                        self.assertEqual(doc.annotations, expected_doc.annotations)
+                        self.assertEqual(doc.document_2d, expected_doc.document_2d)
+
+    def test_column_pruning_and_random_access(self) -> None:
+        export(str(self.directory), str(self.tmp_dir / 'arrow'))
+        dataset = ArrowDataset(self.tmp_dir / 'arrow' / 'train.arrow', 'microsoft_cv')
+        self.assertFalse([name for name in dataset.table().column_names if 'lines' in name or 'tesseract' in name])
+        self.assertEqual(len(dataset), 5)
+        self.assertEqual([d.identifier for d in dataset['csv_204-csv_590']], ['csv_204-csv_590'] * 15)
+        expected = BenchmarkDataset(self.directory, 'train', 'microsoft_cv')[2]
+        self.assertEqual(dataset[2][0].document_2d, expected[0].document_2d)
+        with self.assertRaises(IndexError):
+            dataset[5]
+
+        corpus = Corpus()
+        corpus.read_arrow_challenge(self.tmp_dir / 'arrow', ocr='microsoft_cv')
+        self.assertEqual(sum(dataset.instance_counts()), len(list(corpus.train)))
+
+    def test_missing_levels(self) -> None:
+        for output_format in ('arrow', 'parquet'):
+            output_dir = self.tmp_dir / output_format
+            export(str(self.directory), str(output_dir), output_format=output_format, levels=['pages'])
+            dataset = ArrowDataset(output_dir / f'train.{output_format}', 'microsoft_cv', segment_levels=('lines',))
+            with self.assertRaisesRegex(ValueError, r"available levels are \['pages'\]"):
+                dataset.table()
+
+
+if __name__ == "__main__":
+    unittest.main()
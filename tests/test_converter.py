@@ -0,0 +1,101 @@
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def write_jsonl(path: Path, rows) -> Path:
+    with open(path, 'w') as out:
+        for row in rows:
+            out.write(json.dumps(row) + '\n')
+    return path
+
+
+class TestConverter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name)
+        generations = [
+            {'doc_id': 'a.pdf__0', 'label_name': 'date=', 'preds': '2020 | 2021'},
+            {'doc_id': 'b.pdf', 'label_name': 'name', 'preds': 'Bob'},
+            {'doc_id': 'a.pdf__1', 'label_name': 'date=', 'preds': '2020 | 2021'},
+            {'doc_id': 'a.pdf__1', 'label_name': 'amount', 'preds': '10'},
+            {'doc_id': 'b.pdf', 'label_name': 'name', 'preds': 'Bob'},
+            {'doc_id': 'a.pdf__2', 'label_name': 'date=', 'preds': '2019'},
+        ]
+        self.generations = generations
+        self.generation = write_jsonl(self.directory / 'test_generations.txt', generations)
+        self.reference = write_jsonl(
+            self.directory / 'document.jsonl', [{'name': n, 'annotations': []} for n in ('b.pdf', 'a.pdf', 'c.pdf')]
+        )
+        self.expected = [
+            {'name': 'b.pdf', 'annotations': [{'key': 'name', 'values': [{'value': 'Bob'}]}]},
+            {
+                'name': 'a.pdf',
+                'annotations': [
+                    {'key': 'date', 'values': [{'value': '2020'}, {'value': '2021'}]},
+                    {'key': 'amount', 'values': [{'value': '10'}]},
+                    {'key': 'date', 'values': [{'value': '2019'}]},
+                ],
+            },
+            {'name': 'c.pdf', 'annotations': []},
+        ]
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def convert(self, *args: str, generation=None, script='postprocessors/converter.py', module=None):
+        outpath = self.directory / 'converted.jsonl'
+        generation = str(generation or self.generation)
+        command = [sys.executable, '-m', module] if module else [sys.executable, script]
+        subprocess.run(command + [generation, str(self.reference), str(outpath)] + list(args), check=True)
+        with open(outpath) as inp:
+            return [json.loads(line) for line in inp]
+
+    def test_deduplicated_predictions(self) -> None:
+        self.assertEqual(self.convert(), self.expected)
+
+    def test_run_as_module(self) -> None:
+        self.assertEqual(self.convert(module='postprocessors.converter'), self.expected)
+
+    def test_spilled_predictions(self) -> None:
+        spill_dir = self.directory / 'spill'
+        spill_dir.mkdir()
+        self.assertEqual(self.convert('--max_in_memory', '1', '--spill_dir', str(spill_dir)), self.expected)
+        self.assertEqual(list(spill_dir.iterdir()), [])
+
+    def test_sharded_generations(self) -> None:
+        # shards are merged in order of numbers in their names, as if they were concatenated
+        for shard, start in ((1, 0), (2, 2), (10, 4)):
+            write_jsonl(self.directory / f'test_generations.txt.{shard}', self.generations[start:start + 2])
+        pattern = self.directory / 'test_generations.txt.*'
+        self.assertEqual(self.convert('--processes', '2', generation=pattern), self.expected)
+        shards = ','.join(str(self.directory / f'test_generations.txt.{shard}') for shard in (1, 2, 10))
+        self.assertEqual(self.convert(generation=shards), self.expected)
+
+    def test_sharded_pwc_generations(self) -> None:
+        generations = [
+            {'doc_id': 'a.pdf', 'label_name': 'What is in the model column?', 'preds': 'BERT | T5 |'},
+            {'doc_id': 'a.pdf', 'label_name': 'What is in the score column?', 'preds': '80.1'},
+            {'doc_id': 'a.pdf', 'label_name': 'What is in the model column?', 'preds': 'BERT | T5 |'},
+        ]
+        for shard in range(3):
+            write_jsonl(self.directory / f'pwc.txt.{shard}', generations[shard:shard + 1])
+        self.reference = write_jsonl(self.directory / 'document.jsonl', [{'name': 'a.pdf', 'annotations': [{}]}])
+        converted = self.convert(generation=self.directory / 'pwc.txt.*', script='postprocessors/converter_pwc.py')
+
+        def cell(column, value):
+            return {'key': column, 'values': [{'value': value}]}
+
+        entries = [
+            {'value': '', 'children': [cell('model', 'BERT'), cell('score', '80.1')]},
+            {'value': '', 'children': [cell('model', 'T5')]},
+        ]
+        annotations = [{'key': 'leaderboard_entry', 'values': entries}]
+        self.assertEqual(converted, [{'name': 'a.pdf', 'annotations': annotations}])
+
+
+if __name__ == '__main__':
+    unittest.main()
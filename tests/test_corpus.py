@@ -1,9 +1,13 @@
+import tempfile
 import unittest
 from pathlib import Path
 
+import numpy as np
+
 from benchmarker.data.reader import Corpus, qa_strategies
+from benchmarker.data.reader.augmentation import SynonymTable, read_synonyms
 from benchmarker.data.reader.common import DataInstance
-from benchmarker.data.document import Doc2d
+from benchmarker.data.document import Doc2d, TokenStore
 
 
 class TestCorpus(unittest.TestCase):
@@ -784,6 +788,100 @@ class TestCorpus(unittest.TestCase):
             self.assertEqual(actual.output_prefix, expected.output_prefix)
             self.assertEqual(actual.output, expected.output)
 
+    def test_grouped_annotations(self) -> None:
+        data_path = Path("examples/WikiTableQuestions")
+        instances = []
+        for group_annotations in (False, True):
+            corpus = Corpus(lowercase_input=True, train_strategy=getattr(qa_strategies, "all_items"))
+            corpus.read_benchmark_challenge(
+                directory=data_path, ocr="microsoft_cv", group_annotations=group_annotations
+            )
+            instances.append(list(corpus.train))
+
+        self.assertEqual(len(instances[0]), 15)
+        self.assertEqual(
+            [(i.identifier, i.input_prefix, i.output) for i in instances[0]],
+            [(i.identifier, i.input_prefix, i.output) for i in instances[1]],
+        )
+        # all instances of a grouped document share a single transformed token view
+        self.assertEqual(len({id(i.document_2d) for i in instances[1]}), 1)
+        self.assertIsInstance(instances[1][0].document_2d.tokens, TokenStore)
+        self.assertTrue(all(t == t.lower() for t in instances[1][0].document_2d.tokens))
+
+    def test_seeded_synonym_augmentation(self) -> None:
+        data_path = Path("examples/WikiTableQuestions")
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as synonyms:
+            synonyms.write("year annum twelvemonth\nteam squad\nleague conference association\n")
+            synonyms.flush()
+            tokens = []
+            for _ in range(2):
+                corpus = Corpus(augment_tokens_from_file=synonyms.name, augment_seed=13)
+                corpus.read_benchmark_challenge(directory=data_path, ocr="microsoft_cv")
+                tokens.append([list(i.document_2d.tokens) for i in corpus.train])
+
+        self.assertEqual(tokens[0], tokens[1])
+        original = next(iter(corpus._train)).document_2d.tokens
+        replaced = {(o.lower(), a) for o, a in zip(original, tokens[0][0]) if o != a}
+        self.assertTrue(replaced)
+        groups = [{"year", "annum", "twelvemonth"}, {"team", "squad"}, {"league", "conference", "association"}]
+        for token, candidate in replaced:
+            self.assertTrue(any(token in group and candidate in group for group in groups))
+
+    def test_synonym_table_token_store(self) -> None:
+        synonyms = read_synonyms(["year annum twelvemonth", "Straße street_road", "ÉTÉ summer"])
+        tokens = ["Year", "", "straße", "été", "years", "STREET ROAD", "x" * 20, "annum"] * 50
+        for seed in range(3):
+            expected = SynonymTable(synonyms, seed=seed).sample(tokens)
+            sampled = SynonymTable(synonyms, seed=seed).sample(TokenStore.from_tokens(tokens))
+            self.assertIsInstance(sampled, TokenStore)
+            self.assertEqual(list(sampled), expected)
+
+    def test_case_augmentation_shares_geometry(self) -> None:
+        corpus = Corpus(case_augmentation=True, train_strategy=getattr(qa_strategies, "first_item"))
+        corpus.read_benchmark_challenge(directory=Path("examples/docvqa"), ocr="microsoft_cv")
+        instances = list(corpus.train)
+
+        self.assertEqual(len(instances), 6)
+        original, lowercased, uppercased = instances[3:]
+        self.assertEqual(lowercased.output, original.output.lower())
+        self.assertEqual(uppercased.output, original.output.upper())
+        self.assertEqual(list(uppercased.document_2d.tokens), [t.upper() for t in original.document_2d.tokens])
+        for augmented in (lowercased, uppercased):
+            self.assertIs(
+                augmented.document_2d.seg_data["tokens"]["org_bboxes"],
+                original.document_2d.seg_data["tokens"]["org_bboxes"],
+            )
+
+    def test_split_pages(self) -> None:
+        data_path = Path("examples/DeepForm")
+        corpus = Corpus(train_strategy=getattr(qa_strategies, "first_item"), split_pages=True)
+        corpus.read_benchmark_challenge(directory=data_path, ocr="microsoft_cv")
+        document = next(d for d in corpus._train if "advertiser" in d.annotations)
+        num_pages = len(document.document_2d.seg_data["pages"]["ranges"])
+        strategy = getattr(qa_strategies, "first_item")
+        instances = list(corpus.doc_to_instances(document, corpus._train, strategy))
+        self.assertEqual(instances, [i for i in corpus.train if i.output_prefix == "advertiser"])
+
+        self.assertEqual(num_pages, 17)
+        self.assertEqual(len(instances), num_pages)
+        self.assertEqual([i.identifier for i in instances], [f"{document.identifier}__{p}" for p in range(num_pages)])
+        self.assertEqual({i.output for i in instances}, {"MIKEBLOOMBERG2020INC-D"})
+        self.assertEqual([t for i in instances for t in i.document_2d.tokens], list(document.document_2d.tokens))
+        for page, instance in enumerate(instances):
+            part = instance.document_2d
+            self.assertIsInstance(part.tokens, TokenStore)
+            self.assertTrue(np.shares_memory(part.tokens.buffer, document.document_2d.tokens.buffer))
+            self.assertEqual(part.seg_data["pages"]["ordinals"].tolist(), [page])
+            self.assertEqual(part.seg_data["pages"]["ranges"].tolist(), [[0, len(part)]])
+
+        corpus = Corpus(
+            train_strategy=getattr(qa_strategies, "first_item"), split_pages=True, pages_per_instance=5, page_stride=4
+        )
+        corpus.read_benchmark_challenge(directory=data_path, ocr="microsoft_cv")
+        instances = [i for i in corpus.train if i.output_prefix == "advertiser"]
+        self.assertEqual([i.identifier.rsplit("__", 1)[1] for i in instances], ["0", "4", "8", "12"])
+        self.assertEqual(len(instances[-1].document_2d.seg_data["pages"]["ranges"]), 5)
+
 
 if __name__ == "__main__":
     unittest.main()
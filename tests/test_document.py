@@ -0,0 +1,46 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from benchmarker.data.document import Doc2d, TokenStore, map_tokens
+
+
+class TestTokenStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tokens = ['Total:', '', 'ZAŻÓŁĆ', 'straße', '€12', 'ΟΔΟΣ', 'x']
+        self.store = TokenStore.from_tokens(self.tokens)
+
+    def test_sequence_interface(self) -> None:
+        self.assertEqual(len(self.store), len(self.tokens))
+        self.assertEqual(list(self.store), self.tokens)
+        self.assertEqual([self.store[i] for i in range(-len(self.tokens), len(self.tokens))], self.tokens * 2)
+        with self.assertRaises(IndexError):
+            self.store[len(self.tokens)]
+        for item in (slice(1, 4), slice(3, None), slice(5, 2), slice(None, None, -2)):
+            self.assertIsInstance(self.store[item], TokenStore)
+            self.assertEqual(list(self.store[item]), self.tokens[item])
+        self.assertEqual(self.store.offsets.dtype, np.int32)
+        self.assertEqual(self.store.buffer.tobytes(), ''.join(self.tokens).encode('utf-8'))
+
+    def test_equality_and_pickling(self) -> None:
+        self.assertEqual(self.store, self.tokens)
+        self.assertEqual(self.store, tuple(self.tokens))
+        self.assertEqual(self.store[2:5], TokenStore.from_tokens(self.tokens[2:5]))
+        self.assertNotEqual(self.store, TokenStore.from_tokens(self.tokens[:-1] + ['y']))
+        self.assertEqual(pickle.loads(pickle.dumps(self.store[1:])), self.store[1:])
+        seg_data = {'tokens': {'org_bboxes': np.zeros((len(self.tokens), 4))}}
+        self.assertEqual(Doc2d(self.store, seg_data), Doc2d(self.tokens, seg_data))
+
+    def test_case_mapping(self) -> None:
+        for func in (str.lower, str.upper, str.title):
+            for tokens in (self.tokens, ['ABC', 'def', ''], ['İstanbul', 'ǅ']):
+                mapped = map_tokens(TokenStore.from_tokens(tokens), func)
+                self.assertIsInstance(mapped, TokenStore)
+                self.assertEqual(list(mapped), [func(token) for token in tokens])
+                self.assertEqual(map_tokens(tokens, func), [func(token) for token in tokens])
+        self.assertEqual(list(self.store), self.tokens)
+
+
+if __name__ == "__main__":
+    unittest.main()
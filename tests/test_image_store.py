@@ -0,0 +1,72 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarker.data.document import Doc2d
+from benchmarker.data.image_store import PageImageStore, build_image_store
+from benchmarker.data.images import decode_page
+from benchmarker.data.utils import get_data_part
+
+
+class TestPageImageStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name) / 'dataset'
+        self.sizes = {'doc-a': [(850, 1100), (1100, 850), (850, 1100)], 'doc-b': [(300, 200)]}
+        for name, sizes in self.sizes.items():
+            (self.directory / 'png' / name).mkdir(parents=True)
+            for page, size in enumerate(sizes):
+                pixels = np.full(size[::-1], 30 * page + len(name), dtype=np.uint8)
+                pixels[::7] = 255
+                Image.fromarray(pixels).save(self.directory / 'png' / name / f'{name}-{page}.png')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_pages_match_decoded_images(self) -> None:
+        output = Path(self.tmp_dir.name) / 'store'
+        for processes in (0, 2):
+            build_image_store(self.directory, output, processes=processes)
+            store = PageImageStore(output)
+            self.assertEqual(sorted(store), ['doc-a', 'doc-b'])
+            for name, sizes in self.sizes.items():
+                self.assertEqual(store.num_pages(name), len(sizes))
+                images = store.images(name)
+                for page, image in enumerate(images['img_data']):
+                    expected = decode_page(self.directory / 'png' / name / f'{name}-{page}.png')
+                    np.testing.assert_array_equal(image, expected)
+                    self.assertIsInstance(image.base, np.memmap)
+                    self.assertEqual(tuple(images['img_size'][page]), (expected.shape[1], expected.shape[0]))
+            with self.assertRaises(IndexError):
+                store.page('doc-b', 1)
+        self.assertEqual(sorted(Path(self.tmp_dir.name).iterdir()), [self.directory, output])
+
+    def test_failed_build_leaves_no_files(self) -> None:
+        (self.directory / 'png' / 'doc-b' / 'doc-b-1.png').write_bytes(b'not an image')
+        with self.assertRaises(Exception):
+            build_image_store(self.directory, Path(self.tmp_dir.name) / 'store')
+        self.assertEqual(list(Path(self.tmp_dir.name).iterdir()), [self.directory])
+
+    def test_images_of_data_parts(self) -> None:
+        output = build_image_store(self.directory, Path(self.tmp_dir.name) / 'store')
+        store = PageImageStore(output)
+        seg_data = {
+            'tokens': {'bboxes': np.zeros((30, 4)), 'org_bboxes': np.zeros((30, 4))},
+            'pages': {'ranges': np.array([[0, 10], [10, 20], [20, 30]]), 'org_bboxes': np.zeros((3, 4))},
+            'lazyimages': {'path': self.directory / 'png' / 'doc-a'},
+        }
+        doc2d = Doc2d([f't{i}' for i in range(30)], seg_data)
+        self.assertTrue(store.fill(doc2d))
+        np.testing.assert_array_equal(seg_data['pages']['ordinals'], [0, 1, 2])
+        tokens = list(range(30))
+        part = get_data_part(12, 18, 10, doc2d.tokens, tokens, tokens, seg_data)[3]
+        np.testing.assert_array_equal(part['images']['img_data'], store.page('doc-a', 1))
+        np.testing.assert_array_equal(part['images']['img_size'], store.images('doc-a')['img_size'][1])
+        self.assertFalse(store.fill(Doc2d([], {'lazyimages': {'path': self.directory / 'png' / 'missing'}})))
+
+
+if __name__ == "__main__":
+    unittest.main()
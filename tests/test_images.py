@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from benchmarker.data.document import Doc2d
+from benchmarker.data.images import LRUByteCache, PageImageLoader, fit_size, page_image_paths
+from benchmarker.utils import instrumentation
+
+
+class TestPageImageLoader(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.tmp_dir.name) / 'png' / 'doc'
+        self.directory.mkdir(parents=True)
+        # pages of different shades, numbered so that lexicographic order differs from page order
+        for page in range(12):
+            Image.new('L', (850, 1100), color=page * 20).save(self.directory / f'doc-{page}.png')
+        (self.directory / 'notes.txt').write_text('not an image')
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def test_page_order_and_size(self) -> None:
+        paths = page_image_paths(self.directory)
+        self.assertEqual([p.name for p in paths[:3]], ['doc-0.png', 'doc-1.png', 'doc-2.png'])
+        self.assertEqual(paths[-1].name, 'doc-11.png')
+        self.assertEqual(page_image_paths(self.directory.parent / 'missing'), [])
+        self.assertEqual(fit_size(850, 1100), (384, 448))
+        self.assertEqual(fit_size(2000, 100), (384, 64))
+
+        with PageImageLoader(num_workers=0) as loader:
+            image = loader.page(self.directory, 10)
+            self.assertEqual(image.shape, (448, 384))
+            self.assertEqual(image.dtype, np.uint8)
+            self.assertTrue(np.all(image == 200))
+            with self.assertRaises(FileNotFoundError):
+                loader.page(self.directory, 12)
+            seg_data = {'lazyimages': {'path': self.directory}, 'pages': {'ordinals': np.array([3, 4])}}
+            images = loader.images(seg_data)
+            self.assertEqual([int(img[0, 0]) for img in images['img_data']], [60, 80])
+            np.testing.assert_array_equal(images['img_size'], [[384, 448], [384, 448]])
+
+    def test_cache_and_prefetch(self) -> None:
+        page_bytes = 448 * 384
+        metrics = []
+        with instrumentation.session(instrumentation.CallbackExporter(metrics.append)):
+            with PageImageLoader(max_cache_bytes=4 * page_bytes, num_workers=2, prefetch=2) as loader:
+                for ordinal in range(3):
+                    loader.page(self.directory, ordinal)
+                    # following pages are either decoded or being decoded
+                    self.assertTrue(all(
+                        (str(self.directory), page) in loader.cache or (str(self.directory), page) in loader._pending
+                        for page in (ordinal + 1, ordinal + 2)
+                    ))
+                doc2ds = [Doc2d([], {'lazyimages': {'path': self.directory}}) for _ in range(2)]
+                self.assertEqual(list(loader.prefetch_documents(doc2ds, lookahead=1)), doc2ds)
+                # prefetched pages may get evicted before they are requested, results are complete anyway
+                pages = loader.pages(self.directory)
+                self.assertEqual([int(page[0, 0]) for page in pages], [page * 20 for page in range(12)])
+                self.assertLessEqual(loader.cache.bytes, 4 * page_bytes)
+        counters = metrics[0]['counters']
+        self.assertGreaterEqual(counters['images.prefetched'], 11)
+        self.assertGreater(counters['images.evicted'], 0)
+
+    def test_pending_page_is_not_decoded_again(self) -> None:
+        class LatePending(dict):
+            """Pending decodings that are started by another thread right after the first lookup."""
+
+            def get(self, key, default=None):
+                return default
+
+        with PageImageLoader(num_workers=2) as loader:
+            pending = Future()
+            loader._pending = LatePending({(str(self.directory), 1): pending})
+            with mock.patch.object(loader._executor, 'submit') as submit:
+                self.assertIs(loader._request(self.directory, 1, background=True), pending)
+            submit.assert_not_called()
+
+    def test_lru_cache(self) -> None:
+        cache = LRUByteCache(max_bytes=30)
+        for key in 'abc':
+            cache.put(key, np.zeros(10, dtype=np.uint8))
+        cache.get('a')
+        cache.put('d', np.zeros(10, dtype=np.uint8))
+        self.assertEqual(sorted(cache._items), ['a', 'c', 'd'])
+        cache.put('e', np.zeros(31, dtype=np.uint8))
+        self.assertNotIn('e', cache)
+        self.assertEqual(cache.bytes, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from pathlib import Path
+
+from benchmarker.data.reader import Corpus
+from benchmarker.utils import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_pipeline_metrics(self) -> None:
+        corpus = Corpus()
+        corpus.read_benchmark_challenge(directory=Path('examples/DeepForm'), ocr='microsoft_cv')
+        summaries = []
+        with instrumentation.session(instrumentation.CallbackExporter(summaries.append)):
+            instances = list(corpus.train)
+
+        self.assertEqual(len(summaries), 1)
+        counters, timers = summaries[0]['counters'], summaries[0]['timers']
+        self.assertEqual(counters['reader.lines'], 1)
+        self.assertGreater(counters['reader.bytes'], 0)
+        self.assertEqual(counters['corpus.instances.concat'], len(instances))
+        self.assertEqual(timers['loader.to_doc2d']['calls'], 1)
+
+    def test_skipped_documents_and_disabled_state(self) -> None:
+        corpus = Corpus()
+        corpus.read_benchmark_challenge(directory=Path('examples/docvqa'), ocr='tesseract')
+        summaries = []
+        with instrumentation.session(instrumentation.CallbackExporter(summaries.append)):
+            list(corpus.train)
+        self.assertEqual(summaries[0]['counters']['reader.skipped.no_common_format'], 1)
+
+        instrumentation.reset()
+        list(corpus.train)
+        self.assertEqual(instrumentation.summary(), {'timers': {}, 'counters': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from benchmarker.cli.l5.create_memmaps import create_memmaps
+from benchmarker.data.memmaps import MemmapReader, MemmapWriter, feature_names
+from benchmarker.data.tokenization import StubBatchTokenizer
+
+
+class TestMemmaps(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp_dir)
+
+    def test_create_memmaps(self) -> None:
+        levels = ('tokens', 'pages', 'lines')
+        create_memmaps(
+            'examples/DeepForm', memmap_path=str(self.tmp_dir), max_encoder_length=512, max_decoder_length=16,
+            segment_levels=levels, tokenizer=StubBatchTokenizer(),
+        )
+        reader = MemmapReader(self.tmp_dir / 'train')
+        self.assertEqual(len(reader), 5)
+        self.assertEqual(sorted(reader.features), sorted(feature_names(levels)))
+        row = reader[0]
+        self.assertEqual(row['input_ids'].shape, (512,))
+        self.assertEqual(row['seg_data.tokens.bboxes'].shape, (512, 4))
+        self.assertEqual(row['lm_label_ids'].shape, (16,))
+        self.assertEqual(str(row['doc_id']), '3515690b-0081-10b9-1077-26ea74749d49')
+        self.assertTrue(row['input_masks'].all())
+        self.assertEqual(row['input_ids'][-1], StubBatchTokenizer.eos_token_id)
+        self.assertEqual(row['token_map'][0], -1)
+        document_map = row['token_map'][row['token_map'] >= 0]
+        self.assertEqual(document_map[0], 0)
+        self.assertTrue((np.diff(document_map) >= 0).all())
+        bboxes = row['seg_data.tokens.bboxes'].astype(np.float32)
+        self.assertTrue(((bboxes >= 0) & (bboxes <= 1)).all())
+        ranges = row['seg_data.pages.ranges'][:row['seg_data.pages.cardinality']]
+        self.assertEqual(ranges[-1, 1], 511)
+
+        create_memmaps(
+            'examples/DeepForm', memmap_path=str(self.tmp_dir / 'parallel'), max_encoder_length=512,
+            max_decoder_length=16, segment_levels=levels, tokenizer=StubBatchTokenizer(), processes=2,
+        )
+        parallel = MemmapReader(self.tmp_dir / 'parallel' / 'train')
+        for name in reader.features:
+            np.testing.assert_array_equal(parallel.feature(name), reader.feature(name))
+
+    def test_append_and_batches(self) -> None:
+        widths = {'input_ids': 4, 'input_masks': 4}
+        for append in (False, True):
+            with MemmapWriter(self.tmp_dir, ['input_ids', 'input_masks', 'doc_id'], widths, append=append) as writer:
+                for i in range(3):
+                    writer.append({'input_ids': [i] * 4, 'input_masks': [1, 1, 0, 0], 'doc_id': f'doc{i}'})
+        reader = MemmapReader(self.tmp_dir)
+        self.assertEqual(len(reader), 6)
+        batches = list(reader.batches(4, ['input_ids']))
+        self.assertEqual([len(batch['input_ids']) for batch in batches], [4, 2])
+        np.testing.assert_array_equal(batches[1]['input_ids'][:, 0], [1, 2])
+        self.assertEqual(list(reader[3:5]['doc_id']), ['doc0', 'doc1'])
+
+
+if __name__ == "__main__":
+    unittest.main()
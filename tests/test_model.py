@@ -0,0 +1,43 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from benchmarker.data.model import Example, Feature, Span
+from benchmarker.data.reader.common import DataInstance, Document
+
+
+class TestCompactModel(unittest.TestCase):
+    def test_objects_have_no_dict(self) -> None:
+        array = np.zeros(2)
+        objects = [
+            Example('id', ('a', 'b'), array, [0, 1], [(0, 1), (1, 2)], {}, [-1, -1]),
+            Span('id', 0, 0, 2, ['a', 'b'], [1], ['b'], {}, [0, 1], [-1, -1]),
+            Feature(array, array, array, {}, array),
+            Document('id', None, {'key': ['value']}),
+            DataInstance('id', 'key', None, 'key', 'value'),
+        ]
+        for obj in objects:
+            self.assertFalse(hasattr(obj, '__dict__'))
+            with self.assertRaises(AttributeError):
+                obj.unknown = None
+            copy = pickle.loads(pickle.dumps(obj))
+            self.assertEqual(repr(copy), repr(obj))
+        for obj in objects[:3]:
+            with self.assertRaises(AttributeError):
+                obj.seg_data = {}
+        self.assertEqual(objects[0].tokens, ['a', 'b'])
+        self.assertEqual(objects[3], Document('id', None, {'key': ['value']}))
+
+    def test_feature_items(self) -> None:
+        feature = Feature(np.arange(3), np.ones(3), np.arange(2), {'pages': {}}, np.zeros(3))
+        feature.gold_words = 'word'
+        self.assertEqual(feature['gold_words'], 'word')
+        self.assertEqual(feature['seg_data'], {'pages': {}})
+        self.assertIsNone(feature['masked_word_ids'])
+        with self.assertRaises(ValueError):
+            feature['unknown']
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from benchmarker.data.reader import Corpus, qa_strategies
+from benchmarker.data.tokenization import StubBatchTokenizer, piece_length, tokenize_instances
+from benchmarker.data.utils import get_bpe_positions
+
+
+class CountingTokenizer(StubBatchTokenizer):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def encode_batch(self, texts):
+        self.calls += 1
+        return super().encode_batch(texts)
+
+
+class TestTokenization(unittest.TestCase):
+    def setUp(self) -> None:
+        corpus = Corpus(train_strategy=qa_strategies.all_items)
+        levels = ('tokens', 'pages', 'lines')
+        corpus.read_benchmark_challenge(Path('examples/DeepForm'), ocr='microsoft_cv', segment_levels=levels)
+        self.instances = list(corpus.train)
+
+    def test_examples_match_per_token_tokenization(self) -> None:
+        tokenizer = StubBatchTokenizer()
+        for tokenized in tokenize_instances(self.instances, tokenizer, batch_size=3):
+            doc2d, example = tokenized.instance.document_2d, tokenized.example
+            self.assertEqual(tokenized.prefix_ids, tokenizer.encode_batch([tokenized.instance.input_prefix])[0])
+            pieces, original_indices, bboxes, bpe_map = [], [], [], []
+            for i, token in enumerate(doc2d.tokens):
+                token_pieces = tokenizer.convert_ids_to_tokens(tokenizer.encode_batch([token])[0])
+                bpe_map.append((len(pieces), len(pieces) + len(token_pieces)))
+                pieces += token_pieces
+                original_indices += [i] * len(token_pieces)
+                lengths = [piece_length(piece) for piece in token_pieces]
+                bboxes += get_bpe_positions(doc2d.seg_data['tokens']['org_bboxes'][i], lengths)
+            self.assertEqual(example.tokens, pieces)
+            np.testing.assert_array_equal(example.original_token_indices, original_indices)
+            np.testing.assert_array_equal(example.tokens_bpe_map, bpe_map)
+            np.testing.assert_array_equal(example.seg_data['tokens']['bboxes'], np.array(bboxes, dtype=np.float32))
+            np.testing.assert_array_equal(tokenized.token_ids, tokenizer.encode_batch([' '.join(doc2d.tokens)])[0])
+            lines = example.seg_data['lines']['ranges']
+            expected_starts = [bpe_map[start][0] for start, _ in doc2d.seg_data['lines']['ranges']]
+            np.testing.assert_array_equal(lines[:, 0], expected_starts)
+
+    def test_documents_are_tokenized_once_per_batch(self) -> None:
+        tokenizer = CountingTokenizer()
+        tokenized = list(tokenize_instances(self.instances, tokenizer, batch_size=2))
+        self.assertEqual(tokenizer.calls, 3)
+        self.assertEqual(len(tokenized), len(self.instances))
+        self.assertIs(tokenized[0].example, tokenized[1].example)
+        self.assertIsNot(tokenized[1].example, tokenized[2].example)
+        self.assertEqual(tokenized[0].example.example_id, self.instances[0].document_2d.docid)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+import unittest
+
+import numpy as np
+
+from benchmarker.data.document import Doc2d
+from benchmarker.data.utils import (
+    _single_line_spans_scan,
+    fix_missing_tokens_in_lines,
+    get_bpe_positions,
+    get_bpe_positions_bulk,
+    get_data_part,
+    get_page_part,
+    iter_data_parts,
+    iter_page_parts,
+    single_line_spans,
+)
+
+
+class TestBpePositions(unittest.TestCase):
+    def test_bulk_matches_per_token(self) -> None:
+        rng = np.random.default_rng(0)
+        token_bboxes = rng.integers(0, 2000, (1000, 4))
+        token_bboxes[:, 2] = token_bboxes[:, 0] + rng.integers(0, 300, 1000)
+        token_bboxes[:3, 2] = token_bboxes[:3, 0]
+        bpe_offsets = np.concatenate([[0], np.cumsum(rng.integers(0, 6, 1000))])
+        bpe_lens = rng.integers(0, 8, bpe_offsets[-1])
+        expected = [
+            position
+            for bbox, start, end in zip(token_bboxes, bpe_offsets[:-1], bpe_offsets[1:])
+            for position in get_bpe_positions(bbox, bpe_lens[start:end].tolist())
+        ]
+        for dtype in (np.float16, np.float32, np.float64):
+            positions = get_bpe_positions_bulk(token_bboxes, bpe_lens, bpe_offsets, dtype=dtype)
+            self.assertEqual(positions.dtype, dtype)
+            np.testing.assert_array_equal(positions, np.array(expected, dtype=dtype))
+
+    def test_empty_and_invalid_tokens(self) -> None:
+        positions = get_bpe_positions_bulk(np.empty((0, 4), dtype=int), [], [0])
+        self.assertEqual(positions.shape, (0, 4))
+        with self.assertRaises(AssertionError):
+            get_bpe_positions_bulk(np.array([[0, 0, 10, 5], [10, 0, 5, 5]]), [1, 2], [0, 1, 2])
+
+
+class TestDataPart(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        self.length = 1000
+        line_ends = np.sort(rng.choice(np.arange(1, self.length), 80, replace=False))
+        lines = np.stack([np.concatenate([[0], line_ends]), np.concatenate([line_ends, [self.length]])], axis=1)
+        lines = np.concatenate([lines[:40], [[lines[40, 0]] * 2], lines[40:]])
+        self.seg_data = {
+            'tokens': {'bboxes': rng.random((self.length, 4)), 'org_bboxes': rng.integers(0, 100, (self.length, 4))},
+            'lines': {'ranges': lines, 'org_bboxes': rng.integers(0, 100, (len(lines), 4))},
+            'pages': {'ranges': np.array([[0, 400], [400, 400], [400, 1000]]), 'ordinals': np.arange(3)},
+        }
+        self.tokens = [f't{i}' for i in range(self.length)]
+        self.token_idx = list(range(self.length))
+
+    def expected_segments(self, level: str, from_range: int, to_range: int) -> np.ndarray:
+        ranges = self.seg_data[level]['ranges']
+        return np.array([max(from_range, rng[0]) < min(to_range, rng[1]) for rng in ranges], dtype=bool)
+
+    def assert_part(self, part, from_range: int, to_range: int) -> None:
+        self.assertEqual(part[0], self.tokens[from_range:to_range])
+        for level in ('lines', 'pages'):
+            selected = self.expected_segments(level, from_range, to_range)
+            for key, values in self.seg_data[level].items():
+                expected = values[selected]
+                if key == 'ranges':
+                    expected = np.clip(expected - from_range, 0, 257)
+                np.testing.assert_array_equal(part[3][level][key], expected)
+
+    def test_windows_match_segment_overlaps(self) -> None:
+        windows = list(iter_data_parts(256, 100, self.tokens, self.token_idx, self.token_idx, self.seg_data))
+        self.assertEqual([(start, end) for start, end, _ in windows][-2:], [(700, 956), (800, 1000)])
+        for from_range, to_range, part in windows:
+            self.assert_part(part, from_range, to_range)
+
+        # unordered segments are selected by a mask
+        order = np.random.default_rng(1).permutation(len(self.seg_data['lines']['ranges']))
+        for key in ('ranges', 'org_bboxes'):
+            self.seg_data['lines'][key] = self.seg_data['lines'][key][order]
+        for from_range, to_range in ((0, 256), (390, 410), (500, 500), (990, 1000)):
+            part = get_data_part(from_range, to_range, 256, self.tokens, self.token_idx, self.token_idx, self.seg_data)
+            self.assert_part(part, from_range, to_range)
+
+
+class TestPageParts(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(0)
+        lines = np.array([[0, 3], [3, 6], [6, 8], [8, 8], [8, 12], [12, 15], [15, 20]], dtype=np.int32)
+        seg_data = {
+            'tokens': {'org_bboxes': rng.integers(0, 100, (20, 4)).astype(np.uint16)},
+            'lines': {'ranges': lines, 'org_bboxes': rng.integers(0, 100, (len(lines), 4)).astype(np.uint16)},
+            'pages': {
+                'ranges': np.array([[0, 8], [8, 8], [8, 15], [15, 20]], dtype=np.int32),
+                'org_bboxes': np.array([[0, 0, 100, 200]] * 4, dtype=np.uint16),
+            },
+            'lazyimages': {'path': 'png/doc'},
+        }
+        token_ocr_ranges = np.stack([np.arange(20) * 5, np.arange(20) * 5 + 4], axis=1)
+        self.doc = Doc2d([f't{i}' for i in range(20)], seg_data, token_ocr_ranges, list(range(20)), 'doc')
+
+    def test_page_windows(self) -> None:
+        parts = list(iter_page_parts(self.doc))
+        # the blank page is skipped
+        self.assertEqual([first_page for first_page, _ in parts], [0, 2, 3])
+        self.assertEqual([part.docid for _, part in parts], ['doc__0', 'doc__2', 'doc__3'])
+        self.assertEqual([t for _, part in parts for t in part.tokens], self.doc.tokens)
+
+        part = get_page_part(self.doc, 1, 3)
+        self.assertEqual(part.tokens, self.doc.tokens[8:15])
+        self.assertEqual(part.token_label_ids, list(range(8, 15)))
+        np.testing.assert_array_equal(part.token_ocr_ranges, self.doc.token_ocr_ranges[8:15])
+        np.testing.assert_array_equal(part.seg_data['pages']['ranges'], [[0, 0], [0, 7]])
+        np.testing.assert_array_equal(part.seg_data['pages']['ordinals'], [1, 2])
+        np.testing.assert_array_equal(part.seg_data['lines']['ranges'], [[0, 4], [4, 7]])
+        np.testing.assert_array_equal(
+            part.seg_data['lines']['org_bboxes'], self.doc.seg_data['lines']['org_bboxes'][4:6]
+        )
+        self.assertEqual(part.seg_data['lines']['ranges'].dtype, np.int32)
+        self.assertIs(part.seg_data['lazyimages'], self.doc.seg_data['lazyimages'])
+        # arrays of the part are views of the document ones
+        for array, base in (
+            (part.seg_data['tokens']['org_bboxes'], self.doc.seg_data['tokens']['org_bboxes']),
+            (part.token_ocr_ranges, self.doc.token_ocr_ranges),
+        ):
+            self.assertTrue(np.shares_memory(array, base))
+
+        windows = [
+            (first_page, part.seg_data['pages']['ordinals'].tolist())
+            for first_page, part in iter_page_parts(self.doc, pages_per_part=2, stride=1)
+        ]
+        self.assertEqual(windows, [(0, [0, 1]), (1, [1, 2]), (2, [2, 3])])
+
+    def test_data_part_of_page(self) -> None:
+        self.doc.seg_data['images'] = {'img_data': ['p0', 'p1', 'p2', 'p3'], 'img_size': np.arange(8).reshape(4, 2)}
+        for first_page, part in iter_page_parts(self.doc):
+            tokens = list(part.tokens)
+            token_idx = list(range(len(tokens)))
+            seg_data = dict(part.seg_data)
+            seg_data['tokens'] = dict(seg_data['tokens'], bboxes=seg_data['tokens']['org_bboxes'])
+            _, _, _, part_seg_data = get_data_part(0, len(tokens), 512, tokens, token_idx, token_idx, seg_data)
+            self.assertEqual(part_seg_data['images']['img_data'], f'p{first_page}')
+
+
+class TestFixMissingTokens(unittest.TestCase):
+    def test_missing_tokens_become_lines(self) -> None:
+        token_bboxes = np.arange(40).reshape(10, 4)
+        seg_data = {
+            'tokens': {'org_bboxes': token_bboxes},
+            'lines': {
+                'ranges': np.array([[2, 4], [4, 4], [6, 8]], dtype=np.int32),
+                'org_bboxes': np.full((3, 4), 100, dtype=np.uint16),
+                'ocr_ranges': np.array([[20, 40], [40, 40], [60, 80]], dtype=np.int32),
+            },
+            'pages': {'ranges': np.array([[0, 10]])},
+        }
+        token_ocr_ranges = np.stack([np.arange(10) * 10, np.arange(10) * 10 + 5], axis=1)
+        doc = Doc2d([f't{i}' for i in range(10)], seg_data, token_ocr_ranges=token_ocr_ranges, docid='doc')
+
+        fixed = fix_missing_tokens_in_lines(doc)
+        lines = fixed.seg_data['lines']
+        missing = [0, 1, 4, 5, 8, 9]
+        np.testing.assert_array_equal(
+            lines['ranges'], [[0, 1], [1, 2], [2, 4], [4, 4], [4, 5], [5, 6], [6, 8], [8, 9], [9, 10]]
+        )
+        self.assertEqual(lines['org_bboxes'].dtype, np.result_type(np.uint16, token_bboxes.dtype))
+        np.testing.assert_array_equal(lines['org_bboxes'][[2, 3, 6]], seg_data['lines']['org_bboxes'])
+        np.testing.assert_array_equal(lines['org_bboxes'][[0, 1, 4, 5, 7, 8]], token_bboxes[missing])
+        np.testing.assert_array_equal(lines['ocr_ranges'][[0, 1, 4, 5, 7, 8]], token_ocr_ranges[missing])
+        # the original document is left intact
+        self.assertEqual(len(doc.seg_data['lines']['ranges']), 3)
+        self.assertIs(fixed.seg_data['pages'], doc.seg_data['pages'])
+
+        self.assertIs(fix_missing_tokens_in_lines(fixed), fixed)
+        seg_data['lines']['ranges'] = np.array([[2, 4], [3, 5]])
+        with self.assertRaises(AssertionError):
+            fix_missing_tokens_in_lines(doc)
+
+
+class TestSingleLineSpans(unittest.TestCase):
+    def test_spans_truncated_to_lines(self) -> None:
+        seg_data = {'lines': {'ranges': np.array([[0, 4], [4, 6], [6, 10], [10, 12]])}}
+        spans = [[1, 5], [5, 9], [9, 9], [11, 12], [10, 14]]
+        # maximal overlap (first line on ties), empty span skipped, span after the last line skipped
+        np.testing.assert_array_equal(single_line_spans(spans, seg_data), [[1, 4], [6, 9], [11, 12]])
+        # the last line is preferred over a longer overlap
+        np.testing.assert_array_equal(single_line_spans([[7, 11]], seg_data), [[10, 11]])
+        self.assertEqual(single_line_spans(np.empty((0, 2), dtype=int), seg_data).shape, (0, 2))
+        self.assertIs(single_line_spans(spans, {}), spans)
+
+    def test_matches_line_scan(self) -> None:
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            line_ends = np.unique(rng.integers(0, 100, 12))
+            lines = np.stack([np.concatenate([[0], line_ends[:-1]]), line_ends], axis=1)
+            spans = np.sort(rng.integers(0, 105, (10, 2)), axis=1)
+            np.testing.assert_array_equal(
+                single_line_spans(spans, {'lines': {'ranges': lines}}), _single_line_spans_scan(spans, lines)
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()